@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import FileCategory, ArchiveFile, FileComment, FileLike, Download, Playlist
+from .models import (
+    FileCategory, ArchiveFile, FileComment, FileLike, Download, Playlist,
+    DailyFileStats, DailyFileCategoryStats,
+)
 
 
 @admin.register(FileCategory)
@@ -34,13 +37,14 @@ class FileCategoryAdmin(admin.ModelAdmin):
     def files_count_display(self, obj):
         """Отображение количества файлов с ссылкой"""
         if obj:
-            count = obj.files.filter(is_public=True).count()
+            count = obj.files_count
             if count > 0:
                 url = reverse('admin:Archive_archivefile_changelist') + f'?category__id__exact={obj.id}'
                 return format_html('<a href="{}">{} файлов</a>', url, count)
             return '0 файлов'
         return '-'
     files_count_display.short_description = 'Количество файлов'
+    files_count_display.admin_order_field = 'files_count'
     
     def color_display(self, obj):
         """Отображение цвета категории"""
@@ -58,14 +62,21 @@ class ArchiveFileAdmin(admin.ModelAdmin):
     """Админка для файлов архива"""
     list_display = ('title', 'file_type', 'uploaded_by', 'category', 'file_size_display', 'downloads_count', 'views_count', 'is_public', 'uploaded_at')
     list_filter = ('file_type', 'is_public', 'is_featured', 'allow_comments', 'uploaded_at', 'category')
-    search_fields = ('title', 'description', 'uploaded_by__username')
+    search_fields = ('title', 'description', 'uploaded_by__username', '=sha256')
     prepopulated_fields = {'slug': ('title',)}
-    readonly_fields = ('file_size_display', 'downloads_count', 'views_count', 'likes_count', 'uploaded_at', 'updated_at')
+    readonly_fields = (
+        'file_size_display', 'mime_type', 'sha256', 'dimensions_display', 'duration_display',
+        'downloads_count', 'views_count', 'likes_count', 'uploaded_at', 'updated_at'
+    )
     
     fieldsets = (
         ('Основная информация', {
             'fields': ('title', 'slug', 'description', 'file', 'file_type')
         }),
+        ('Метаданные файла', {
+            'fields': ('file_size_display', 'mime_type', 'sha256', 'dimensions_display', 'duration_display'),
+            'classes': ('collapse',)
+        }),
         ('Классификация', {
             'fields': ('category', 'tag_objects', 'tags')
         }),
@@ -86,6 +97,19 @@ class ArchiveFileAdmin(admin.ModelAdmin):
         """Отображение размера файла"""
         return obj.file_size
     file_size_display.short_description = 'Размер файла'
+    file_size_display.admin_order_field = 'size_bytes'
+    
+    def dimensions_display(self, obj):
+        """Размеры изображения или видео"""
+        if obj.width and obj.height:
+            return f'{obj.width}×{obj.height}'
+        return '—'
+    dimensions_display.short_description = 'Размеры'
+    
+    def duration_display(self, obj):
+        """Длительность аудио или видео"""
+        return obj.duration_display or '—'
+    duration_display.short_description = 'Длительность'
 
 
 @admin.register(FileComment)
@@ -119,6 +143,37 @@ class DownloadAdmin(admin.ModelAdmin):
     readonly_fields = ('downloaded_at',)
 
 
+@admin.register(DailyFileStats)
+class DailyFileStatsAdmin(admin.ModelAdmin):
+    """Админка для дневной статистики файлов (заполняет команда rollup_stats)"""
+    list_display = ('date', 'file', 'views', 'downloads', 'likes')
+    list_filter = ('date',)
+    search_fields = ('file__title',)
+    list_select_related = ('file',)
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyFileCategoryStats)
+class DailyFileCategoryStatsAdmin(admin.ModelAdmin):
+    """Админка для дневной статистики категорий файлов"""
+    list_display = ('date', 'category', 'views', 'downloads', 'likes')
+    list_filter = ('category', 'date')
+    list_select_related = ('category',)
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Playlist)
 class PlaylistAdmin(admin.ModelAdmin):
     """Админка для плейлистов"""
@@ -0,0 +1,135 @@
+"""
+Учет ссылок на блобы и сборка мусора хранилища архива
+
+FileBlob.ref_count - количество строк ArchiveFile, ссылающихся на блоб.
+Счетчик меняется UPDATE с F()-выражением при сохранении файла с новым
+содержимым и при удалении строки; reconcile_blob_refs пересчитывает его
+по фактическим строкам (как Blog.counters.reconcile_counters).
+
+Сборка мусора удаляет блобы без ссылок, не использованные дольше
+GRACE_PERIOD: блоб создается или повторно отдается хранилищем до фиксации
+строки ArchiveFile, поэтому недавно использованные блобы без ссылок не
+трогаем (FileBlob.last_used_at).
+"""
+import logging
+import os
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from Blog.counters import count_subquery, reconcile_field
+
+from .storage import BLOBS_DIR, archive_storage, is_blob_name
+
+logger = logging.getLogger('nlpers')
+
+
+# Блобы и временные файлы моложе этого срока сборка мусора не удаляет
+GRACE_PERIOD = timedelta(hours=24)
+
+
+def file_reference_changed(old_name, new_name):
+    """Переносит ссылку строки ArchiveFile со старого блоба на новый"""
+    from .models import FileBlob
+
+    if is_blob_name(new_name):
+        FileBlob.objects.filter(name=new_name).update(ref_count=F('ref_count') + 1)
+    if is_blob_name(old_name):
+        FileBlob.objects.filter(name=old_name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+
+def reconcile_blob_refs():
+    """Пересчитывает ref_count всех блобов; возвращает количество исправленных"""
+    from .models import ArchiveFile, FileBlob
+
+    return reconcile_field(
+        FileBlob.objects.all(), 'ref_count',
+        count_subquery(ArchiveFile.objects.all(), 'file', outer_field='name')
+    )
+
+
+def _orphan_files(older_than):
+    """Файлы каталога блобов без записи FileBlob (в т.ч. недописанные .part)"""
+    from .models import FileBlob
+
+    root = archive_storage.path(BLOBS_DIR)
+    known = set(FileBlob.objects.values_list('name', flat=True))
+    cutoff = older_than.timestamp()
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, archive_storage.location).replace(os.sep, '/')
+            if name not in known and os.path.getmtime(path) < cutoff:
+                yield name
+
+
+def collect_garbage(grace_period=GRACE_PERIOD, dry_run=False):
+    """
+    Удаляет блобы, на которые не ссылается ни одна строка ArchiveFile.
+
+    Возвращает {'reconciled', 'blobs', 'orphans', 'bytes'}.
+    """
+    from .models import FileBlob
+
+    stats = {'reconciled': reconcile_blob_refs(), 'blobs': 0, 'orphans': 0, 'bytes': 0}
+    cutoff = timezone.now() - grace_period
+
+    unreferenced = FileBlob.objects.filter(ref_count=0, last_used_at__lt=cutoff)
+    for blob in unreferenced.iterator():
+        stats['blobs'] += 1
+        stats['bytes'] += blob.size
+        if dry_run:
+            continue
+        with transaction.atomic():
+            # Ссылка могла появиться после пересчета - удаляем, только если ее нет
+            deleted, _ = FileBlob.objects.filter(pk=blob.pk, ref_count=0, last_used_at__lt=cutoff).delete()
+            if deleted:
+                archive_storage.delete(blob.name)
+
+    for name in _orphan_files(cutoff):
+        stats['orphans'] += 1
+        stats['bytes'] += archive_storage.size(name)
+        if not dry_run:
+            archive_storage.delete(name)
+    return stats
+
+
+def adopt_legacy_files(dry_run=False):
+    """
+    Переносит файлы, загруженные до дедупликации, в хранилище блобов.
+
+    Одинаковые файлы сводятся к одному блобу; старый файл удаляется, когда
+    на него больше не ссылается ни одна строка. Возвращает (перенесено строк,
+    удалено старых файлов).
+    """
+    from .models import ArchiveFile
+
+    moved = removed = 0
+    legacy = ArchiveFile.objects.exclude(file='').exclude(file__startswith=f'{BLOBS_DIR}/').only(
+        'pk', 'file', 'sha256', 'original_filename'
+    )
+    for file_obj in legacy.iterator():
+        old_name = file_obj.file.name
+        if not archive_storage.exists(old_name):
+            logger.warning('Файл архива не найден: %s', old_name)
+            continue
+        moved += 1
+        if dry_run:
+            continue
+
+        with archive_storage.open(old_name, 'rb') as content:
+            if file_obj.sha256:
+                content.sha256 = file_obj.sha256
+            new_name = archive_storage.save(old_name, content)
+        with transaction.atomic():
+            ArchiveFile.objects.filter(pk=file_obj.pk).update(
+                file=new_name,
+                original_filename=file_obj.original_filename or os.path.basename(old_name)[:255],
+            )
+            file_reference_changed(old_name, new_name)
+        if not ArchiveFile.objects.filter(file=old_name).exists():
+            archive_storage.delete(old_name)
+            removed += 1
+    return moved, removed
@@ -1,40 +1,134 @@
 """
 Утилиты для кэширования в приложении Archive
 """
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+
 from django.core.cache import cache
-from django.db.models import Count, Q
+from django.core.paginator import Paginator
+from django.db.models import Count, Q, Sum
+from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta
-import hashlib
 
+from Home.cache_utils import StoredFile, bump_generation, get_cache_key
+
+
+class CachedFileCategory:
+    """Категория файлов в закэшированном списке"""
+
+    def __init__(self, row):
+        self.id = self.pk = row['id']
+        self.name = row['name']
+        self.slug = row.get('slug')
+        self.description = row.get('description', '')
+        self.color = row.get('color')
+        self.icon = row.get('icon', '')
+        self.image = StoredFile(row.get('image'))
+        self.files_count = row.get('files_count', 0)
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse('Archive:category_detail', kwargs={'pk': self.pk})
+
+
+class CachedFile:
+    """
+    Файл архива в закэшированном списке.
 
-def get_cache_key(*args, **kwargs):
-    """Генерирует ключ кэша на основе аргументов"""
-    key_string = '_'.join(str(arg) for arg in args)
-    if kwargs:
-        key_string += '_' + '_'.join(f"{k}={v}" for k, v in sorted(kwargs.items()))
-    return hashlib.md5(key_string.encode()).hexdigest()
+    Повторяет атрибуты ArchiveFile, которые выводят карточки файлов;
+    размер файла берется из сохраненных метаданных.
+    """
 
+    def __init__(self, row, file_size):
+        self.id = self.pk = row['id']
+        self.title = row['title']
+        self.slug = row['slug']
+        self.description = row['description']
+        self.file = StoredFile(row['file'])
+        self.thumbnail = StoredFile(row['thumbnail'])
+        self.file_type = row['file_type']
+        self.mime_type = row['mime_type']
+        self.file_size = file_size
+        self.file_extension = os.path.splitext(
+            row['original_filename'] or row['file']
+        )[1].lower() if row['file'] else ''
+        self.downloads_count = row['downloads_count']
+        self.views_count = row['views_count']
+        self.likes_count = row['likes_count']
+        self.uploaded_at = row['uploaded_at']
+        self.is_public = row['is_public']
+        self.is_featured = row['is_featured']
+        self.uploaded_by = SimpleNamespace(username=row['uploaded_by__username'])
+        self.category = None
+        if row['category_id']:
+            self.category = CachedFileCategory({
+                'id': row['category_id'],
+                'name': row['category__name'],
+                'slug': row['category__slug'],
+                'color': row['category__color'],
+            })
+
+    def __str__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return reverse('Archive:file_detail', kwargs={'pk': self.pk})
+
+
+FILE_LIST_FIELDS = (
+    'id', 'title', 'slug', 'description', 'file', 'original_filename', 'thumbnail', 'file_type',
+    'size_bytes', 'mime_type',
+    'downloads_count', 'views_count', 'likes_count', 'uploaded_at',
+    'is_public', 'is_featured', 'uploaded_by__username',
+    'category_id', 'category__name', 'category__slug', 'category__color',
+)
+
+
+def _public_files():
+    """Публичные файлы, у которых есть загруженный файл"""
+    from .models import ArchiveFile
+    return ArchiveFile.objects.filter(is_public=True).exclude(file='')
 
-def cache_files_list(category_id=None, file_type=None, page=1):
-    """Кэширует список файлов с фильтрацией"""
+
+def _cached_file(row):
+    from .models import ArchiveFile, format_file_size
+    if row['size_bytes'] is not None:
+        return CachedFile(row, format_file_size(row['size_bytes']))
+    # Метаданные еще не извлечены - размер берем из хранилища
+    try:
+        file_size = ArchiveFile(file=row['file']).file_size
+    except OSError:
+        file_size = '0 B'
+    return CachedFile(row, file_size)
+
+
+def _cached_files(queryset):
+    return [_cached_file(row) for row in queryset.values(*FILE_LIST_FIELDS)]
+
+
+def cache_files_list(category_id=None, file_type=None, page=1, per_page=12):
+    """
+    Кэширует страницу списка файлов с фильтрацией.
+
+    Возвращает {'files': [CachedFile], 'count': всего файлов, 'number': номер страницы}.
+    """
     cache_key = get_cache_key(
         'files_list',
         category_id or 'all',
         file_type or 'all',
-        page
+        page,
+        per_page,
+        namespaces=[f'file_category:{category_id}' if category_id else 'files']
     )
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
         return cached_data
     
-    from .models import ArchiveFile, FileCategory
-    
-    # Базовый запрос
-    files = ArchiveFile.objects.filter(is_public=True).select_related(
-        'category', 'uploaded_by'
-    ).prefetch_related('tag_objects')
+    files = _public_files()
     
     # Применяем фильтры
     if category_id:
@@ -42,23 +136,14 @@ def cache_files_list(category_id=None, file_type=None, page=1):
     if file_type:
         files = files.filter(file_type=file_type)
     
-    # Пагинация
-    from django.core.paginator import Paginator
-    paginator = Paginator(files, 12)  # 12 файлов на страницу
+    # Пагинация: COUNT и одна выборка строк текущей страницы
+    paginator = Paginator(files.order_by('-uploaded_at', '-id').values(*FILE_LIST_FIELDS), per_page)
     page_obj = paginator.get_page(page)
     
     result = {
-        'files': list(page_obj.object_list.values(
-            'id', 'title', 'slug', 'description', 'thumbnail',
-            'file_type', 'downloads_count', 'views_count', 'likes_count',
-            'uploaded_at', 'is_featured',
-            'category__name', 'category__slug', 'category__color',
-            'uploaded_by__username'
-        )),
-        'page_obj': page_obj,
-        'has_next': page_obj.has_next(),
-        'has_previous': page_obj.has_previous(),
-        'num_pages': page_obj.paginator.num_pages,
+        'files': [_cached_file(row) for row in page_obj.object_list],
+        'count': paginator.count,
+        'number': page_obj.number,
     }
     
     # Кэшируем на 15 минут
@@ -66,55 +151,149 @@ def cache_files_list(category_id=None, file_type=None, page=1):
     return result
 
 
-def cache_featured_files(limit=8):
-    """Кэширует рекомендуемые файлы"""
-    cache_key = get_cache_key('featured_files', limit)
+def file_row_dict(row):
+    """
+    Легковесное представление файла для списков по типу.
+
+    Словарь с ключами, которые выводит archive/includes/file_card.html
+    (в шаблоне file.title, file.file.url, file.category.name работают как у модели).
+    """
+    cached = _cached_file(row)
+    return {
+        'id': row['id'],
+        'pk': row['id'],
+        'title': row['title'],
+        'description': row['description'],
+        'file': cached.file,
+        'thumbnail': cached.thumbnail,
+        'file_type': row['file_type'],
+        'file_extension': cached.file_extension,
+        'file_size': cached.file_size,
+        'downloads_count': row['downloads_count'],
+        'views_count': row['views_count'],
+        'likes_count': row['likes_count'],
+        'uploaded_at': row['uploaded_at'],
+        'is_public': row['is_public'],
+        'category': {
+            'id': row['category_id'],
+            'name': row['category__name'],
+            'color': row['category__color'],
+        } if row['category_id'] else None,
+    }
+
+
+def _encode_cursor(row):
+    """Позиция в списке, отсортированном по (-uploaded_at, -id): '<микросекунды>_<id>'"""
+    delta = row['uploaded_at'] - datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    return f'{delta // timedelta(microseconds=1)}_{row["id"]}'
+
+
+def _decode_cursor(cursor):
+    """(uploaded_at, id) из позиции; None, если позиция некорректна"""
+    try:
+        micros, pk = (int(part) for part in str(cursor).split('_'))
+        return datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=micros), pk
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def cache_files_keyset(file_type=None, category_id=None, after=None, per_page=24):
+    """
+    Кэширует страницу списка публичных файлов с пагинацией по ключу.
+
+    Страница - файлы, загруженные раньше позиции after (см. _encode_cursor),
+    поэтому стоимость запроса не зависит от номера страницы (без OFFSET):
+    частичный индекс публичных файлов (file_type, uploaded_at, id) отдает
+    ровно per_page строк.
+    Возвращает {'files': [dict], 'next': позиция следующей страницы или None}.
+    """
+    position = _decode_cursor(after) if after else None
+    cache_key = get_cache_key(
+        'files_keyset',
+        file_type or 'all',
+        category_id or 'all',
+        after if position else 'first',
+        per_page,
+        namespaces=[f'file_category:{category_id}' if category_id else 'files']
+    )
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
         return cached_data
     
-    from .models import ArchiveFile
+    files = _public_files()
+    if file_type:
+        files = files.filter(file_type=file_type)
+    if category_id:
+        files = files.filter(category_id=category_id)
+    if position:
+        uploaded_at, pk = position
+        files = files.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk))
     
-    featured_files = ArchiveFile.objects.filter(
-        is_public=True,
-        is_featured=True
-    ).select_related('category', 'uploaded_by').order_by('-uploaded_at')[:limit]
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = list(files.order_by('-uploaded_at', '-id').values(*FILE_LIST_FIELDS)[:per_page + 1])
+    result = {
+        'files': [file_row_dict(row) for row in rows[:per_page]],
+        'next': _encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None,
+    }
     
-    result = list(featured_files.values(
-        'id', 'title', 'slug', 'description', 'thumbnail',
-        'file_type', 'downloads_count', 'views_count', 'likes_count',
-        'uploaded_at',
-        'category__name', 'category__slug', 'category__color',
-        'uploaded_by__username'
-    ))
+    # Кэшируем на 15 минут
+    cache.set(cache_key, result, 900)
+    return result
+
+
+def cache_files_count(file_type=None, category_id=None):
+    """Кэширует количество публичных файлов типа / категории"""
+    cache_key = get_cache_key(
+        'files_count', file_type or 'all', category_id or 'all',
+        namespaces=[f'file_category:{category_id}' if category_id else 'files']
+    )
+    
+    cached_data = cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data
+    
+    files = _public_files()
+    if file_type:
+        files = files.filter(file_type=file_type)
+    if category_id:
+        files = files.filter(category_id=category_id)
+    count = files.count()
     
     # Кэшируем на 1 час
-    cache.set(cache_key, result, 3600)
-    return result
+    cache.set(cache_key, count, 3600)
+    return count
 
 
-def cache_recent_files(limit=8):
-    """Кэширует последние файлы"""
-    cache_key = get_cache_key('recent_files', limit)
+def cache_featured_files(limit=8):
+    """Кэширует рекомендуемые файлы"""
+    cache_key = get_cache_key('featured_files', limit, namespaces=['files'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
         return cached_data
     
-    from .models import ArchiveFile
+    result = _cached_files(
+        _public_files().filter(is_featured=True).order_by('-uploaded_at')[:limit]
+    )
     
-    recent_files = ArchiveFile.objects.filter(
-        is_public=True
-    ).select_related('category', 'uploaded_by').order_by('-uploaded_at')[:limit]
+    # Кэшируем на 1 час
+    cache.set(cache_key, result, 3600)
+    return result
+
+
+def cache_recent_files(limit=8, file_type=None):
+    """Кэширует последние файлы (при необходимости - только заданного типа)"""
+    cache_key = get_cache_key('recent_files', limit, file_type or 'all', namespaces=['files'])
     
-    result = list(recent_files.values(
-        'id', 'title', 'slug', 'description', 'thumbnail',
-        'file_type', 'downloads_count', 'views_count', 'likes_count',
-        'uploaded_at',
-        'category__name', 'category__slug', 'category__color',
-        'uploaded_by__username'
-    ))
+    cached_data = cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data
+    
+    files = _public_files()
+    if file_type:
+        files = files.filter(file_type=file_type)
+    result = _cached_files(files.order_by('-uploaded_at')[:limit])
     
     # Кэшируем на 30 минут
     cache.set(cache_key, result, 1800)
@@ -123,28 +302,17 @@ def cache_recent_files(limit=8):
 
 def cache_popular_files(limit=8):
     """Кэширует популярные файлы"""
-    cache_key = get_cache_key('popular_files', limit)
+    cache_key = get_cache_key('popular_files', limit, namespaces=['files'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
         return cached_data
     
-    from .models import ArchiveFile
-    
     # Файлы с наибольшим количеством скачиваний за последние 30 дней
     thirty_days_ago = timezone.now() - timedelta(days=30)
-    popular_files = ArchiveFile.objects.filter(
-        is_public=True,
+    result = _cached_files(_public_files().filter(
         uploaded_at__gte=thirty_days_ago
-    ).select_related('category', 'uploaded_by').order_by('-downloads_count')[:limit]
-    
-    result = list(popular_files.values(
-        'id', 'title', 'slug', 'description', 'thumbnail',
-        'file_type', 'downloads_count', 'views_count', 'likes_count',
-        'uploaded_at',
-        'category__name', 'category__slug', 'category__color',
-        'uploaded_by__username'
-    ))
+    ).order_by('-downloads_count')[:limit])
     
     # Кэшируем на 1 час
     cache.set(cache_key, result, 3600)
@@ -153,7 +321,7 @@ def cache_popular_files(limit=8):
 
 def cache_file_categories():
     """Кэширует категории файлов с количеством"""
-    cache_key = get_cache_key('file_categories')
+    cache_key = get_cache_key('file_categories', namespaces=['file_categories'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
@@ -161,15 +329,12 @@ def cache_file_categories():
     
     from .models import FileCategory
     
-    categories = FileCategory.objects.filter(
-        is_active=True
-    ).annotate(
-        files_count=Count('files', filter=Q(files__is_public=True))
-    ).order_by('name')
+    # Количество файлов хранится в FileCategory.files_count (см. Archive.counters)
+    categories = FileCategory.objects.filter(is_active=True).order_by('name')
     
-    result = list(categories.values(
+    result = [CachedFileCategory(row) for row in categories.values(
         'id', 'name', 'slug', 'description', 'color', 'icon', 'image', 'files_count'
-    ))
+    )]
     
     # Кэшируем на 2 часа
     cache.set(cache_key, result, 7200)
@@ -178,7 +343,7 @@ def cache_file_categories():
 
 def cache_file_detail(file_id):
     """Кэширует детали файла"""
-    cache_key = get_cache_key('file_detail', file_id)
+    cache_key = get_cache_key('file_detail', file_id, namespaces=[f'file:{file_id}'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
@@ -232,96 +397,91 @@ def cache_file_detail(file_id):
         return None
 
 
-def cache_user_files(username, page=1):
-    """Кэширует файлы пользователя"""
-    cache_key = get_cache_key('user_files', username, page)
+def cache_user_files(username, page=1, per_page=12):
+    """Кэширует страницу файлов пользователя"""
+    cache_key = get_cache_key(
+        'user_files', username, page, per_page, namespaces=[f'user_files:{username}']
+    )
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
         return cached_data
     
-    from .models import ArchiveFile
     from django.contrib.auth.models import User
     
-    try:
-        user = User.objects.get(username=username)
-        files = ArchiveFile.objects.filter(
-            uploaded_by=user,
-            is_public=True
-        ).select_related('category').order_by('-uploaded_at')
-        
-        # Пагинация
-        from django.core.paginator import Paginator
-        paginator = Paginator(files, 12)
-        page_obj = paginator.get_page(page)
-        
-        result = {
-            'files': list(page_obj.object_list.values(
-                'id', 'title', 'slug', 'description', 'thumbnail',
-                'file_type', 'downloads_count', 'views_count', 'likes_count',
-                'uploaded_at', 'is_featured',
-                'category__name', 'category__slug', 'category__color'
-            )),
-            'page_obj': page_obj,
-            'has_next': page_obj.has_next(),
-            'has_previous': page_obj.has_previous(),
-            'num_pages': page_obj.paginator.num_pages,
-        }
-        
-        # Кэшируем на 30 минут
-        cache.set(cache_key, result, 1800)
-        return result
-        
-    except User.DoesNotExist:
+    if not User.objects.filter(username=username).exists():
         return None
-
-
-def invalidate_file_cache(file_id=None, category_id=None, username=None):
-    """Инвалидирует кэш файлов при изменении"""
-    # Очищаем кэш списков файлов
-    cache.delete_many([
-        get_cache_key('files_list', 'all', 'all', 1),
-        get_cache_key('featured_files', 8),
-        get_cache_key('recent_files', 8),
-        get_cache_key('popular_files', 8),
-    ])
     
-    # Очищаем кэш категорий
-    cache.delete(get_cache_key('file_categories'))
+    files = _public_files().filter(uploaded_by__username=username)
     
-    # Очищаем кэш конкретного файла
-    if file_id:
-        cache.delete(get_cache_key('file_detail', file_id))
+    # Пагинация
+    paginator = Paginator(files.order_by('-uploaded_at', '-id').values(*FILE_LIST_FIELDS), per_page)
+    page_obj = paginator.get_page(page)
     
-    # Очищаем кэш по категории
-    if category_id:
-        for page in range(1, 10):  # Очищаем первые 10 страниц
-            cache.delete(get_cache_key('files_list', category_id, 'all', page))
+    result = {
+        'files': [_cached_file(row) for row in page_obj.object_list],
+        'count': paginator.count,
+        'number': page_obj.number,
+    }
     
-    # Очищаем кэш пользователя
+    # Кэшируем на 30 минут
+    cache.set(cache_key, result, 1800)
+    return result
+
+
+def invalidate_file_cache(file_id=None, category_id=None, username=None, category_ids=()):
+    """
+    Инвалидирует кэш файлов при изменении.
+
+    Увеличивает поколения пространств имен, поэтому инвалидируются
+    все страницы пагинации, а не только первые.
+    """
+    namespaces = ['files', 'file_categories']
+    if file_id:
+        namespaces.append(f'file:{file_id}')
+    for pk in {category_id, *category_ids}:
+        if pk:
+            namespaces.append(f'file_category:{pk}')
     if username:
-        for page in range(1, 10):  # Очищаем первые 10 страниц
-            cache.delete(get_cache_key('user_files', username, page))
+        namespaces.append(f'user_files:{username}')
+    bump_generation(*namespaces)
+
+
+# Период активности на главной архива (дни)
+RECENT_STATS_DAYS = 30
 
 
 def cache_file_statistics():
-    """Кэширует статистику файлов"""
-    cache_key = get_cache_key('file_statistics')
+    """
+    Кэширует статистику файлов.
+
+    Активность за последние дни берется из дневной статистики
+    (Home.rollups), а не из строк скачиваний.
+    """
+    cache_key = get_cache_key('file_statistics', namespaces=['files', 'stats'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
         return cached_data
     
-    from .models import ArchiveFile, FileCategory
+    from .models import DailyFileStats, FileCategory
     
+    totals = _public_files().aggregate(
+        total_files=Count('id'),
+        total_downloads=Sum('downloads_count')
+    )
+    recent = DailyFileStats.objects.filter(
+        date__gt=timezone.localdate() - timedelta(days=RECENT_STATS_DAYS),
+        file__is_public=True,
+    ).aggregate(downloads=Sum('downloads'), views=Sum('views'))
     stats = {
-        'total_files': ArchiveFile.objects.filter(is_public=True).count(),
-        'total_downloads': ArchiveFile.objects.filter(is_public=True).aggregate(
-            total=Count('downloads_count')
-        )['total'] or 0,
-        'files_by_type': list(ArchiveFile.objects.filter(is_public=True).values(
+        'total_files': totals['total_files'],
+        'total_downloads': totals['total_downloads'] or 0,
+        'recent_downloads': recent['downloads'] or 0,
+        'recent_views': recent['views'] or 0,
+        'files_by_type': list(_public_files().values(
             'file_type'
-        ).annotate(count=Count('id'))),
+        ).annotate(count=Count('id')).order_by('file_type')),
         'categories_count': FileCategory.objects.filter(is_active=True).count(),
     }
     
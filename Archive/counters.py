@@ -0,0 +1,51 @@
+"""
+Счетчики файлов категорий архива и тегов
+
+FileCategory.files_count и Tag.archive_files_count хранятся в таблицах
+и пересчитываются точно только для затронутых строк (см. Blog.counters).
+"""
+from django.db import transaction
+
+from Blog.counters import count_subquery, reconcile_field, recount_tags
+from Home.cache_utils import bump_generation
+
+
+def recount_file_categories(category_ids=None):
+    """Пересчитывает FileCategory.files_count (для всех категорий, если ids не заданы)"""
+    from .models import ArchiveFile, FileCategory
+
+    categories = FileCategory.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=[pk for pk in category_ids if pk])
+    return reconcile_field(
+        categories, 'files_count',
+        count_subquery(ArchiveFile.objects.filter(is_public=True), 'category')
+    )
+
+
+def file_counters_changed(archive_file, old_is_public, old_category_id):
+    """
+    Обновляет счетчики после сохранения файла.
+
+    Категории пересчитываются при смене публичности и категории публичного
+    файла, теги - при смене публичности (изменения набора тегов учитывает
+    Blog.tags.sync_object_tags).
+    """
+    was_public = bool(old_is_public)
+    is_public = archive_file.is_public
+    if not (was_public or is_public):
+        return
+
+    visibility_changed = was_public != is_public
+    if not (visibility_changed or old_category_id != archive_file.category_id):
+        return
+    with transaction.atomic():
+        recount_file_categories({old_category_id, archive_file.category_id})
+        if visibility_changed:
+            recount_tags(
+                archive_file.tag_objects.through.objects.filter(
+                    archivefile_id=archive_file.pk
+                ).values_list('tag_id', flat=True)
+            )
+    # post_save сбросил кэш до пересчета - сбрасываем списки еще раз
+    bump_generation('file_categories', 'tags')
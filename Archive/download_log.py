@@ -0,0 +1,173 @@
+"""
+Буферизованная запись скачиваний файлов архива (write-behind)
+
+Скачивание не пишет в базу данных: событие (файл, пользователь, IP,
+User-Agent, время) попадает в кольцевой буфер процесса. Буфер сбрасывается
+одним bulk_create, когда накопится FLUSH_SIZE событий, раз в FLUSH_INTERVAL
+секунд (фоновый поток) и при остановке процесса. В той же транзакции
+ArchiveFile.downloads_count увеличивается UPDATE с F()-выражением - один
+запрос на группу файлов с одинаковым приращением (как Home.view_counters).
+
+Емкость буфера ограничена CAPACITY: если БД долго недоступна, самые старые
+события вытесняются, а не копятся в памяти без предела.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger('nlpers')
+
+# Сброс при накоплении стольких событий
+FLUSH_SIZE = getattr(settings, 'ARCHIVE_DOWNLOAD_FLUSH_SIZE', 100)
+
+# Максимальное время ожидания события в буфере (секунды)
+FLUSH_INTERVAL = getattr(settings, 'ARCHIVE_DOWNLOAD_FLUSH_INTERVAL', 30)
+
+# Максимум несброшенных событий в процессе
+CAPACITY = getattr(settings, 'ARCHIVE_DOWNLOAD_BUFFER_CAPACITY', 10000)
+
+
+@dataclass(frozen=True)
+class DownloadEvent:
+    file_id: int
+    user_id: int | None
+    ip_address: str | None
+    user_agent: str
+    downloaded_at: datetime
+
+
+class DownloadBuffer:
+    """Кольцевой буфер событий скачивания с пакетным сбросом в БД"""
+
+    def __init__(self, flush_size=FLUSH_SIZE, interval=FLUSH_INTERVAL, capacity=CAPACITY):
+        self.flush_size = flush_size
+        self.interval = interval
+        self._events = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._dropped = 0
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, file_id, user_id=None, ip_address=None, user_agent=''):
+        """Регистрирует скачивание; при заполнении буфера сбрасывает его"""
+        event = DownloadEvent(file_id, user_id, ip_address, user_agent, timezone.now())
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self._dropped += 1
+            self._events.append(event)
+            pending = len(self._events)
+            self._ensure_thread()
+
+        if pending >= self.flush_size:
+            self.flush()
+
+    def _ensure_thread(self):
+        """Запускает фоновый сброс по времени (в т.ч. заново после fork)"""
+        if self.interval and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(
+                target=self._run, name='archive-download-flush', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._wakeup.wait(self.interval):
+            # У потока свое соединение с БД: закрываем устаревшее и
+            # оборванное (как после запроса, CONN_MAX_AGE)
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Ошибка фонового сброса скачиваний')
+            finally:
+                close_old_connections()
+
+    def _take(self):
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            logger.warning('Буфер скачиваний переполнен, потеряно событий: %s', dropped)
+        return events
+
+    def _restore(self, events):
+        """Возвращает события в начало буфера, если запись в БД не удалась"""
+        with self._lock:
+            newer = list(self._events)
+            self._events.clear()
+            self._events.extend(events)
+            self._events.extend(newer)
+
+    def flush(self):
+        """
+        Записывает накопленные скачивания в БД.
+
+        Выполняет один bulk_create строк Download и по одному UPDATE
+        downloads_count на группу файлов с одинаковым приращением.
+        Возвращает количество записанных событий.
+        """
+        from .models import ArchiveFile, Download
+
+        if not self._flush_lock.acquire(blocking=False):
+            # Сброс уже выполняется в другом потоке
+            return 0
+        try:
+            events = self._take()
+            if not events:
+                return 0
+            try:
+                with transaction.atomic():
+                    # Файл или пользователь могли быть удалены, пока событие ждало сброса
+                    file_ids = set(ArchiveFile.objects.filter(
+                        pk__in={event.file_id for event in events}
+                    ).values_list('pk', flat=True))
+                    user_ids = set(get_user_model().objects.filter(
+                        pk__in={event.user_id for event in events if event.user_id}
+                    ).values_list('pk', flat=True))
+                    events = [event for event in events if event.file_id in file_ids]
+
+                    Download.objects.bulk_create([
+                        Download(
+                            file_id=event.file_id,
+                            user_id=event.user_id if event.user_id in user_ids else None,
+                            ip_address=event.ip_address,
+                            user_agent=event.user_agent,
+                            downloaded_at=event.downloaded_at,
+                        )
+                        for event in events
+                    ], batch_size=500)
+
+                    groups = {}
+                    for file_id, amount in Counter(event.file_id for event in events).items():
+                        groups.setdefault(amount, []).append(file_id)
+                    for amount, pks in groups.items():
+                        ArchiveFile.objects.filter(pk__in=pks).update(
+                            downloads_count=F('downloads_count') + amount
+                        )
+            except Exception:
+                logger.exception('Не удалось записать скачивания в БД')
+                self._restore(events)
+                return 0
+            return len(events)
+        finally:
+            self._flush_lock.release()
+
+
+download_buffer = DownloadBuffer()
+
+
+# Сбрасываем буфер при остановке процесса
+atexit.register(download_buffer.flush)
@@ -0,0 +1,262 @@
+"""
+Отдача файлов архива: потоковое скачивание, HTTP Range и условные запросы
+
+Файл читается из хранилища блоками (FileResponse / StreamingHttpResponse),
+поддерживаются диапазоны байт (один диапазон - перемотка видео и аудио,
+докачка), ETag/Last-Modified с ответами 304 и 412 и If-Range.
+
+Отдачу можно передать фронтенд-серверу (ARCHIVE_DOWNLOAD_OFFLOAD):
+- 'x-accel-redirect' - nginx, internal location с префиксом
+  ARCHIVE_ACCEL_REDIRECT_PREFIX, указывающий на MEDIA_ROOT;
+- 'x-sendfile' - Apache mod_xsendfile / lighttpd, абсолютный путь файла.
+В этом случае Django проверяет доступ и заголовки, а диапазоны обрабатывает сервер.
+
+Скачивание учитывается после отправки ответа: ответ закрывает файл
+(NotifyingFile), и только тогда вызывается record_download.
+"""
+import hashlib
+import logging
+import mimetypes
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+logger = logging.getLogger('nlpers')
+
+
+# Передача отдачи фронтенд-серверу: None, 'x-accel-redirect' или 'x-sendfile'
+DOWNLOAD_OFFLOAD = getattr(settings, 'ARCHIVE_DOWNLOAD_OFFLOAD', None)
+
+# Internal location nginx, соответствующий MEDIA_ROOT
+ACCEL_REDIRECT_PREFIX = getattr(settings, 'ARCHIVE_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Размер блока чтения при потоковой отдаче
+CHUNK_SIZE = 64 * 1024
+
+# Браузер может кэшировать файл, но обязан проверять его актуальность
+CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_validators(file_obj):
+    """ETag и время изменения (timestamp) файла; None, если файла нет в хранилище"""
+    storage = file_obj.file.storage
+    name = file_obj.file.name
+    try:
+        size = storage.size(name)
+    except (OSError, NotImplementedError):
+        return None
+    try:
+        modified = storage.get_modified_time(name).timestamp()
+    except (OSError, NotImplementedError):
+        modified = file_obj.updated_at.timestamp()
+    etag = '"%s"' % hashlib.md5(f'{name}:{size}:{modified}'.encode()).hexdigest()
+    return size, etag, int(modified)
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range для файла размера size.
+
+    Возвращает (start, end) включительно, None - если диапазон не задан
+    или не поддерживается (несколько диапазонов: отдается весь файл),
+    False - если диапазон невыполним (416).
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N: последние N байт
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    """If-Range: диапазон применяется, только если файл не изменился"""
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith('W/'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+class NotifyingFile:
+    """
+    Файл, который после закрытия вызывает callback.
+
+    Ответ закрывает файл, когда сервер отправил его клиенту (или
+    соединение оборвалось), поэтому callback выполняется после отдачи.
+    """
+
+    def __init__(self, fh, callback):
+        self._fh = fh
+        self._callback = callback
+
+    def __getattr__(self, name):
+        return getattr(self._fh, name)
+
+    def __iter__(self):
+        return iter(self._fh)
+
+    def close(self):
+        try:
+            self._fh.close()
+        finally:
+            callback, self._callback = self._callback, None
+            if callback is not None:
+                callback()
+
+
+class FileRange:
+    """Итератор по диапазону байт файла; close() (вызывает ответ) закрывает файл"""
+
+    def __init__(self, fh, start, length):
+        self.fh = fh
+        self.start = start
+        self.length = length
+
+    def __iter__(self):
+        self.fh.seek(self.start)
+        remaining = self.length
+        while remaining > 0:
+            chunk = self.fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def close(self):
+        self.fh.close()
+
+
+def _offload_response(file_obj):
+    response = HttpResponse()
+    name = file_obj.file.name
+    if DOWNLOAD_OFFLOAD == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(posixpath.join(ACCEL_REDIRECT_PREFIX, name))
+    else:
+        response['X-Sendfile'] = file_obj.file.path
+    # Тип содержимого определяет фронтенд-сервер
+    del response['Content-Type']
+    return response
+
+
+def _open(file_obj, callback=None):
+    fh = file_obj.file.storage.open(file_obj.file.name, 'rb')
+    return NotifyingFile(fh, callback) if callback is not None else fh
+
+
+def download_filename(file_obj):
+    """
+    Имя файла для браузера: slug файла архива и расширение загруженного файла.
+
+    Имя блоба - это хэш, а его расширение - от первой загрузки того же
+    содержимого, поэтому расширение берется из original_filename.
+    """
+    original = file_obj.original_filename or file_obj.file.name
+    extension = posixpath.splitext(original)[1].lower()
+    if file_obj.slug:
+        return f'{file_obj.slug}{extension}'
+    return posixpath.basename(original)
+
+
+def serve_file(request, file_obj, as_attachment=True, on_download=None):
+    """
+    Ответ с содержимым файла архива.
+
+    Возвращает (response, counted): counted - считать ли запрос скачиванием
+    (полная отдача или диапазон с начала файла, не HEAD, не 304).
+    on_download вызывается для таких запросов после отправки файла
+    (при передаче отдачи фронтенд-серверу - сразу).
+    """
+    validators = file_validators(file_obj)
+    if validators is None:
+        return None, False
+    size, etag, last_modified = validators
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        conditional['Cache-Control'] = CACHE_CONTROL
+        return conditional, False
+
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    filename = download_filename(file_obj)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response, False
+
+    counted = request.method == 'GET' and (byte_range is None or byte_range[0] == 0)
+    callback = on_download if counted else None
+
+    if DOWNLOAD_OFFLOAD:
+        response = _offload_response(file_obj)
+        if callback is not None:
+            callback()
+    elif byte_range is None:
+        response = FileResponse(
+            _open(file_obj, callback), as_attachment=as_attachment, filename=filename
+        )
+        response.block_size = CHUNK_SIZE
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            FileRange(_open(file_obj, callback), start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+
+    if not response.has_header('Content-Disposition'):
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = CACHE_CONTROL
+    return response, counted
+
+
+def client_info(request):
+    """(id пользователя, IP, User-Agent) для записи скачивания"""
+    user = getattr(request, 'user', None)
+    return (
+        user.pk if user is not None and user.is_authenticated else None,
+        request.META.get('REMOTE_ADDR') or None,
+        request.META.get('HTTP_USER_AGENT', '')[:1000],
+    )
+
+
+def record_download(file_obj, user_id, ip_address, user_agent):
+    """Учитывает скачивание через буфер (см. Archive.download_log)"""
+    from .download_log import download_buffer
+
+    try:
+        download_buffer.add(file_obj.pk, user_id, ip_address, user_agent)
+    except Exception:
+        logger.exception('Не удалось записать скачивание файла %s', file_obj.pk)
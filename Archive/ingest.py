@@ -0,0 +1,382 @@
+"""
+Массовая загрузка файлов в архив (команда ingest_archive_files)
+
+Источник - дерево каталогов или манифест (CSV или JSONL) со строками
+path, title, description, category, tags, file_type, is_public, is_featured.
+
+Файлы обрабатываются пакетами:
+1. в пуле процессов каждый файл читается один раз - SHA-256, MIME-тип,
+   размеры и длительность (Archive.metadata), для изображений сразу
+   строится превью;
+2. файл и превью сохраняются в хранилище (с дедупликацией по SHA-256,
+   хэш повторно не считается);
+3. строки ArchiveFile и связи с тегами создаются bulk_create в одной
+   транзакции на пакет, счетчики ссылок блобов - UPDATE с F().
+
+Сигналы post_save при bulk_create не отправляются, поэтому счетчики
+категорий и тегов пересчитываются и кэш сбрасывается один раз в конце.
+Копии превью для srcset создаются в фоне после первого показа (Home.images).
+
+Возобновление: после фиксации пакета его файлы дописываются в журнал
+(JSONL, путь -> id); повторный запуск пропускает записанные файлы.
+Файл с тем же SHA-256, уже загруженный этим пользователем, не создается повторно.
+"""
+import csv
+import io
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import F
+
+from Blog.counters import recount_tags
+from Blog.tags import parse_tag_names, resolve_tags
+from Blog.utils import allocate_unique_slugs
+from Home.cache_utils import bump_generation
+
+from .counters import recount_file_categories
+from .metadata import METADATA_FIELDS, extract_metadata, file_type_for_mime
+from .storage import is_blob_name
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Размер превью изображений (вписывается в квадрат)
+THUMBNAIL_SIZE = (640, 640)
+
+BATCH_SIZE = 200
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да', 'on'}
+
+
+class IngestError(Exception):
+    """Ошибка входных данных загрузки (манифест, категория, пользователь)"""
+
+
+@dataclass
+class IngestEntry:
+    path: str
+    title: str = ''
+    description: str = ''
+    category: str = ''
+    tags: str = ''
+    file_type: str = ''
+    is_public: bool | None = None
+    is_featured: bool = False
+
+
+def title_from_filename(path):
+    """Название по имени файла: 'corpus_part-01.txt' -> 'corpus part 01'"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return ' '.join(stem.replace('_', ' ').replace('-', ' ').split()) or stem
+
+
+def _parse_bool(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def iter_directory(root, exclude=()):
+    """Файлы дерева каталогов в алфавитном порядке (скрытые пропускаются)"""
+    root = os.path.abspath(root)
+    exclude = {os.path.abspath(path) for path in exclude}
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            if not filename.startswith('.') and path not in exclude:
+                yield IngestEntry(path=path, title=title_from_filename(path))
+
+
+def read_manifest(manifest_path):
+    """Записи манифеста CSV или JSONL; относительные пути - от каталога манифеста"""
+    from .models import ArchiveFile
+
+    file_types = {value for value, _ in ArchiveFile.FILE_TYPE_CHOICES}
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, encoding='utf-8-sig', newline='') as fh:
+        if manifest_path.lower().endswith('.csv'):
+            rows = list(csv.DictReader(fh))
+        else:
+            rows = []
+            for number, line in enumerate(fh, 1):
+                if line.strip():
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        raise IngestError(f'Строка {number} манифеста - некорректный JSON')
+
+    for number, row in enumerate(rows, 1):
+        path = (row.get('path') or row.get('file') or '').strip()
+        if not path:
+            raise IngestError(f'Запись {number} манифеста: не указан path')
+        tags = row.get('tags') or ''
+        if isinstance(tags, (list, tuple)):
+            tags = ', '.join(tags)
+        # bulk_create не проверяет choices - неизвестный тип не попал бы ни в один список
+        file_type = (row.get('file_type') or '').strip().lower()
+        if file_type and file_type not in file_types:
+            raise IngestError(
+                f'Запись {number} манифеста: неизвестный file_type "{file_type}" '
+                f'(допустимо: {", ".join(sorted(file_types))})'
+            )
+        path = os.path.normpath(os.path.join(base, path))
+        yield IngestEntry(
+            path=path,
+            title=(row.get('title') or '').strip() or title_from_filename(path),
+            description=row.get('description') or '',
+            category=str(row.get('category') or '').strip(),
+            tags=tags,
+            file_type=file_type,
+            is_public=_parse_bool(row.get('is_public')),
+            is_featured=bool(_parse_bool(row.get('is_featured'))),
+        )
+
+
+def make_thumbnail(path):
+    """JPEG-превью изображения (bytes) или None"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(THUMBNAIL_SIZE)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=85, optimize=True)
+            return buffer.getvalue()
+    except Exception:
+        return None
+
+
+def inspect_file(path):
+    """
+    Обработка файла в процессе пула: метаданные и превью.
+
+    Не обращается к БД. Возвращает {'metadata', 'thumbnail'} или {'error'}.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            metadata = extract_metadata(File(fh, name=path), close=False)
+    except OSError as e:
+        return {'error': str(e)}
+    thumbnail = None
+    if (metadata['mime_type'] or '').startswith('image/'):
+        thumbnail = make_thumbnail(path)
+    return {'metadata': metadata, 'thumbnail': thumbnail}
+
+
+def _init_worker():
+    # При запуске процессов через spawn (macOS, Windows) Django нужно настроить заново
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def load_journal(state_path):
+    """Пути уже загруженных файлов из журнала"""
+    done = set()
+    if state_path and os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as fh:
+            for line in fh:
+                try:
+                    done.add(json.loads(line)['path'])
+                except (ValueError, KeyError):
+                    # Недописанная строка прерванного запуска
+                    continue
+    return done
+
+
+class ArchiveIngest:
+    """Загрузка набора файлов от имени пользователя"""
+
+    def __init__(self, user, state_path, category=None, tags='', is_public=None,
+                 workers=None, batch_size=BATCH_SIZE, allow_duplicates=False, log=None):
+        self.user = user
+        self.state_path = state_path
+        self.default_category = category
+        self.default_tags = tags
+        # Как в FileUploadView: без модерации публикуют только сотрудники
+        self.can_publish = user.is_staff
+        self.is_public = is_public
+        self.workers = workers
+        self.batch_size = batch_size
+        self.allow_duplicates = allow_duplicates
+        self.log = log or (lambda message: None)
+        self.stats = Counter()
+        self._categories = {}
+        self._category_ids = set()
+        self._tag_ids = set()
+        self._seen_hashes = set()
+
+    def resolve_category(self, value):
+        """id категории по id, slug или названию"""
+        from .models import FileCategory
+
+        if not value:
+            return None
+        if value not in self._categories:
+            categories = FileCategory.objects.all()
+            category = (
+                categories.filter(pk=int(value)).first() if value.isdigit() else None
+            ) or categories.filter(slug=value).first() or categories.filter(name=value).first()
+            if category is None:
+                raise IngestError(f'Категория не найдена: {value}')
+            self._categories[value] = category.pk
+        return self._categories[value]
+
+    def run(self, entries):
+        """Загружает записи; возвращает статистику (Counter)"""
+        from .models import ArchiveFile
+
+        done = load_journal(self.state_path)
+        pending = []
+        for entry in entries:
+            if entry.path in done:
+                self.stats['resumed'] += 1
+            elif not os.path.isfile(entry.path):
+                self.stats['not_found'] += 1
+                self.log(f'Файл не найден: {entry.path}')
+            else:
+                # Категории проверяются до начала загрузки
+                self.resolve_category(entry.category or self.default_category)
+                pending.append(entry)
+
+        if not pending:
+            return self.stats
+        self._seen_hashes = set(
+            ArchiveFile.objects.filter(uploaded_by=self.user).exclude(sha256='')
+            .values_list('sha256', flat=True).iterator(chunk_size=5000)
+        )
+
+        # Соединения с БД не должны наследоваться процессами пула
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor, \
+                open(self.state_path, 'a', encoding='utf-8') as journal:
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                results = list(executor.map(inspect_file, [entry.path for entry in batch], chunksize=4))
+                self._ingest_batch(batch, results, journal)
+                self.log(f'Обработано {min(start + self.batch_size, len(pending))} из {len(pending)}')
+
+        self._finish()
+        return self.stats
+
+    def _store(self, field_name, filename, content):
+        from .models import ArchiveFile
+
+        field = ArchiveFile._meta.get_field(field_name)
+        return field.storage.save(field.generate_filename(None, filename), content, max_length=field.max_length)
+
+    def _ingest_batch(self, batch, results, journal):
+        from .models import ArchiveFile, FileBlob
+
+        accepted = []
+        for entry, result in zip(batch, results):
+            if 'error' in result:
+                self.stats['errors'] += 1
+                self.log(f'Ошибка чтения {entry.path}: {result["error"]}')
+                continue
+            sha256 = result['metadata']['sha256']
+            if sha256 in self._seen_hashes and not self.allow_duplicates:
+                self.stats['duplicates'] += 1
+                journal.write(json.dumps({'path': entry.path, 'duplicate': sha256}, ensure_ascii=False) + '\n')
+                continue
+            self._seen_hashes.add(sha256)
+            accepted.append((entry, result))
+        if not accepted:
+            journal.flush()
+            return
+
+        # Файлы сохраняются до транзакции; если она не удалась, блобы
+        # без ссылок удалит gc_archive_blobs, превью - check_archive_files
+        objects = []
+        slugs = allocate_unique_slugs(
+            {index: entry.title for index, (entry, _) in enumerate(accepted)},
+            ArchiveFile, fallback_prefix='file'
+        )
+        for index, (entry, result) in enumerate(accepted):
+            metadata = result['metadata']
+            filename = os.path.basename(entry.path)
+            with open(entry.path, 'rb') as fh:
+                content = File(fh, name=filename)
+                # Хранилище с дедупликацией не будет считать хэш повторно
+                content.sha256 = metadata['sha256']
+                name = self._store('file', filename, content)
+            thumbnail = None
+            if result['thumbnail']:
+                thumbnail = self._store(
+                    'thumbnail', f'{os.path.splitext(filename)[0]}.jpg', ContentFile(result['thumbnail'])
+                )
+
+            is_public = self.can_publish and (
+                entry.is_public if entry.is_public is not None else self.is_public is not False
+            )
+            objects.append(ArchiveFile(
+                title=entry.title[:200],
+                slug=slugs[index],
+                description=entry.description,
+                file=name,
+                original_filename=filename[:255],
+                thumbnail=thumbnail,
+                file_type=entry.file_type or file_type_for_mime(metadata['mime_type']),
+                category_id=self.resolve_category(entry.category or self.default_category),
+                uploaded_by=self.user,
+                tags=', '.join(parse_tag_names(entry.tags or self.default_tags))[:200],
+                is_public=is_public,
+                is_featured=entry.is_featured and self.can_publish,
+                **{field: metadata[field] for field in METADATA_FIELDS},
+            ))
+
+        with transaction.atomic():
+            ArchiveFile.objects.bulk_create(objects, batch_size=500)
+
+            names = {name for obj in objects for name in parse_tag_names(obj.tags)}
+            tag_ids = resolve_tags(sorted(names)) if names else {}
+            through = ArchiveFile.tag_objects.through
+            through.objects.bulk_create([
+                through(archivefile_id=obj.pk, tag_id=tag_ids[name])
+                for obj in objects for name in parse_tag_names(obj.tags)
+            ], batch_size=1000, ignore_conflicts=True)
+
+            # Ссылки на блобы (как ArchiveFile.save -> file_reference_changed)
+            references = Counter(obj.file.name for obj in objects if is_blob_name(obj.file.name))
+            by_amount = {}
+            for name, amount in references.items():
+                by_amount.setdefault(amount, []).append(name)
+            for amount, blob_names in by_amount.items():
+                FileBlob.objects.filter(name__in=blob_names).update(ref_count=F('ref_count') + amount)
+
+        for (entry, _), obj in zip(accepted, objects):
+            journal.write(json.dumps({'path': entry.path, 'id': obj.pk}, ensure_ascii=False) + '\n')
+        journal.flush()
+
+        self.stats['created'] += len(objects)
+        self.stats['thumbnails'] += sum(1 for obj in objects if obj.thumbnail)
+        self._category_ids.update(obj.category_id for obj in objects if obj.category_id)
+        self._tag_ids.update(tag_ids.values())
+
+    def _finish(self):
+        """Счетчики и кэш - один раз после загрузки (bulk_create не отправляет сигналы)"""
+        from Blog.models import Tag
+
+        recount_file_categories(self._category_ids)
+        recount_tags(self._tag_ids)
+        tag_slugs = Tag.objects.filter(pk__in=self._tag_ids).values_list('slug', flat=True)
+        bump_generation(
+            'files', 'file_categories', 'tags', f'user_files:{self.user.username}',
+            *(f'file_category:{pk}' for pk in self._category_ids),
+            *(f'tag:{slug}' for slug in tag_slugs),
+        )
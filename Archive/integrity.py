@@ -0,0 +1,225 @@
+"""
+Проверка целостности медиафайлов и поиск потерянных файлов
+
+Каталоги MEDIA_ROOT обходятся параллельно (os.scandir в пуле потоков),
+строки моделей читаются потоком (.iterator()), поэтому память зависит
+от количества файлов на диске, а не от объема данных.
+
+Проверяется:
+- у каждого ArchiveFile есть файл на диске, его размер совпадает
+  с size_bytes, а при verify_checksums - SHA-256 совпадает с sha256;
+- потерянные файлы - файлы в каталогах загрузки (upload_to полей
+  FileField всех моделей, блобы архива, копии изображений), на которые
+  не ссылается ни одна строка. Другие каталоги MEDIA_ROOT (загрузки
+  редактора и т.п.) не рассматриваются: ссылки на них хранятся в тексте.
+
+Недавние файлы (моложе grace_period) потерянными не считаются: строка,
+ссылающаяся на только что загруженный файл, может быть еще не зафиксирована.
+"""
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from Home.images import DERIVATIVES_DIR
+
+from .storage import BLOBS_DIR
+
+logger = logging.getLogger('nlpers')
+
+# Файлы моложе этого срока не считаются потерянными
+GRACE_PERIOD = timedelta(hours=24)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_workers():
+    return min(32, (os.cpu_count() or 1) * 4)
+
+
+def file_fields():
+    """[(модель, имя поля)] всех FileField/ImageField проекта"""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.FileField)
+    ]
+
+
+def upload_dirs():
+    """Каталоги MEDIA_ROOT, в которые загружают файлы модели"""
+    dirs = {BLOBS_DIR, DERIVATIVES_DIR}
+    for model, name in file_fields():
+        upload_to = model._meta.get_field(name).upload_to
+        if isinstance(upload_to, str) and upload_to.strip('/'):
+            # Каталог до первой подстановки даты (posts/%Y/%m/ -> posts)
+            static = upload_to.split('%', 1)[0].strip('/')
+            if static:
+                dirs.add(static)
+    # Вложенные каталоги обходятся вместе с родительским
+    return sorted(d for d in dirs if not any(d.startswith(f'{other}/') for other in dirs if other != d))
+
+
+def referenced_names():
+    """Имена файлов хранилища, на которые ссылаются строки БД"""
+    names = set()
+    for model, name in file_fields():
+        names.update(
+            model._default_manager.exclude(**{name: ''}).exclude(**{f'{name}__isnull': True})
+            .values_list(name, flat=True).iterator(chunk_size=5000)
+        )
+    # Блобы учитывает и удаляет gc_archive_blobs, копии изображений - generate_image_derivatives --prune
+    names.update(apps.get_model('Archive.FileBlob').objects.values_list('name', flat=True).iterator(chunk_size=5000))
+    names.update(apps.get_model('Home.ImageDerivative').objects.values_list('name', flat=True).iterator(chunk_size=5000))
+    return names
+
+
+def _scan_directory(path):
+    """Файлы (имя, размер, mtime) и подкаталоги одного каталога"""
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        files.append((entry.path, stat.st_size, stat.st_mtime))
+                except OSError:
+                    logger.warning('Не удалось прочитать %s', entry.path)
+    except OSError:
+        logger.warning('Не удалось прочитать каталог %s', path)
+    return files, subdirs
+
+
+def scan_media(executor, root, directories):
+    """
+    Обходит каталоги параллельно, по уровню дерева за раз.
+
+    Возвращает {имя в хранилище: (размер, mtime)}.
+    """
+    index = {}
+    pending = [os.path.join(root, d) for d in directories if os.path.isdir(os.path.join(root, d))]
+    while pending:
+        next_level = []
+        for files, subdirs in executor.map(_scan_directory, pending):
+            for path, size, mtime in files:
+                index[os.path.relpath(path, root).replace(os.sep, '/')] = (size, mtime)
+            next_level.extend(subdirs)
+        pending = next_level
+    return index
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_archive_files(executor, root, index, verify_checksums=False):
+    """Сверяет строки ArchiveFile с файлами на диске"""
+    from .models import ArchiveFile
+
+    result = {
+        'checked': 0, 'empty': [], 'missing': [], 'size_mismatch': [],
+        'checksum_mismatch': [], 'unverified': 0,
+    }
+    to_hash = {}
+    rows = ArchiveFile.objects.values_list('pk', 'file', 'size_bytes', 'sha256').order_by('pk')
+    for pk, name, size_bytes, sha256 in rows.iterator(chunk_size=2000):
+        result['checked'] += 1
+        if not name:
+            result['empty'].append(pk)
+            continue
+        on_disk = index.get(name)
+        if on_disk is None:
+            result['missing'].append({'id': pk, 'name': name})
+            continue
+        if size_bytes is not None and size_bytes != on_disk[0]:
+            result['size_mismatch'].append({'id': pk, 'name': name, 'expected': size_bytes, 'actual': on_disk[0]})
+        if not sha256:
+            result['unverified'] += 1
+        elif verify_checksums:
+            # Одинаковые блобы хэшируются один раз
+            to_hash.setdefault(name, []).append((pk, sha256))
+
+    if to_hash:
+        names = list(to_hash)
+        digests = executor.map(lambda name: _sha256(os.path.join(root, name)), names)
+        for name, digest in zip(names, digests):
+            for pk, expected in to_hash[name]:
+                if digest != expected:
+                    result['checksum_mismatch'].append({'id': pk, 'name': name, 'expected': expected, 'actual': digest})
+    return result
+
+
+def find_orphans(index, grace_period=GRACE_PERIOD):
+    """Файлы каталогов загрузки без ссылок из БД: [{'name', 'size', 'modified'}]"""
+    referenced = referenced_names()
+    cutoff = (timezone.now() - grace_period).timestamp()
+    return [
+        {'name': name, 'size': size, 'modified': datetime.fromtimestamp(mtime, tz=dt_timezone.utc).isoformat()}
+        for name, (size, mtime) in sorted(index.items())
+        if name not in referenced and mtime < cutoff
+    ]
+
+
+def delete_orphans(root, orphans):
+    """Удаляет потерянные файлы; возвращает (удалено, освобождено байт)"""
+    deleted = freed = 0
+    for orphan in orphans:
+        try:
+            os.remove(os.path.join(root, orphan['name']))
+        except FileNotFoundError:
+            continue
+        except OSError:
+            logger.warning('Не удалось удалить %s', orphan['name'])
+            continue
+        deleted += 1
+        freed += orphan['size']
+    return deleted, freed
+
+
+def scan(verify_checksums=False, grace_period=GRACE_PERIOD, workers=None, delete=False):
+    """
+    Проверяет медиафайлы и возвращает отчет (словарь, пригодный для JSON).
+
+    delete=True - удалить найденные потерянные файлы.
+    """
+    root = str(settings.MEDIA_ROOT)
+    directories = upload_dirs()
+    started = timezone.now()
+
+    with ThreadPoolExecutor(max_workers=workers or default_workers()) as executor:
+        index = scan_media(executor, root, directories)
+        archive = check_archive_files(executor, root, index, verify_checksums=verify_checksums)
+    orphans = find_orphans(index, grace_period)
+
+    report = {
+        'started_at': started.isoformat(),
+        'media_root': root,
+        'directories': directories,
+        'scanned': {'files': len(index), 'bytes': sum(size for size, _ in index.values())},
+        'archive_files': archive,
+        'orphans': {
+            'count': len(orphans),
+            'bytes': sum(orphan['size'] for orphan in orphans),
+            'files': orphans,
+        },
+    }
+    if delete:
+        deleted, freed = delete_orphans(root, orphans)
+        report['orphans']['deleted'] = deleted
+        report['orphans']['freed_bytes'] = freed
+    report['finished_at'] = timezone.now().isoformat()
+    return report
@@ -1,53 +1,106 @@
+"""
+Команда проверки целостности медиафайлов (см. Archive.integrity)
+"""
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from Archive.models import ArchiveFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 
 class Command(BaseCommand):
-    help = 'Проверяет и исправляет файлы архива'
+    help = (
+        'Сверяет файлы архива с диском (наличие, размер, SHA-256), находит потерянные '
+        'медиафайлы и сохраняет отчет в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-checksums',
+            action='store_true',
+            help='Пересчитать SHA-256 файлов архива (читает все файлы с диска)',
+        )
+        parser.add_argument(
+            '--delete-orphans',
+            action='store_true',
+            help='Удалить потерянные файлы (без подтверждения)',
+        )
+        parser.add_argument(
+            '--delete-empty',
+            action='store_true',
+            help='Удалить записи ArchiveFile без файла (без подтверждения)',
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=int,
+            default=24,
+            help='Не считать потерянными файлы моложе указанного количества часов (по умолчанию 24)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество потоков для обхода каталогов и хэширования',
+        )
+        parser.add_argument(
+            '--report',
+            default=None,
+            help='Путь к JSON-отчету (по умолчанию logs/archive-integrity-<дата>.json)',
+        )
 
     def handle(self, *args, **options):
-        self.stdout.write('Проверка файлов архива...')
-        
-        # Получаем все файлы
-        files = ArchiveFile.objects.all()
-        
-        self.stdout.write(f'Всего файлов в базе: {files.count()}')
-        
-        # Проверяем файлы без связанных файлов
-        files_without_file = []
-        for file in files:
-            if not file.file:
-                files_without_file.append(file)
-        
-        if files_without_file:
-            self.stdout.write(
-                self.style.WARNING(
-                    f'Найдено {len(files_without_file)} файлов без связанных файлов:'
-                )
-            )
-            for file in files_without_file:
-                self.stdout.write(f'  - {file.title} (ID: {file.pk})')
-            
-            # Удаляем файлы без связанных файлов
-            response = input('Удалить файлы без связанных файлов? (y/n): ')
-            if response.lower() == 'y':
-                for file in files_without_file:
-                    file.delete()
-                self.stdout.write(
-                    self.style.SUCCESS('Файлы без связанных файлов удалены')
-                )
-        else:
-            self.stdout.write(
-                self.style.SUCCESS('Все файлы имеют связанные файлы')
-            )
-        
-        # Показываем статистику
-        total_files = ArchiveFile.objects.count()
-        public_files = ArchiveFile.objects.filter(is_public=True).count()
-        
-        self.stdout.write(f'Всего файлов: {total_files}')
-        self.stdout.write(f'Публичных файлов: {public_files}')
-        
+        from Archive.integrity import scan
+        from Archive.models import ArchiveFile
+
+        self.stdout.write('Проверка медиафайлов...')
+        report = scan(
+            verify_checksums=options['verify_checksums'],
+            grace_period=timedelta(hours=options['grace_hours']),
+            workers=options['workers'],
+            delete=options['delete_orphans'],
+        )
+
+        archive = report['archive_files']
+        if options['delete_empty'] and archive['empty']:
+            # Обычный delete() по одной строке - срабатывают сигналы счетчиков и кэша
+            for file_obj in ArchiveFile.objects.filter(pk__in=archive['empty'], file=''):
+                file_obj.delete()
+            archive['empty_deleted'] = len(archive['empty'])
+
+        path = options['report'] or os.path.join(
+            settings.BASE_DIR, 'logs', f'archive-integrity-{timezone.now():%Y%m%d-%H%M%S}.json'
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2, cls=DjangoJSONEncoder)
+
+        orphans = report['orphans']
+        self.stdout.write(
+            f'Просканировано файлов: {report["scanned"]["files"]} '
+            f'({report["scanned"]["bytes"] / 1024 / 1024:.1f} MB)'
+        )
+        self.stdout.write(f'Записей ArchiveFile: {archive["checked"]}')
+        for key, label in (
+            ('empty', 'без файла'),
+            ('missing', 'файл не найден'),
+            ('size_mismatch', 'размер не совпадает'),
+            ('checksum_mismatch', 'SHA-256 не совпадает'),
+        ):
+            if archive[key]:
+                self.stdout.write(self.style.WARNING(f'  {label}: {len(archive[key])}'))
+        if archive['unverified']:
+            self.stdout.write(f'  без сохраненного SHA-256: {archive["unverified"]} (см. extract_file_metadata)')
         self.stdout.write(
-            self.style.SUCCESS('Проверка завершена')
-        ) 
\ No newline at end of file
+            f'Потерянных файлов: {orphans["count"]} ({orphans["bytes"] / 1024 / 1024:.1f} MB)'
+        )
+        if 'deleted' in orphans:
+            self.stdout.write(self.style.SUCCESS(
+                f'Удалено потерянных файлов: {orphans["deleted"]}, '
+                f'освобождено {orphans["freed_bytes"] / 1024 / 1024:.1f} MB'
+            ))
+        if 'empty_deleted' in archive:
+            self.stdout.write(self.style.SUCCESS(f'Удалено записей без файла: {archive["empty_deleted"]}'))
+        self.stdout.write(self.style.SUCCESS(f'Отчет: {path}'))
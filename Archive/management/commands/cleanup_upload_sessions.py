@@ -0,0 +1,26 @@
+"""
+Команда для удаления брошенных сессий загрузки файлов частями
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from Archive.uploads import SESSION_TTL
+
+
+class Command(BaseCommand):
+    help = 'Удаляет сессии загрузки частями, в которые давно не приходили фрагменты'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=int(SESSION_TTL.total_seconds() // 3600),
+            help='Срок неактивности сессии в часах (по умолчанию 24)',
+        )
+
+    def handle(self, *args, **options):
+        from Archive.uploads import cleanup_sessions
+
+        removed = cleanup_sessions(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Удалено сессий: {removed}'))
@@ -0,0 +1,53 @@
+"""
+Команда для заполнения метаданных уже загруженных файлов архива
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размер, MIME-тип, SHA-256, размеры и длительность файлов архива'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересчитать метаданные всех файлов, а не только незаполненных',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Количество файлов в одном UPDATE',
+        )
+
+    def handle(self, *args, **options):
+        from Archive.metadata import METADATA_FIELDS
+        from Archive.models import ArchiveFile
+        from Home.cache_utils import bump_generation
+
+        files = ArchiveFile.objects.exclude(file='').only('pk', 'file', *METADATA_FIELDS).order_by('pk')
+        if not options['force']:
+            files = files.filter(sha256='')
+
+        self.stdout.write(f'Файлов для обработки: {files.count()}')
+        batch = []
+        updated = failed = 0
+        for file_obj in files.iterator(chunk_size=options['batch_size']):
+            if file_obj.update_metadata():
+                batch.append(file_obj)
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'Файл не найден: {file_obj.file.name} (ID: {file_obj.pk})'))
+            if len(batch) >= options['batch_size']:
+                updated += ArchiveFile.objects.bulk_update(batch, METADATA_FIELDS)
+                batch = []
+        if batch:
+            updated += ArchiveFile.objects.bulk_update(batch, METADATA_FIELDS)
+
+        # bulk_update не вызывает сигналы - сбрасываем кэш списков файлов
+        if updated:
+            bump_generation('files')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: обновлено {updated}, пропущено {failed}'
+        ))
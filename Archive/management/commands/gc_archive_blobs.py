@@ -0,0 +1,45 @@
+"""
+Команда сборки мусора хранилища файлов архива с дедупликацией
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает ссылки на блобы и удаляет блобы, которые не использует ни один файл архива'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=int,
+            default=24,
+            help='Не удалять блобы моложе указанного количества часов (по умолчанию 24)',
+        )
+        parser.add_argument(
+            '--adopt-legacy',
+            action='store_true',
+            help='Перенести файлы, загруженные до дедупликации, в хранилище блобов',
+        )
+
+    def handle(self, *args, **options):
+        from Archive.blobs import adopt_legacy_files, collect_garbage
+
+        dry_run = options['dry_run']
+        prefix = '[dry-run] ' if dry_run else ''
+
+        if options['adopt_legacy']:
+            moved, removed = adopt_legacy_files(dry_run=dry_run)
+            self.stdout.write(f'{prefix}Перенесено файлов: {moved}, удалено старых копий: {removed}')
+
+        stats = collect_garbage(timedelta(hours=options['grace_hours']), dry_run=dry_run)
+        self.stdout.write(f'Исправлено счетчиков ссылок: {stats["reconciled"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Удалено блобов: {stats["blobs"]}, временных и потерянных файлов: {stats["orphans"]}, '
+            f'освобождено {stats["bytes"] / 1024 / 1024:.1f} MB'
+        ))
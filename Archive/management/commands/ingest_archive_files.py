@@ -0,0 +1,122 @@
+"""
+Команда массовой загрузки файлов в архив (см. Archive.ingest)
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает в архив файлы каталога или манифеста (CSV/JSONL): хэширование, '
+        'определение типа и превью - в пуле процессов, запись в БД - пакетами'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            help='Каталог с файлами или манифест .csv/.jsonl (path, title, description, category, tags, ...)',
+        )
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Имя пользователя, от которого загружаются файлы',
+        )
+        parser.add_argument(
+            '--category',
+            default='',
+            help='Категория по умолчанию (id, slug или название)',
+        )
+        parser.add_argument(
+            '--tags',
+            default='',
+            help='Теги по умолчанию (через запятую)',
+        )
+        parser.add_argument(
+            '--private',
+            action='store_true',
+            help='Не публиковать файлы (по умолчанию файлы сотрудников публикуются сразу)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество процессов для обработки файлов (по умолчанию - число ядер)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Количество файлов в одной транзакции (по умолчанию 200)',
+        )
+        parser.add_argument(
+            '--state',
+            default=None,
+            help='Журнал для возобновления (по умолчанию logs/ingest-<хэш источника>.jsonl)',
+        )
+        parser.add_argument(
+            '--allow-duplicates',
+            action='store_true',
+            help='Загружать файлы, уже загруженные этим пользователем (по SHA-256)',
+        )
+
+    def handle(self, *args, **options):
+        from Archive.ingest import ArchiveIngest, IngestError, iter_directory, read_manifest
+
+        source = os.path.abspath(options['source'])
+        if not os.path.exists(source):
+            raise CommandError(f'Не найден источник: {source}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Пользователь не найден: {options["user"]}')
+
+        state_path = options['state']
+        if not state_path:
+            digest = hashlib.md5(source.encode()).hexdigest()[:12]
+            state_path = os.path.join(settings.BASE_DIR, 'logs', f'ingest-{digest}.jsonl')
+        os.makedirs(os.path.dirname(os.path.abspath(state_path)) or '.', exist_ok=True)
+
+        if os.path.isdir(source):
+            entries = iter_directory(source, exclude=[state_path])
+        else:
+            entries = read_manifest(source)
+
+        ingest = ArchiveIngest(
+            user,
+            state_path,
+            category=options['category'],
+            tags=options['tags'],
+            is_public=False if options['private'] else None,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            allow_duplicates=options['allow_duplicates'],
+            log=self.stdout.write,
+        )
+        if not user.is_staff and not options['private']:
+            self.stdout.write(self.style.WARNING(
+                f'{user.username} не сотрудник - файлы будут отправлены на модерацию'
+            ))
+
+        self.stdout.write(f'Загрузка из {source} (журнал: {state_path})...')
+        try:
+            stats = ingest.run(entries)
+        except IngestError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано файлов: {stats["created"]} (превью: {stats["thumbnails"]})'
+        ))
+        self.stdout.write(
+            f'Пропущено: уже загружены {stats["resumed"]}, дубликаты {stats["duplicates"]}'
+        )
+        if stats['errors'] or stats['not_found']:
+            self.stdout.write(self.style.WARNING(
+                f'Ошибки чтения: {stats["errors"]}, не найдено: {stats["not_found"]}'
+            ))
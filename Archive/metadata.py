@@ -0,0 +1,258 @@
+"""
+Метаданные файлов архива: размер, MIME-тип, SHA-256, размеры и длительность
+
+Извлекаются один раз при загрузке файла (ArchiveFile.save) за один проход
+чтения и хранятся в полях модели, поэтому списки файлов не обращаются
+к хранилищу. Для уже загруженных файлов - команда extract_file_metadata.
+
+MIME-тип определяется по сигнатуре содержимого (python-magic, если
+установлен, иначе - таблица сигнатур), затем по расширению. Размеры
+изображений читает Pillow (только заголовок), длительность - mutagen
+(если установлен), модуль wave и разбор атомов MP4/MOV.
+"""
+import hashlib
+import logging
+import mimetypes
+import posixpath
+import struct
+import wave
+
+try:
+    import magic
+except ImportError:
+    magic = None
+
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger('nlpers')
+
+
+CHUNK_SIZE = 1024 * 1024
+
+# Сколько байт начала файла используется для определения типа и разбора заголовков
+HEADER_SIZE = 64 * 1024
+
+METADATA_FIELDS = ('size_bytes', 'mime_type', 'sha256', 'width', 'height', 'duration')
+
+# Сигнатуры: (смещение, байты, MIME-тип)
+SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'BM', 'image/bmp'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'\xff\xfb', 'audio/mpeg'),
+    (0, b'\xff\xf3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (0, b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (257, b'ustar', 'application/x-tar'),
+)
+
+# RIFF-контейнеры: тип по байтам 8-12
+RIFF_TYPES = {b'WAVE': 'audio/wav', b'AVI ': 'video/x-msvideo', b'WEBP': 'image/webp'}
+
+# ISO BMFF (MP4/MOV/M4A): тип по major brand
+FTYP_BRANDS = {b'M4A ': 'audio/mp4', b'M4B ': 'audio/mp4', b'qt  ': 'video/quicktime'}
+
+# ZIP-контейнеры офисных форматов определяются по расширению
+ZIP_BASED = {'.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub', '.jar'}
+
+# MIME-типы архивов (ArchiveFile.file_type = 'archive')
+ARCHIVE_MIME_TYPES = {
+    'application/zip', 'application/vnd.rar', 'application/x-7z-compressed',
+    'application/gzip', 'application/x-tar', 'application/x-bzip2', 'application/x-xz',
+}
+
+# Прочие MIME-типы документов (кроме text/*)
+DOCUMENT_MIME_PREFIXES = (
+    'application/pdf', 'application/msword', 'application/vnd.openxmlformats-officedocument',
+    'application/vnd.oasis.opendocument', 'application/vnd.ms-', 'application/rtf',
+    'application/epub', 'application/json', 'application/xml',
+)
+
+
+def file_type_for_mime(mime_type):
+    """Значение ArchiveFile.file_type по MIME-типу"""
+    mime_type = mime_type or ''
+    for prefix in ('image', 'video', 'audio'):
+        if mime_type.startswith(f'{prefix}/'):
+            return prefix
+    if mime_type in ARCHIVE_MIME_TYPES:
+        return 'archive'
+    if mime_type.startswith('text/') or mime_type.startswith(DOCUMENT_MIME_PREFIXES):
+        return 'document'
+    return 'other'
+
+
+def detect_mime_type(header, filename):
+    """MIME-тип по началу файла и имени"""
+    if magic is not None:
+        try:
+            detected = magic.from_buffer(header, mime=True)
+        except Exception:
+            detected = None
+        if detected and detected not in ('application/octet-stream', 'text/plain'):
+            return detected
+
+    guessed = mimetypes.guess_type(filename)[0]
+    extension = posixpath.splitext(filename)[1].lower()
+
+    if header[:4] == b'RIFF' and header[8:12] in RIFF_TYPES:
+        return RIFF_TYPES[header[8:12]]
+    if header[4:8] == b'ftyp':
+        return FTYP_BRANDS.get(header[8:12], 'video/mp4')
+    for offset, signature, mime_type in SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            if mime_type == 'application/zip' and extension in ZIP_BASED and guessed:
+                return guessed
+            return mime_type
+    return guessed or 'application/octet-stream'
+
+
+def _iter_boxes(data, start=0, end=None):
+    """Атомы ISO BMFF: (тип, начало содержимого, конец)"""
+    end = len(data) if end is None else end
+    position = start
+    while position + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[position:position + 8])
+        header = 8
+        if size == 1 and position + 16 <= end:
+            size = struct.unpack('>Q', data[position + 8:position + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            return
+        yield box_type, position + header, min(position + size, end)
+        position += size
+
+
+def _mp4_metadata(data):
+    """Длительность (mvhd) и размеры видеодорожки (tkhd) из атома moov"""
+    result = {}
+    for box_type, start, end in _iter_boxes(data):
+        if box_type != b'moov':
+            continue
+        for child, child_start, child_end in _iter_boxes(data, start, end):
+            if child == b'mvhd':
+                version = data[child_start]
+                if version == 1:
+                    timescale, duration = struct.unpack('>IQ', data[child_start + 20:child_start + 32])
+                else:
+                    timescale, duration = struct.unpack('>II', data[child_start + 12:child_start + 20])
+                if timescale:
+                    result['duration'] = duration / timescale
+            elif child == b'trak':
+                for track_box, track_start, track_end in _iter_boxes(data, child_start, child_end):
+                    if track_box == b'tkhd' and track_end - track_start >= 84:
+                        width, height = struct.unpack('>II', data[track_end - 8:track_end])
+                        # Ширина и высота - числа 16.16; у аудиодорожек нули
+                        if width and height and 'width' not in result:
+                            result['width'], result['height'] = width >> 16, height >> 16
+    return result
+
+
+def _read_mp4_moov(fh, size):
+    """Читает атом moov (он может быть в конце файла) без чтения mdat"""
+    position = 0
+    while position + 8 <= size:
+        fh.seek(position)
+        header = fh.read(16)
+        if len(header) < 8:
+            break
+        box_size, box_type = struct.unpack('>I4s', header[:8])
+        if box_size == 1:
+            box_size = struct.unpack('>Q', header[8:16])[0]
+        elif box_size == 0:
+            box_size = size - position
+        if box_size < 8:
+            break
+        if box_type == b'moov':
+            fh.seek(position)
+            return fh.read(box_size)
+        position += box_size
+    return b''
+
+
+def _media_metadata(fh, mime_type, size):
+    """Размеры изображения/видео и длительность аудио/видео"""
+    if mime_type.startswith('image/') and Image is not None:
+        fh.seek(0)
+        with Image.open(fh) as image:
+            return {'width': image.width, 'height': image.height}
+
+    if mime_type == 'audio/wav':
+        fh.seek(0)
+        with wave.open(fh) as wav:
+            rate = wav.getframerate()
+            return {'duration': wav.getnframes() / rate} if rate else {}
+
+    if mime_type in ('video/mp4', 'video/quicktime', 'audio/mp4'):
+        return _mp4_metadata(_read_mp4_moov(fh, size))
+
+    if mutagen is not None and (mime_type.startswith('audio/') or mime_type.startswith('video/')):
+        fh.seek(0)
+        info = getattr(mutagen.File(fh), 'info', None)
+        length = getattr(info, 'length', None)
+        return {'duration': length} if length else {}
+    return {}
+
+
+def extract_metadata(field_file, close=True, sha256=None):
+    """
+    Метаданные файла (FieldFile - загруженного или уже сохраненного, либо File).
+
+    close=False - оставить файл открытым (еще не сохраненная загрузка,
+    которую затем прочитает хранилище, или файл, закрываемый вызывающим).
+    sha256 - уже вычисленный хэш содержимого: тогда файл читается не целиком,
+    а только заголовок.
+    Возвращает словарь с ключами METADATA_FIELDS; отсутствующие значения - None.
+    """
+    result = dict.fromkeys(METADATA_FIELDS)
+    digest = hashlib.sha256()
+    header = b''
+    size = 0
+
+    field_file.open('rb')
+    try:
+        if sha256:
+            header = field_file.read(HEADER_SIZE)
+            size = field_file.size
+        else:
+            for chunk in field_file.chunks(CHUNK_SIZE):
+                if len(header) < HEADER_SIZE:
+                    header += chunk[:HEADER_SIZE - len(header)]
+                digest.update(chunk)
+                size += len(chunk)
+
+        result['size_bytes'] = size
+        result['sha256'] = sha256 or digest.hexdigest()
+        result['mime_type'] = detect_mime_type(header, field_file.name)
+
+        fh = field_file.file
+        try:
+            result.update(_media_metadata(fh, result['mime_type'], size))
+        except Exception as e:
+            # Поврежденный или неподдерживаемый медиафайл - сохраняем остальное
+            logger.warning('Не удалось прочитать медиаданные файла %s: %s', field_file.name, e)
+        if hasattr(fh, 'seek'):
+            fh.seek(0)
+    finally:
+        if close:
+            field_file.close()
+    return result
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:43
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, group_field):
+    counts = (
+        queryset.filter(**{group_field: OuterRef('pk')})
+        .order_by().values(group_field).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики файлов категорий архива и тегов"""
+    ArchiveFile = apps.get_model('Archive', 'ArchiveFile')
+    FileCategory = apps.get_model('Archive', 'FileCategory')
+    FileTags = ArchiveFile.tag_objects.through
+    Tag = apps.get_model('Blog', 'Tag')
+
+    FileCategory.objects.update(files_count=_count(ArchiveFile.objects.filter(is_public=True), 'category'))
+    Tag.objects.update(
+        archive_files_count=_count(FileTags.objects.filter(archivefile__is_public=True), 'tag')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0003_add_performance_indexes'),
+        ('Blog', '0012_content_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filecategory',
+            name='files_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество файлов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0004_file_category_files_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivefile',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Длительность (сек)'),
+        ),
+        migrations.AddField(
+            model_name='archivefile',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота'),
+        ),
+        migrations.AddField(
+            model_name='archivefile',
+            name='mime_type',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100, verbose_name='MIME-тип'),
+        ),
+        migrations.AddField(
+            model_name='archivefile',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='archivefile',
+            name='size_bytes',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Размер (байт)'),
+        ),
+        migrations.AddField(
+            model_name='archivefile',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0007_upload_session'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='download',
+            name='downloaded_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата скачивания'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0008_download_downloaded_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFileCategoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('downloads', models.PositiveIntegerField(default=0, verbose_name='Скачивания')),
+                ('likes', models.PositiveIntegerField(default=0, verbose_name='Лайки')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='Archive.filecategory', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Статистика категории файлов за день',
+                'verbose_name_plural': 'Статистика категорий файлов по дням',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='Archive_dai_date_f76d11_idx')],
+                'unique_together': {('category', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyFileStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('downloads', models.PositiveIntegerField(default=0, verbose_name='Скачивания')),
+                ('likes', models.PositiveIntegerField(default=0, verbose_name='Лайки')),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='Archive.archivefile', verbose_name='Файл')),
+            ],
+            options={
+                'verbose_name': 'Статистика файла за день',
+                'verbose_name_plural': 'Статистика файлов по дням',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='Archive_dai_date_6c5598_idx')],
+                'unique_together': {('file', 'date')},
+            },
+        ),
+    ]
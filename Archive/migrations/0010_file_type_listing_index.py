@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0009_daily_file_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivefile',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['file_type', '-uploaded_at', '-id'], name='archive_type_listing_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_last_used_at(apps, schema_editor):
+    """Существующие блобы последний раз использовались не позже создания"""
+    FileBlob = apps.get_model('Archive', 'FileBlob')
+    FileBlob.objects.update(last_used_at=models.F('created_at'))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0010_file_type_listing_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileblob',
+            name='last_used_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последнее использование'),
+        ),
+        migrations.RunPython(fill_last_used_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-17 21:05
+
+import posixpath
+
+from django.db import migrations, models
+
+
+def fill_original_filename(apps, schema_editor):
+    """
+    Файлы, еще не перенесенные в блобы, хранятся под исходным именем.
+    Для блобов исходное имя неизвестно - остается расширение блоба.
+    """
+    ArchiveFile = apps.get_model('Archive', 'ArchiveFile')
+    legacy = ArchiveFile.objects.exclude(file='').exclude(file__startswith='archive/blobs/')
+    for pk, name in legacy.values_list('pk', 'file').iterator():
+        ArchiveFile.objects.filter(pk=pk).update(original_filename=posixpath.basename(name)[:255])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Archive', '0011_fileblob_last_used_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivefile',
+            name='original_filename',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Исходное имя файла'),
+        ),
+        migrations.RunPython(fill_original_filename, migrations.RunPython.noop),
+    ]
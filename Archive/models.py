@@ -3,7 +3,12 @@ from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils import timezone
+import logging
 import os
+import uuid
+
+from .metadata import METADATA_FIELDS
+from .storage import get_archive_storage
 
 # Импортируем Tag из Blog для связи
 try:
@@ -11,6 +16,17 @@ try:
 except ImportError:
     Tag = None
 
+logger = logging.getLogger('nlpers')
+
+
+def format_file_size(size):
+    """Размер в байтах в читаемом формате"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024.0:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} TB"
+
 
 class FileCategory(models.Model):
     """Модель категорий для файлов архива"""
@@ -21,6 +37,7 @@ class FileCategory(models.Model):
     icon = models.CharField('Иконка', max_length=50, blank=True, help_text='CSS класс Font Awesome')
     image = models.ImageField('Картинка', upload_to='archive/categories/', blank=True, null=True)
     is_active = models.BooleanField('Активна', default=True)
+    files_count = models.PositiveIntegerField('Количество файлов', default=0, editable=False)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     
     class Meta:
@@ -39,50 +56,10 @@ class FileCategory(models.Model):
     def get_absolute_url(self):
         return reverse('Archive:category_detail', kwargs={'pk': self.pk})
     
-    @property
-    def files_count(self):
-        return self.files.filter(is_public=True).count()
-    
     def create_slug(self, name):
-        """Создает slug с транслитерацией русского текста"""
-        import re
-        import uuid
-        
-        # Расширенный словарь для транслитерации
-        translit_dict = {
-            'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-            'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-            'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-            'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-            'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-        }
-        
-        # Транслитерируем
-        result = ''
-        for char in name.lower():
-            if char in translit_dict:
-                result += translit_dict[char]
-            else:
-                result += char
-        
-        # Очищаем и форматируем slug
-        slug = result.lower()
-        slug = re.sub(r'[^\w\s-]', '', slug)
-        slug = re.sub(r'[-\s]+', '-', slug)
-        slug = slug.strip('-')
-        
-        # Если slug пустой, создаем случайный
-        if not slug:
-            slug = f'file-category-{uuid.uuid4().hex[:8]}'
-        
-        # Проверяем уникальность
-        counter = 1
-        original_slug = slug
-        while FileCategory.objects.filter(slug=slug).exclude(id=self.id if self.id else None).exists():
-            slug = f'{original_slug}-{counter}'
-            counter += 1
-        
-        return slug
+        """Создает уникальный slug с транслитерацией русского текста"""
+        from Blog.utils import create_unique_slug
+        return create_unique_slug(name, FileCategory, instance=self, fallback_prefix='file-category')
 
 
 class ArchiveFile(models.Model):
@@ -99,7 +76,7 @@ class ArchiveFile(models.Model):
     title = models.CharField('Название', max_length=200)
     slug = models.SlugField('URL', max_length=200, unique=True)
     description = models.TextField('Описание', blank=True)
-    file = models.FileField('Файл', upload_to='archive/files/')
+    file = models.FileField('Файл', upload_to='archive/files/', storage=get_archive_storage)
     thumbnail = models.ImageField('Превью', upload_to='archive/thumbnails/', blank=True, null=True, help_text='Изображение для превью файла')
     file_type = models.CharField('Тип файла', max_length=10, choices=FILE_TYPE_CHOICES)
     category = models.ForeignKey(FileCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='files', verbose_name='Категория')
@@ -109,6 +86,17 @@ class ArchiveFile(models.Model):
     tags = models.CharField('Теги', max_length=200, blank=True, help_text='Разделяйте теги запятыми')
     tag_objects = models.ManyToManyField(Tag, blank=True, related_name='archive_files', verbose_name='Теги')
     
+    # Метаданные файла (заполняются при загрузке, см. Archive.metadata)
+    size_bytes = models.BigIntegerField('Размер (байт)', null=True, blank=True, editable=False, db_index=True)
+    mime_type = models.CharField('MIME-тип', max_length=100, blank=True, editable=False, db_index=True)
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True, editable=False, db_index=True)
+    width = models.PositiveIntegerField('Ширина', null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField('Высота', null=True, blank=True, editable=False)
+    duration = models.FloatField('Длительность (сек)', null=True, blank=True, editable=False)
+    # Имя загруженного файла: в хранилище с дедупликацией имя - хэш содержимого,
+    # а расширение - от первой загрузки этого содержимого
+    original_filename = models.CharField('Исходное имя файла', max_length=255, blank=True, editable=False)
+    
     # Статистика
     downloads_count = models.PositiveIntegerField('Количество скачиваний', default=0)
     views_count = models.PositiveIntegerField('Количество просмотров', default=0)
@@ -127,18 +115,68 @@ class ArchiveFile(models.Model):
         verbose_name = 'Файл архива'
         verbose_name_plural = 'Файлы архива'
         ordering = ['-uploaded_at']
+        indexes = [
+            # Списки по типу с пагинацией по ключу (cache_files_keyset)
+            models.Index(
+                fields=['file_type', '-uploaded_at', '-id'], condition=models.Q(is_public=True),
+                name='archive_type_listing_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженные теги, публичность и категорию, чтобы не пересчитывать неизмененные данные
+        if 'tags' in field_names:
+            instance._loaded_tags = values[field_names.index('tags')]
+        if 'is_public' in field_names:
+            instance._loaded_is_public = values[field_names.index('is_public')]
+        if 'category_id' in field_names:
+            instance._loaded_category_id = values[field_names.index('category_id')]
+        if 'file' in field_names:
+            instance._loaded_file = values[field_names.index('file')]
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = self.create_slug(self.title)
         
-        # Синхронизируем теги
+        # Имя файла при загрузке из БД (если поле было отложено - считаем неизмененным)
+        loaded_file = getattr(self, '_loaded_file', None if self._state.adding else self.file.name)
+        
+        # Имя нового файла до сохранения в хранилище
+        if self.file and not self.file._committed:
+            self.original_filename = os.path.basename(self.file.name)[:255]
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'original_filename'}
+        
+        # Метаданные извлекаются один раз - при загрузке нового файла
+        if self.file and (not self.sha256 or self.file.name != loaded_file):
+            self.update_metadata()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | set(METADATA_FIELDS)
+        
+        # Синхронизируем теги (только если строка тегов изменилась)
         super().save(*args, **kwargs)
-        if self.tags:
+        if self.tags and self.tags != getattr(self, '_loaded_tags', None):
             self.sync_tags_from_string()
+        
+        # Счетчики файлов категорий и тегов
+        from .counters import file_counters_changed
+        file_counters_changed(
+            self, getattr(self, '_loaded_is_public', None), getattr(self, '_loaded_category_id', None)
+        )
+        self._loaded_is_public = self.is_public
+        self._loaded_category_id = self.category_id
+        
+        # Счетчики ссылок блобов (дедуплицированное хранилище)
+        if self.file.name != loaded_file:
+            from .blobs import file_reference_changed
+            file_reference_changed(loaded_file, self.file.name)
+        self._loaded_file = self.file.name
     
     def get_absolute_url(self):
         return reverse('Archive:file_detail', kwargs={'pk': self.pk})
@@ -152,21 +190,13 @@ class ArchiveFile(models.Model):
         return self.tag_objects.filter(is_active=True)
     
     def sync_tags_from_string(self):
-        """Синхронизирует теги из строки с объектами Tag"""
+        """Синхронизирует теги из строки с объектами Tag (пакетно, см. Blog.tags)"""
         if not self.tags or not Tag:
             return
         
-        tag_names = self.get_tags_list()
-        tag_objects = []
-        
-        for tag_name in tag_names:
-            tag, created = Tag.objects.get_or_create(
-                name=tag_name.strip(),
-                defaults={'slug': Tag().create_slug(tag_name.strip())}
-            )
-            tag_objects.append(tag)
-        
-        self.tag_objects.set(tag_objects)
+        from Blog.tags import sync_object_tags
+        sync_object_tags(self, self.tags)
+        self._loaded_tags = self.tags
     
     def sync_tags_to_string(self):
         """Синхронизирует объекты тегов в строку"""
@@ -174,63 +204,54 @@ class ArchiveFile(models.Model):
         self.tags = ', '.join(tag_names)
     
     def create_slug(self, title):
-        """Создает slug с транслитерацией русского текста"""
-        import re
-        import uuid
-        
-        # Словарь для транслитерации
-        translit_dict = {
-            'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-            'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-            'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-            'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-            'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-        }
-        
-        # Транслитерируем
-        result = ''
-        for char in title:
-            if char in translit_dict:
-                result += translit_dict[char]
-            else:
-                result += char
-        
-        # Приводим к нижнему регистру и очищаем
-        slug = result.lower()
-        slug = re.sub(r'[^\w\s-]', '', slug)
-        slug = re.sub(r'[-\s]+', '-', slug)
-        slug = slug.strip('-')
-        
-        # Если slug пустой, создаем случайный
-        if not slug:
-            slug = f'file-{uuid.uuid4().hex[:8]}'
-        
-        # Проверяем уникальность
-        counter = 1
-        original_slug = slug
-        while ArchiveFile.objects.filter(slug=slug).exclude(id=self.id if self.id else None).exists():
-            slug = f'{original_slug}-{counter}'
-            counter += 1
-        
-        return slug
+        """Создает уникальный slug с транслитерацией русского текста"""
+        from Blog.utils import create_unique_slug
+        return create_unique_slug(title, ArchiveFile, instance=self, fallback_prefix='file')
+    
+    def update_metadata(self):
+        """Заполняет размер, MIME-тип, SHA-256, размеры и длительность по содержимому файла"""
+        from .metadata import extract_metadata
+        # Новую загрузку не закрываем - ее еще прочитает хранилище
+        stored = self.file._committed
+        # Хэш собранной загрузки частями уже вычислен (Archive.uploads.assemble)
+        sha256 = None if stored else getattr(self.file.file, 'sha256', None)
+        try:
+            metadata = extract_metadata(self.file, close=stored, sha256=sha256)
+        except OSError:
+            # Файла нет в хранилище - попробуем при следующем сохранении
+            logger.warning('Не удалось прочитать файл архива %s', self.file.name)
+            return False
+        for field, value in metadata.items():
+            setattr(self, field, value)
+        if not stored:
+            # Хранилище с дедупликацией не будет считать хэш повторно
+            self.file.file.sha256 = self.sha256
+        return True
     
     @property
     def file_size(self):
         """Возвращает размер файла в читаемом формате"""
+        if self.size_bytes is not None:
+            return format_file_size(self.size_bytes)
         if self.file:
-            size = self.file.size
-            for unit in ['B', 'KB', 'MB', 'GB']:
-                if size < 1024.0:
-                    return f"{size:.1f} {unit}"
-                size /= 1024.0
-            return f"{size:.1f} TB"
+            # Метаданные еще не извлечены (см. команду extract_file_metadata)
+            return format_file_size(self.file.size)
         return "0 B"
     
+    @property
+    def duration_display(self):
+        """Длительность аудио/видео в формате ч:мм:сс"""
+        if not self.duration:
+            return ''
+        minutes, seconds = divmod(int(round(self.duration)), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f'{hours}:{minutes:02d}:{seconds:02d}' if hours else f'{minutes}:{seconds:02d}'
+    
     @property
     def file_extension(self):
-        """Возвращает расширение файла"""
+        """Возвращает расширение файла (загруженного, а не блоба)"""
         if self.file:
-            return os.path.splitext(self.file.name)[1].lower()
+            return os.path.splitext(self.original_filename or self.file.name)[1].lower()
         return ""
 
 
@@ -268,13 +289,94 @@ class FileLike(models.Model):
         return f'{self.user.username} лайкнул {self.file.title}'
 
 
+class FileBlob(models.Model):
+    """Блоб хранилища с адресацией по содержимому (см. Archive.storage)"""
+    sha256 = models.CharField('SHA-256', max_length=64, unique=True)
+    name = models.CharField('Путь в хранилище', max_length=255, unique=True)
+    size = models.BigIntegerField('Размер (байт)', default=0)
+    ref_count = models.PositiveIntegerField('Количество ссылок', default=0, db_index=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    # Обновляется, когда хранилище отдает блоб новой загрузке (см. Archive.blobs)
+    last_used_at = models.DateTimeField('Последнее использование', default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Блоб файла'
+        verbose_name_plural = 'Блобы файлов'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return self.name
+
+
+class UploadSession(models.Model):
+    """Сессия загрузки файла частями (см. Archive.uploads)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField('Имя файла', max_length=255)
+    size = models.BigIntegerField('Размер (байт)')
+    sha256 = models.CharField('Ожидаемый SHA-256', max_length=64, blank=True)
+    received_bytes = models.BigIntegerField('Получено байт', default=0)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    updated_at = models.DateTimeField('Последний фрагмент', auto_now=True, db_index=True)
+    
+    class Meta:
+        verbose_name = 'Сессия загрузки'
+        verbose_name_plural = 'Сессии загрузки'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f'{self.filename} ({self.received_bytes}/{self.size})'
+    
+    @property
+    def is_complete(self):
+        return self.received_bytes >= self.size
+
+
+class DailyFileStats(models.Model):
+    """Дневная статистика файла (см. Home.rollups)"""
+    date = models.DateField('Дата')
+    file = models.ForeignKey(ArchiveFile, on_delete=models.CASCADE, related_name='daily_stats', verbose_name='Файл')
+    views = models.PositiveIntegerField('Просмотры', default=0)
+    downloads = models.PositiveIntegerField('Скачивания', default=0)
+    likes = models.PositiveIntegerField('Лайки', default=0)
+    
+    class Meta:
+        verbose_name = 'Статистика файла за день'
+        verbose_name_plural = 'Статистика файлов по дням'
+        unique_together = [['file', 'date']]
+        indexes = [models.Index(fields=['date'])]
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f'{self.file_id} за {self.date}'
+
+
+class DailyFileCategoryStats(models.Model):
+    """Дневная статистика категории файлов (сумма DailyFileStats ее файлов)"""
+    date = models.DateField('Дата')
+    category = models.ForeignKey(FileCategory, on_delete=models.CASCADE, related_name='daily_stats', verbose_name='Категория')
+    views = models.PositiveIntegerField('Просмотры', default=0)
+    downloads = models.PositiveIntegerField('Скачивания', default=0)
+    likes = models.PositiveIntegerField('Лайки', default=0)
+    
+    class Meta:
+        verbose_name = 'Статистика категории файлов за день'
+        verbose_name_plural = 'Статистика категорий файлов по дням'
+        unique_together = [['category', 'date']]
+        indexes = [models.Index(fields=['date'])]
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f'{self.category_id} за {self.date}'
+
+
 class Download(models.Model):
     """Модель для отслеживания скачиваний"""
     file = models.ForeignKey(ArchiveFile, on_delete=models.CASCADE, related_name='downloads')
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='downloads')
     ip_address = models.GenericIPAddressField('IP адрес', null=True, blank=True)
     user_agent = models.TextField('User Agent', blank=True)
-    downloaded_at = models.DateTimeField('Дата скачивания', auto_now_add=True)
+    downloaded_at = models.DateTimeField('Дата скачивания', default=timezone.now, db_index=True)
     
     class Meta:
         verbose_name = 'Скачивание'
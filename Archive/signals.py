@@ -1,19 +1,24 @@
 """
-Сигналы для автоматической инвалидации кэша
+Сигналы для автоматической инвалидации кэша и пересчета счетчиков
 """
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from .models import ArchiveFile, FileCategory
 from .cache_utils import invalidate_file_cache
+from .counters import recount_file_categories
+from .blobs import file_reference_changed
+from Blog.counters import recount_tags
 
 
 @receiver(post_save, sender=ArchiveFile)
 def invalidate_file_cache_on_save(sender, instance, **kwargs):
-    """Инвалидирует кэш при сохранении файла"""
+    """Инвалидирует кэш при сохранении файла (и прежней категории, если файл перенесен)"""
+    # post_save отправляется до того, как ArchiveFile.save запомнит новую категорию
     invalidate_file_cache(
         file_id=instance.id,
-        category_id=instance.category.id if instance.category else None,
-        username=instance.uploaded_by.username
+        category_id=instance.category_id,
+        username=instance.uploaded_by.username,
+        category_ids=[getattr(instance, '_loaded_category_id', None)],
     )
 
 
@@ -26,7 +31,30 @@ def invalidate_file_cache_on_delete(sender, instance, **kwargs):
     )
 
 
+@receiver(post_delete, sender=ArchiveFile)
+def release_blob_on_delete(sender, instance, **kwargs):
+    """Уменьшает счетчик ссылок блоба удаленного файла (сам блоб удалит gc_archive_blobs)"""
+    file_reference_changed(instance.file.name, None)
+
+
 @receiver(post_save, sender=FileCategory)
 def invalidate_category_cache_on_save(sender, instance, **kwargs):
     """Инвалидирует кэш при изменении категории файлов"""
     invalidate_file_cache(category_id=instance.id)
+
+
+@receiver(pre_delete, sender=ArchiveFile)
+def remember_file_tags_on_delete(sender, instance, **kwargs):
+    """Запоминает теги удаляемого файла: после удаления связи M2M уже не прочитать"""
+    instance._counter_tag_ids = list(
+        instance.tag_objects.through.objects.filter(archivefile_id=instance.pk).values_list('tag_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=ArchiveFile)
+def update_counters_on_delete(sender, instance, **kwargs):
+    """Пересчитывает счетчики категории и тегов удаленного публичного файла"""
+    if not instance.is_public:
+        return
+    recount_file_categories([instance.category_id])
+    recount_tags(getattr(instance, '_counter_tag_ids', []))
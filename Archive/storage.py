@@ -0,0 +1,95 @@
+"""
+Хранилище файлов архива с адресацией по содержимому (дедупликация)
+
+Файл сохраняется под именем, построенным из SHA-256 содержимого:
+archive/blobs/ab/cd/<sha256>.<расширение>. Повторная загрузка того же
+содержимого не пишет ничего на диск - возвращается имя существующего
+блоба. Блобы учитываются в модели FileBlob (счетчик ссылок строк
+ArchiveFile), неиспользуемые удаляет команда gc_archive_blobs.
+
+Запись атомарна: содержимое пишется во временный файл рядом с блобом
+и переименовывается, поэтому недописанный блоб никогда не виден под
+итоговым именем.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils import timezone
+
+# Каталог блобов в MEDIA_ROOT
+BLOBS_DIR = 'archive/blobs'
+
+# Максимальная длина расширения в имени блоба
+MAX_EXTENSION_LENGTH = 10
+
+
+def blob_name(sha256, extension=''):
+    """Имя блоба: archive/blobs/<2 символа>/<2 символа>/<sha256><расширение>"""
+    extension = extension.lower() if len(extension) <= MAX_EXTENSION_LENGTH else ''
+    return f'{BLOBS_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(f'{BLOBS_DIR}/')
+
+
+def hash_content(content, chunk_size=1024 * 1024):
+    """SHA-256 содержимого файла (File/UploadedFile)"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(chunk_size):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище с дедупликацией по SHA-256.
+
+    Имя, предложенное полем (upload_to), используется только ради
+    расширения. Хэш берется из атрибута sha256 содержимого, если он уже
+    вычислен (ArchiveFile.update_metadata), иначе вычисляется здесь.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяет содержимое, а не исходное имя файла
+        return name
+
+    def _save(self, name, content):
+        from .models import FileBlob
+
+        sha256 = getattr(content, 'sha256', None) or hash_content(content)
+        blob = FileBlob.objects.filter(sha256=sha256).first()
+        if blob is not None:
+            # Строка со ссылкой появится только после фиксации - до тех пор
+            # сборка мусора не должна удалить блоб без ссылок. Если сборка
+            # уже удалила строку, блоб записывается заново
+            if not FileBlob.objects.filter(pk=blob.pk).update(last_used_at=timezone.now()):
+                blob = None
+            elif self.exists(blob.name):
+                return blob.name
+
+        target = blob_name(sha256, posixpath.splitext(name)[1])
+        temporary = super()._save(f'{target}.part-{uuid.uuid4().hex}', content)
+        os.replace(self.path(temporary), self.path(target))
+
+        if blob is None:
+            FileBlob.objects.get_or_create(
+                sha256=sha256, defaults={'name': target, 'size': self.size(target)}
+            )
+        else:
+            FileBlob.objects.filter(pk=blob.pk).update(name=target, last_used_at=timezone.now())
+        return target
+
+
+def get_archive_storage():
+    """Хранилище поля ArchiveFile.file (ARCHIVE_DEDUP_STORAGE=False - обычное)"""
+    if getattr(settings, 'ARCHIVE_DEDUP_STORAGE', True):
+        return archive_storage
+    return default_storage
+
+
+archive_storage = ContentAddressedStorage()
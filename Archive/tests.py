@@ -1,3 +1,460 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import uploads
+from .blobs import adopt_legacy_files, collect_garbage
+from .downloads import _if_range_matches, download_filename, parse_range, serve_file
+from .models import ArchiveFile, FileBlob, UploadSession
+from .storage import archive_storage, is_blob_name
+
+
+class ParseRangeTests(SimpleTestCase):
+    """Разбор заголовка Range (Archive.downloads.parse_range)"""
+
+    def test_no_header(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('', 100))
+
+    def test_closed_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 19))
+
+    def test_end_beyond_size_is_clamped(self):
+        self.assertEqual(parse_range('bytes=90-500', 100), (90, 99))
+
+    def test_open_ended(self):
+        self.assertEqual(parse_range('bytes=50-', 100), (50, 99))
+        self.assertEqual(parse_range('bytes=0-', 100), (0, 99))
+
+    def test_suffix(self):
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        # Суффикс длиннее файла - весь файл
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+
+    def test_multi_range_serves_whole_file(self):
+        self.assertIsNone(parse_range('bytes=0-9,20-29', 100))
+
+    def test_malformed(self):
+        self.assertIsNone(parse_range('bytes=-', 100))
+        self.assertIsNone(parse_range('items=0-9', 100))
+        self.assertIsNone(parse_range('bytes=a-b', 100))
+
+    def test_unsatisfiable(self):
+        self.assertIs(parse_range('bytes=100-', 100), False)
+        self.assertIs(parse_range('bytes=200-300', 100), False)
+        self.assertIs(parse_range('bytes=20-10', 100), False)
+        self.assertIs(parse_range('bytes=-0', 100), False)
+
+
+class IfRangeTests(SimpleTestCase):
+    """If-Range: диапазон применяется, только если файл не изменился"""
+
+    etag = '"abc"'
+    last_modified = 1700000000
+
+    def matches(self, value):
+        request = RequestFactory().get('/', HTTP_IF_RANGE=value) if value else RequestFactory().get('/')
+        return _if_range_matches(request, self.etag, self.last_modified)
+
+    def test_without_if_range(self):
+        self.assertTrue(self.matches(None))
+
+    def test_etag(self):
+        self.assertTrue(self.matches('"abc"'))
+        self.assertFalse(self.matches('"other"'))
+        self.assertFalse(self.matches('W/"abc"'))
+
+    def test_date(self):
+        self.assertTrue(self.matches('Tue, 14 Nov 2023 22:13:20 GMT'))
+        self.assertFalse(self.matches('Mon, 13 Nov 2023 22:13:20 GMT'))
+
+
+class ServeFileTests(SimpleTestCase):
+    """Ответы serve_file: диапазоны, условные запросы и учет скачиваний"""
+
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        storage = mock.Mock()
+        storage.size.return_value = len(self.content)
+        storage.get_modified_time.return_value.timestamp.return_value = 1700000000.0
+        storage.open.side_effect = lambda name, mode: ContentFile(self.content, name='data.bin')
+        self.file_obj = mock.Mock(slug='data', original_filename='data.bin')
+        self.file_obj.file.name = 'archive/blobs/ab/cd/data.bin'
+        self.file_obj.file.storage = storage
+        self.factory = RequestFactory()
+
+    def serve(self, on_download=None, **headers):
+        return serve_file(self.factory.get('/', **headers), self.file_obj, on_download=on_download)
+
+    def body(self, response):
+        data = b''.join(response.streaming_content)
+        response.close()
+        return data
+
+    def etag(self):
+        response, _ = self.serve()
+        response.close()
+        return response['ETag']
+
+    def test_full_download_recorded_after_close(self):
+        on_download = mock.Mock()
+        response, counted = self.serve(on_download)
+        self.assertTrue(counted)
+        self.assertEqual(response.status_code, 200)
+        on_download.assert_not_called()
+        self.assertEqual(self.body(response), self.content)
+        on_download.assert_called_once_with()
+
+    def test_range(self):
+        on_download = mock.Mock()
+        response, counted = self.serve(on_download, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(self.body(response), self.content[100:200])
+        # Докачка с середины файла - не новое скачивание
+        self.assertFalse(counted)
+        on_download.assert_not_called()
+
+    def test_suffix_range(self):
+        response, _ = self.serve(HTTP_RANGE='bytes=-24')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.content[-24:])
+
+    def test_range_from_start_is_counted(self):
+        on_download = mock.Mock()
+        response, counted = self.serve(on_download, HTTP_RANGE='bytes=0-')
+        self.assertTrue(counted)
+        self.assertEqual(self.body(response), self.content)
+        on_download.assert_called_once_with()
+
+    def test_unsatisfiable_range(self):
+        response, counted = self.serve(HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+        self.assertFalse(counted)
+
+    def test_multi_range_serves_whole_file(self):
+        response, _ = self.serve(HTTP_RANGE='bytes=0-9,20-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+    def test_if_range_mismatch_serves_whole_file(self):
+        response, _ = self.serve(HTTP_RANGE='bytes=100-199', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+    def test_if_range_match_serves_range(self):
+        response, _ = self.serve(HTTP_RANGE='bytes=100-199', HTTP_IF_RANGE=self.etag())
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.content[100:200])
+
+    def test_not_modified(self):
+        on_download = mock.Mock()
+        response, counted = self.serve(on_download, HTTP_IF_NONE_MATCH=self.etag())
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(counted)
+        on_download.assert_not_called()
+
+    def test_precondition_failed(self):
+        response, _ = self.serve(HTTP_IF_MATCH='"stale"')
+        self.assertEqual(response.status_code, 412)
+
+
+
+class BlobTestCase(TestCase):
+    """Файлы архива во временном MEDIA_ROOT"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create(username='uploader')
+
+    def upload(self, content, name='corpus.txt', **kwargs):
+        file_obj = ArchiveFile(title=name, uploaded_by=self.user, file=ContentFile(content, name=name), **kwargs)
+        file_obj.save()
+        return file_obj
+
+    def ref_count(self, name):
+        return FileBlob.objects.get(name=name).ref_count
+
+
+class BlobReferenceTests(BlobTestCase):
+    """Дедупликация и счетчики ссылок блобов (Archive.storage, Archive.blobs)"""
+
+    def test_duplicate_upload_reuses_blob(self):
+        first = self.upload(b'x,y\n1,2\n', 'corpus.txt')
+        second = self.upload(b'x,y\n1,2\n', 'corpus.csv')
+
+        self.assertTrue(is_blob_name(first.file.name))
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(FileBlob.objects.count(), 1)
+        self.assertEqual(self.ref_count(first.file.name), 2)
+        blob_dir = os.path.dirname(archive_storage.path(first.file.name))
+        self.assertEqual(os.listdir(blob_dir), [os.path.basename(first.file.name)])
+        # Расширение имени для скачивания - от загруженного файла, а не от блоба
+        self.assertEqual(download_filename(second), f'{second.slug}.csv')
+
+    def test_ref_count_follows_save_replace_and_delete(self):
+        file_obj = self.upload(b'first')
+        first_blob = file_obj.file.name
+        self.assertEqual(self.ref_count(first_blob), 1)
+
+        # Сохранение без нового файла ссылок не меняет
+        file_obj.title = 'renamed'
+        file_obj.save()
+        self.assertEqual(self.ref_count(first_blob), 1)
+
+        file_obj.file = ContentFile(b'second', name='corpus.txt')
+        file_obj.save()
+        second_blob = file_obj.file.name
+        self.assertNotEqual(first_blob, second_blob)
+        self.assertEqual(self.ref_count(first_blob), 0)
+        self.assertEqual(self.ref_count(second_blob), 1)
+
+        file_obj.delete()
+        self.assertEqual(self.ref_count(second_blob), 0)
+        # Сам блоб удаляет только сборка мусора
+        self.assertTrue(archive_storage.exists(second_blob))
+
+
+class CollectGarbageTests(BlobTestCase):
+    """Сборка мусора блобов (Archive.blobs.collect_garbage)"""
+
+    def age_blob(self, name, delta=timedelta(days=2)):
+        FileBlob.objects.filter(name=name).update(last_used_at=timezone.now() - delta)
+
+    def test_keeps_referenced_blob(self):
+        name = self.upload(b'kept').file.name
+        self.age_blob(name)
+
+        stats = collect_garbage()
+        self.assertEqual(stats['blobs'], 0)
+        self.assertTrue(FileBlob.objects.filter(name=name).exists())
+        self.assertTrue(archive_storage.exists(name))
+
+    def test_keeps_recently_used_blob(self):
+        file_obj = self.upload(b'recent')
+        name = file_obj.file.name
+        file_obj.delete()
+
+        stats = collect_garbage()
+        self.assertEqual(stats['blobs'], 0)
+        self.assertTrue(archive_storage.exists(name))
+
+    def test_deletes_unreferenced_blob_after_grace_period(self):
+        file_obj = self.upload(b'stale')
+        name = file_obj.file.name
+        file_obj.delete()
+        self.age_blob(name)
+
+        stats = collect_garbage(dry_run=True)
+        self.assertEqual(stats['blobs'], 1)
+        self.assertTrue(archive_storage.exists(name))
+
+        stats = collect_garbage()
+        self.assertEqual((stats['blobs'], stats['bytes']), (1, len(b'stale')))
+        self.assertFalse(FileBlob.objects.filter(name=name).exists())
+        self.assertFalse(archive_storage.exists(name))
+
+    def test_reconciles_ref_count_before_deleting(self):
+        name = self.upload(b'drifted').file.name
+        FileBlob.objects.filter(name=name).update(ref_count=0)
+        self.age_blob(name)
+
+        stats = collect_garbage()
+        self.assertEqual((stats['reconciled'], stats['blobs']), (1, 0))
+        self.assertEqual(self.ref_count(name), 1)
+        self.assertTrue(archive_storage.exists(name))
+
+    def test_deletes_old_orphan_files(self):
+        name = self.upload(b'blob').file.name
+        orphan = f'{name}.part-abandoned'
+        with open(archive_storage.path(orphan), 'wb') as fh:
+            fh.write(b'partial')
+        fresh = f'{name}.part-in-progress'
+        with open(archive_storage.path(fresh), 'wb') as fh:
+            fh.write(b'partial')
+        old = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(archive_storage.path(orphan), (old, old))
+
+        stats = collect_garbage()
+        self.assertEqual(stats['orphans'], 1)
+        self.assertFalse(archive_storage.exists(orphan))
+        self.assertTrue(archive_storage.exists(fresh))
+        self.assertTrue(archive_storage.exists(name))
+
+
+class AdoptLegacyFilesTests(BlobTestCase):
+    """Перенос файлов, загруженных до дедупликации (Archive.blobs.adopt_legacy_files)"""
+
+    def legacy_file(self, name, content):
+        path = archive_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        return ArchiveFile.objects.create(title=name, uploaded_by=self.user, file=name)
+
+    def test_moves_duplicates_to_one_blob(self):
+        first = self.legacy_file('archive/files/corpus.csv', b'same')
+        second = self.legacy_file('archive/files/corpus_copy.tsv', b'same')
+        other = self.legacy_file('archive/files/other.txt', b'other')
+
+        self.assertEqual(adopt_legacy_files(dry_run=True), (3, 0))
+        self.assertTrue(archive_storage.exists('archive/files/corpus.csv'))
+        self.assertEqual(FileBlob.objects.count(), 0)
+
+        self.assertEqual(adopt_legacy_files(), (3, 3))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        self.assertTrue(is_blob_name(first.file.name))
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertEqual(self.ref_count(first.file.name), 2)
+        self.assertEqual(self.ref_count(other.file.name), 1)
+        self.assertFalse(archive_storage.exists('archive/files/corpus.csv'))
+        self.assertFalse(archive_storage.exists('archive/files/corpus_copy.tsv'))
+        self.assertEqual(download_filename(second), f'{second.slug}.tsv')
+
+    def test_skips_missing_files(self):
+        missing = ArchiveFile.objects.create(
+            title='missing', uploaded_by=self.user, file='archive/files/missing.txt', sha256='0' * 64
+        )
+        self.assertEqual(adopt_legacy_files(), (0, 0))
+        missing.refresh_from_db()
+        self.assertEqual(missing.file.name, 'archive/files/missing.txt')
+
+
+class ChunkedUploadTests(BlobTestCase):
+    """Протокол загрузки частями (Archive.uploads, Archive.views.chunked_upload_*)"""
+
+    content = b'0123456789' * 10
+
+    def setUp(self):
+        super().setUp()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        patcher = mock.patch.object(uploads, 'UPLOAD_TEMP_DIR', temp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user.groups.add(Group.objects.get_or_create(name='Authors')[0])
+        self.client.force_login(self.user)
+
+    def init(self, sha256=None):
+        data = {'filename': 'corpus.csv', 'size': len(self.content)}
+        if sha256 is not None:
+            data['sha256'] = sha256
+        response = self.client.post(
+            reverse('Archive:chunked_upload_init'), json.dumps(data), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['upload_id']
+
+    def put(self, upload_id, start, end):
+        return self.client.put(
+            reverse('Archive:chunked_upload_session', args=[upload_id]),
+            self.content[start:end + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}',
+        )
+
+    def offset(self, upload_id):
+        return self.client.get(reverse('Archive:chunked_upload_session', args=[upload_id])).json()['offset']
+
+    def complete(self, upload_id):
+        return self.client.post(
+            reverse('Archive:chunked_upload_complete', args=[upload_id]),
+            {'title': 'Корпус', 'file_type': 'document'},
+        )
+
+    def upload_all(self, upload_id):
+        for start in range(0, len(self.content), 40):
+            end = min(start + 40, len(self.content)) - 1
+            self.assertEqual(self.put(upload_id, start, end).status_code, 200)
+
+    def test_init(self):
+        upload_id = self.init()
+        session = UploadSession.objects.get(pk=upload_id)
+        self.assertEqual((session.filename, session.size, session.received_bytes), ('corpus.csv', 100, 0))
+        self.assertEqual(os.path.getsize(uploads.session_path(session)), 100)
+
+    def test_out_of_order_chunk_is_rejected(self):
+        upload_id = self.init()
+        response = self.put(upload_id, 40, 79)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['X-Upload-Offset'], '0')
+        self.assertEqual(self.offset(upload_id), 0)
+
+    def test_resume_offset(self):
+        upload_id = self.init()
+        self.assertEqual(self.put(upload_id, 0, 39).json()['offset'], 40)
+        self.assertEqual(self.offset(upload_id), 40)
+        # Повтор уже записанного фрагмента смещение не уменьшает
+        self.assertEqual(self.put(upload_id, 0, 19).json()['offset'], 40)
+        self.assertEqual(self.put(upload_id, 40, 99).json()['offset'], 100)
+
+    def test_complete_before_all_chunks(self):
+        upload_id = self.init()
+        self.put(upload_id, 0, 39)
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+        self.assertTrue(UploadSession.objects.filter(pk=upload_id).exists())
+
+    def test_checksum_mismatch(self):
+        upload_id = self.init(sha256='0' * 64)
+        self.upload_all(upload_id)
+        self.assertEqual(self.complete(upload_id).status_code, 422)
+        self.assertFalse(UploadSession.objects.filter(pk=upload_id).exists())
+        self.assertFalse(ArchiveFile.objects.exists())
+
+    def test_complete(self):
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        upload_id = self.init(sha256=sha256)
+        self.upload_all(upload_id)
+        path = uploads.session_path(UploadSession.objects.get(pk=upload_id))
+
+        with mock.patch('Archive.metadata.hashlib') as metadata_hashlib, \
+                mock.patch('Archive.storage.hash_content') as hash_content:
+            response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 201)
+        # Файл хэшируется один раз - при сборке
+        metadata_hashlib.sha256.return_value.update.assert_not_called()
+        hash_content.assert_not_called()
+
+        file_obj = ArchiveFile.objects.get(pk=response.json()['id'])
+        self.assertEqual((file_obj.sha256, file_obj.size_bytes), (sha256, len(self.content)))
+        self.assertEqual(file_obj.original_filename, 'corpus.csv')
+        with file_obj.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.content)
+        self.assertFalse(UploadSession.objects.filter(pk=upload_id).exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_retry_after_failed_save(self):
+        upload_id = self.init()
+        self.upload_all(upload_id)
+
+        def save_then_fail(form, user):
+            # Хранилище уже переместило файл сессии, затем сохранение упало
+            archive_storage.save('corpus.csv', form.cleaned_data['file'])
+            raise RuntimeError('database is down')
+
+        with mock.patch('Archive.views.save_uploaded_file', side_effect=save_then_fail):
+            with self.assertRaises(RuntimeError):
+                self.complete(upload_id)
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(UploadSession.objects.filter(pk=upload_id).exists())
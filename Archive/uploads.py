@@ -0,0 +1,215 @@
+"""
+Загрузка больших файлов архива частями с возобновлением
+
+Протокол (JSON, см. Archive.views):
+1. POST upload/chunked/ {filename, size, sha256?} - создает сессию,
+   возвращает upload_id и размер фрагмента;
+2. PUT upload/chunked/<id>/ с заголовком Content-Range: bytes a-b/size
+   и телом фрагмента - записывает фрагмент по смещению a;
+   GET upload/chunked/<id>/ - текущее смещение (для возобновления);
+3. POST upload/chunked/<id>/complete/ с полями формы ArchiveFileForm -
+   проверяет размер и SHA-256 и создает ArchiveFile.
+
+Фрагменты пишутся сразу на свое место в один файл сессии, поэтому
+сборка не требует копирования, а готовый файл перемещается в хранилище
+(как TemporaryUploadedFile). Фрагмент принимается, только если он
+начинается не дальше уже полученных байт; повтор уже записанного
+фрагмента безопасен. Брошенные сессии удаляет команда cleanup_upload_sessions.
+"""
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+# Максимальный размер файла (как в ArchiveFileForm)
+MAX_UPLOAD_SIZE = 100 * 1024 * 1024
+
+# Рекомендуемый и максимальный размер фрагмента: фрагмент не больше
+# DATA_UPLOAD_MAX_MEMORY_SIZE, поэтому запрос не отвергнут, даже если
+# middleware (например, silk) прочитает тело целиком
+MAX_CHUNK_SIZE = settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 16 * 1024 * 1024
+CHUNK_SIZE = min(2 * 1024 * 1024, MAX_CHUNK_SIZE)
+
+# Сессии без новых фрагментов дольше этого срока считаются брошенными
+SESSION_TTL = timedelta(hours=24)
+
+# Каталог файлов сессий; должен быть на том же диске, что и MEDIA_ROOT
+UPLOAD_TEMP_DIR = getattr(
+    settings, 'ARCHIVE_UPLOAD_TEMP_DIR', os.path.join(settings.BASE_DIR, 'tmp', 'uploads')
+)
+
+READ_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    """
+    Ошибка протокола загрузки; status - HTTP-статус ответа,
+    discard - продолжить сессию нельзя, ее нужно удалить.
+    """
+
+    def __init__(self, message, status=400, discard=False):
+        super().__init__(message)
+        self.status = status
+        self.discard = discard
+
+
+# Файл сессии перемещен в хранилище (сохранение файла архива затем
+# не удалось) или удален очисткой - загрузку не возобновить
+SESSION_FILE_LOST = 'Файл загрузки не найден - загрузите файл заново'
+
+
+def session_path(session):
+    return os.path.join(UPLOAD_TEMP_DIR, f'{session.pk}.part')
+
+
+def create_session(user, filename, size, sha256=''):
+    """Создает сессию загрузки и пустой файл для фрагментов"""
+    from .models import UploadSession
+
+    filename = os.path.basename(str(filename or '')).strip()
+    if not filename:
+        raise UploadError('Не указано имя файла')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('Некорректный размер файла')
+    if size <= 0:
+        raise UploadError('Пустой файл')
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadError('Размер файла не должен превышать 100 MB.', status=413)
+    sha256 = (sha256 or '').lower()
+    if sha256 and not SHA256_RE.match(sha256):
+        raise UploadError('Некорректный SHA-256')
+
+    session = UploadSession.objects.create(
+        user=user, filename=filename[:255], size=size, sha256=sha256
+    )
+    os.makedirs(UPLOAD_TEMP_DIR, exist_ok=True)
+    with open(session_path(session), 'wb') as fh:
+        fh.truncate(size)
+    return session
+
+
+def parse_content_range(header, size):
+    """Content-Range фрагмента -> (начало, конец включительно)"""
+    match = CONTENT_RANGE_RE.match((header or '').strip())
+    if not match:
+        raise UploadError('Нужен заголовок Content-Range: bytes начало-конец/размер')
+    start, end, total = (int(value) for value in match.groups())
+    if total != size or start > end or end >= size:
+        raise UploadError('Фрагмент вне границ файла', status=416)
+    if end - start + 1 > MAX_CHUNK_SIZE:
+        raise UploadError('Слишком большой фрагмент', status=413)
+    return start, end
+
+
+def write_chunk(session, start, end, stream):
+    """
+    Записывает фрагмент [start, end] из потока запроса.
+
+    Возвращает количество полученных байт после записи.
+    """
+    from .models import UploadSession
+
+    if start > session.received_bytes:
+        raise UploadError('Фрагмент начинается после полученных данных', status=409)
+
+    length = end - start + 1
+    written = 0
+    try:
+        fh = open(session_path(session), 'r+b')
+    except FileNotFoundError:
+        raise UploadError(SESSION_FILE_LOST, status=409, discard=True)
+    with fh:
+        fh.seek(start)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            fh.write(data)
+            written += len(data)
+    if written != length:
+        # Соединение оборвалось - полученные байты не учитываем
+        raise UploadError('Фрагмент получен не полностью')
+
+    # Смещение только растет; параллельный повтор того же фрагмента безопасен
+    UploadSession.objects.filter(pk=session.pk, received_bytes__gte=start).update(
+        received_bytes=Greatest(F('received_bytes'), end + 1),
+        updated_at=timezone.now(),
+    )
+    return UploadSession.objects.values_list('received_bytes', flat=True).get(pk=session.pk)
+
+
+class AssembledUpload(UploadedFile):
+    """Собранный файл сессии; хранилище перемещает его, а не копирует"""
+
+    def __init__(self, path, name, size, sha256):
+        super().__init__(open(path, 'rb'), name=name, content_type=None, size=size)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def assemble(session):
+    """
+    Проверяет полученный файл и возвращает его как UploadedFile.
+
+    Поднимает UploadError, если получены не все байты, файл сессии
+    потерян или SHA-256 не совпадает с заявленным при создании сессии.
+    Вычисленный хэш передается дальше (AssembledUpload.sha256), поэтому
+    ни метаданные, ни хранилище файл повторно не хэшируют.
+    """
+    if not session.is_complete:
+        raise UploadError(f'Получено {session.received_bytes} из {session.size} байт', status=409)
+
+    path = session_path(session)
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        raise UploadError(SESSION_FILE_LOST, status=409, discard=True)
+    sha256 = digest.hexdigest()
+    if session.sha256 and sha256 != session.sha256:
+        raise UploadError('Контрольная сумма не совпадает - загрузите файл заново', status=422, discard=True)
+    return AssembledUpload(path, session.filename, session.size, sha256)
+
+
+def discard_session(session):
+    """Удаляет сессию и ее файл"""
+    try:
+        os.remove(session_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def cleanup_sessions(ttl=SESSION_TTL):
+    """Удаляет брошенные сессии; возвращает их количество"""
+    from .models import UploadSession
+
+    stale = list(UploadSession.objects.filter(updated_at__lt=timezone.now() - ttl))
+    for session in stale:
+        discard_session(session)
+
+    # Файлы без сессии (например, после удаления пользователя)
+    if os.path.isdir(UPLOAD_TEMP_DIR):
+        known = {f'{pk}.part' for pk in UploadSession.objects.values_list('pk', flat=True)}
+        cutoff = (timezone.now() - ttl).timestamp()
+        for filename in os.listdir(UPLOAD_TEMP_DIR):
+            path = os.path.join(UPLOAD_TEMP_DIR, filename)
+            if filename not in known and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+    return len(stale)
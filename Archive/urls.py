@@ -17,13 +17,16 @@ urlpatterns = [
     
     # Управление файлами (для авторизованных пользователей)
     path('upload/', views.FileUploadView.as_view(), name='file_upload'),
+    path('upload/chunked/', views.chunked_upload_init, name='chunked_upload_init'),
+    path('upload/chunked/<uuid:upload_id>/', views.chunked_upload_session, name='chunked_upload_session'),
+    path('upload/chunked/<uuid:upload_id>/complete/', views.chunked_upload_complete, name='chunked_upload_complete'),
     path('my-files/', views.UserFilesView.as_view(), name='user_files'),
     
     # Файлы по типам
-    path('images/', views.images_list, name='images_list'),
-    path('videos/', views.videos_list, name='videos_list'),
-    path('audio/', views.audio_list, name='audio_list'),
-    path('documents/', views.documents_list, name='documents_list'),
+    path('images/', views.FileTypeListView.as_view(file_type='image', template_name='archive/images_list.html'), name='images_list'),
+    path('videos/', views.FileTypeListView.as_view(file_type='video', template_name='archive/videos_list.html'), name='videos_list'),
+    path('audio/', views.FileTypeListView.as_view(file_type='audio', template_name='archive/audio_list.html'), name='audio_list'),
+    path('documents/', views.FileTypeListView.as_view(file_type='document', template_name='archive/documents_list.html'), name='documents_list'),
     
     # Комментарии
     path('file/<int:pk>/comment/', views.add_comment, name='add_comment'),
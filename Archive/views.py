@@ -1,4 +1,4 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, TemplateView, CreateView
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse, Http404
@@ -6,10 +6,23 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
 from django.urls import reverse_lazy
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+from functools import partial
+import json
+
+from Home.cache_utils import make_page
+from Home.page_cache import SurrogateKeysMixin
+from Home.view_counters import record_view
+from . import uploads
+from .downloads import client_info, record_download, serve_file
+from .cache_utils import (
+    cache_file_categories, cache_file_statistics, cache_files_count, cache_files_keyset,
+    cache_files_list, cache_recent_files,
+)
 
 # Безопасный импорт моделей
 try:
-    from .models import ArchiveFile, FileCategory, FileComment, FileLike, Playlist, Download
+    from .models import ArchiveFile, FileCategory, FileComment, FileLike, Playlist, Download, UploadSession
     from .forms import ArchiveFileForm
 except ImportError:
     ArchiveFile = None
@@ -18,36 +31,36 @@ except ImportError:
     FileLike = None
     Playlist = None
     Download = None
+    UploadSession = None
     ArchiveFileForm = None
 
 
-class ArchiveHomeView(TemplateView):
+class ArchiveHomeView(SurrogateKeysMixin, TemplateView):
     """Главная страница архива"""
     template_name = 'archive/index.html'
+    surrogate_keys = ('files', 'file_categories', 'stats')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
         if ArchiveFile and FileCategory:
             # Последние файлы (только с существующими файлами)
-            context['recent_files'] = ArchiveFile.objects.filter(
-                is_public=True
-            ).exclude(file='').order_by('-uploaded_at')[:6]
+            context['recent_files'] = cache_recent_files(6)
             # Категории
-            context['categories'] = FileCategory.objects.filter(is_active=True).order_by('name')
+            context['categories'] = cache_file_categories()
             # Статистика (только файлы с существующими файлами)
-            context['total_files'] = ArchiveFile.objects.filter(
-                is_public=True
-            ).exclude(file='').count()
+            statistics = cache_file_statistics()
+            context['total_files'] = statistics['total_files']
             # Общее количество скачиваний
-            context['total_downloads'] = sum(
-                file.downloads_count for file in ArchiveFile.objects.filter(is_public=True).exclude(file='')
-            )
+            context['total_downloads'] = statistics['total_downloads']
+            # Скачивания за последние дни (дневная статистика)
+            context['recent_downloads'] = statistics['recent_downloads']
         else:
             context['recent_files'] = []
             context['categories'] = []
             context['total_files'] = 0
             context['total_downloads'] = 0
+            context['recent_downloads'] = 0
             
         return context
 
@@ -63,12 +76,19 @@ class FileListView(ListView):
             return ArchiveFile.objects.filter(is_public=True).exclude(file='').order_by('-uploaded_at')
         return []
     
+    def paginate_queryset(self, queryset, page_size):
+        """Страница списка берется из кэша (Archive.cache_utils)"""
+        if not ArchiveFile:
+            return super().paginate_queryset(queryset, page_size)
+        page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        result = cache_files_list(page=page_number, per_page=page_size)
+        page = make_page(result['files'], result['count'], result['number'], page_size)
+        return page.paginator, page, page.object_list, page.has_other_pages()
+    
     def get_context_data(self, **kwargs):
         """Добавляем дополнительный контекст"""
         context = super().get_context_data(**kwargs)
-        context['recent_files'] = ArchiveFile.objects.filter(
-            is_public=True
-        ).exclude(file='').order_by('-uploaded_at')[:6]
+        context['recent_files'] = cache_recent_files(6) if ArchiveFile else []
         return context
 
 
@@ -87,8 +107,8 @@ class FileDetailView(DetailView):
         """Увеличиваем счетчик просмотров при просмотре файла"""
         obj = super().get_object(queryset)
         if obj:
-            obj.views_count += 1
-            obj.save()
+            # Учитываем просмотр в буфере счетчиков (без записи в БД)
+            obj.views_count += record_view(obj)
         return obj
 
 
@@ -124,24 +144,49 @@ class CategoryDetailView(DetailView):
         return context
 
 
+@require_safe
 def file_download(request, pk):
-    """Скачивание файла"""
+    """
+    Скачивание файла (поддерживаются Range и условные запросы, см. Archive.downloads).
+
+    ?inline=1 - показ в браузере (плеер на странице файла), такие запросы
+    не считаются скачиваниями.
+    """
     if not ArchiveFile:
         raise Http404("Архив недоступен")
     
-    file_obj = get_object_or_404(ArchiveFile, pk=pk, is_public=True)
+    file_obj = get_object_or_404(ArchiveFile.objects.only('pk', 'slug', 'file', 'original_filename', 'updated_at'), pk=pk, is_public=True)
     
-    # Проверяем, что файл существует
-    if not file_obj.file:
-        messages.error(request, 'Файл не найден')
-        return redirect('Archive:index')
+    inline = request.GET.get('inline') == '1'
+    # Скачивание записывается после отправки ответа клиенту
+    on_download = None if inline else partial(record_download, file_obj, *client_info(request))
+    response, _ = serve_file(
+        request, file_obj, as_attachment=not inline, on_download=on_download
+    ) if file_obj.file else (None, False)
+    if response is None:
+        raise Http404("Файл не найден")
+    return response
+
+
+def can_upload_files(user):
+    """Загружать файлы могут авторы"""
+    return user.is_authenticated and user.groups.filter(name='Authors').exists()
+
+
+def save_uploaded_file(form, user):
+    """Сохраняет файл из валидной ArchiveFileForm с привязкой к пользователю"""
+    file_obj = form.save(commit=False)
+    file_obj.uploaded_by = user
     
-    # Увеличиваем счетчик скачиваний
-    file_obj.downloads_count += 1
-    file_obj.save()
+    # Устанавливаем статус публикации в зависимости от прав пользователя
+    if user.is_staff:
+        file_obj.is_public = True
+    else:
+        file_obj.is_public = False  # Требует модерации
     
-    messages.info(request, f'Скачивание файла: {file_obj.title}')
-    return redirect('Archive:index')
+    file_obj.save()
+    form.save_m2m()  # Сохраняем связи many-to-many (теги)
+    return file_obj
 
 
 class FileUploadView(LoginRequiredMixin, CreateView):
@@ -157,7 +202,7 @@ class FileUploadView(LoginRequiredMixin, CreateView):
             return redirect('Blog:login')
         
         # Проверяем, является ли пользователь автором
-        if not request.user.groups.filter(name='Authors').exists():
+        if not can_upload_files(request.user):
             messages.error(request, 'Для загрузки файлов необходимо иметь статус автора.')
             return redirect('Blog:dashboard')
         
@@ -165,17 +210,7 @@ class FileUploadView(LoginRequiredMixin, CreateView):
     
     def form_valid(self, form):
         """Сохраняем файл с привязкой к пользователю"""
-        file_obj = form.save(commit=False)
-        file_obj.uploaded_by = self.request.user
-        
-        # Устанавливаем статус публикации в зависимости от прав пользователя
-        if self.request.user.is_staff:
-            file_obj.is_public = True
-        else:
-            file_obj.is_public = False  # Требует модерации
-        
-        file_obj.save()
-        form.save_m2m()  # Сохраняем связи many-to-many (теги)
+        file_obj = save_uploaded_file(form, self.request.user)
         
         if file_obj.is_public:
             messages.success(self.request, f'Файл "{file_obj.title}" успешно загружен и опубликован!')
@@ -196,28 +231,136 @@ class FileUploadView(LoginRequiredMixin, CreateView):
         return context
 
 
-def images_list(request):
-    """Список изображений"""
-    context = {'files': []}
-    return render(request, 'archive/images_list.html', context)
+def _upload_error(error):
+    return JsonResponse({'error': str(error)}, status=error.status)
+
+
+def _upload_state(session):
+    return {
+        'upload_id': str(session.pk),
+        'offset': session.received_bytes,
+        'size': session.size,
+        'complete': session.is_complete,
+        'chunk_size': uploads.CHUNK_SIZE,
+    }
+
 
+@login_required
+@require_POST
+def chunked_upload_init(request):
+    """Начало загрузки частями: {filename, size, sha256?} -> upload_id (см. Archive.uploads)"""
+    if not can_upload_files(request.user):
+        return JsonResponse({'error': 'Для загрузки файлов необходимо иметь статус автора.'}, status=403)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    try:
+        session = uploads.create_session(
+            request.user, data.get('filename'), data.get('size'), data.get('sha256')
+        )
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(_upload_state(session), status=201)
 
-def videos_list(request):
-    """Список видео"""
-    context = {'files': []}
-    return render(request, 'archive/videos_list.html', context)
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def chunked_upload_session(request, upload_id):
+    """Состояние сессии (GET), фрагмент с Content-Range (PUT), отмена (DELETE)"""
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    
+    if request.method == 'DELETE':
+        uploads.discard_session(session)
+        return HttpResponse(status=204)
+    
+    if request.method == 'PUT':
+        try:
+            start, end = uploads.parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), session.size)
+            session.received_bytes = uploads.write_chunk(session, start, end, request)
+        except uploads.UploadError as e:
+            if e.discard:
+                uploads.discard_session(session)
+            response = _upload_error(e)
+            response['X-Upload-Offset'] = str(session.received_bytes)
+            return response
+    return JsonResponse(_upload_state(session))
 
 
-def audio_list(request):
-    """Список аудио"""
-    context = {'files': []}
-    return render(request, 'archive/audio_list.html', context)
+@login_required
+@require_POST
+def chunked_upload_complete(request, upload_id):
+    """
+    Завершение загрузки: проверка размера и SHA-256, создание файла архива.
 
+    Поля формы ArchiveFileForm (кроме самого файла) передаются в теле запроса.
+    """
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    try:
+        upload = uploads.assemble(session)
+    except uploads.UploadError as e:
+        if e.discard:
+            # Файл поврежден или потерян - возобновлять нечего
+            uploads.discard_session(session)
+        return _upload_error(e)
+    
+    files = request.FILES.copy()
+    files['file'] = upload
+    form = ArchiveFileForm(request.POST, files)
+    try:
+        if not form.is_valid():
+            # Сессия сохраняется: можно исправить поля и завершить повторно
+            return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+        file_obj = save_uploaded_file(form, request.user)
+    finally:
+        upload.close()
+    uploads.discard_session(session)
+    
+    if file_obj.is_public:
+        messages.success(request, f'Файл "{file_obj.title}" успешно загружен и опубликован!')
+    else:
+        messages.success(request, f'Файл "{file_obj.title}" загружен и отправлен на модерацию.')
+    return JsonResponse({
+        'id': file_obj.pk,
+        'url': file_obj.get_absolute_url(),
+        'is_public': file_obj.is_public,
+        'redirect': str(FileUploadView.success_url),
+    }, status=201)
 
-def documents_list(request):
-    """Список документов"""
-    context = {'files': []}
-    return render(request, 'archive/documents_list.html', context)
+
+class FileTypeListView(SurrogateKeysMixin, TemplateView):
+    """
+    Список публичных файлов одного типа (изображения, видео, аудио, документы).
+
+    ?category=<id> - фильтр по категории, ?after=<позиция> - следующая
+    страница (пагинация по ключу, см. Archive.cache_utils.cache_files_keyset).
+    """
+    file_type = None
+    paginate_by = 24
+    surrogate_keys = ('files', 'file_categories')
+    
+    def get_category_id(self):
+        try:
+            return int(self.request.GET.get('category', ''))
+        except ValueError:
+            return None
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        category_id = self.get_category_id()
+        after = self.request.GET.get('after')
+        
+        result = cache_files_keyset(
+            file_type=self.file_type, category_id=category_id, after=after, per_page=self.paginate_by
+        )
+        context['files'] = result['files']
+        context['next_cursor'] = result['next']
+        context['is_first_page'] = not after
+        context['total_files'] = cache_files_count(file_type=self.file_type, category_id=category_id)
+        context['categories'] = cache_file_categories()
+        context['current_category'] = category_id
+        return context
 
 
 @login_required
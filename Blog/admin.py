@@ -5,12 +5,13 @@ from django.utils.safestring import mark_safe
 from django.utils import timezone
 from django.db.models import Count
 from NLPers.admin import BaseModelAdmin, make_published, make_draft
+from Home.images import derivative_url
 
 # Безопасный импорт моделей
 try:
-    from .models import Category, Post, Comment, Like, Follow, Newsletter, UserProfile, AuthorRequest, Tag
+    from .models import Category, Post, Comment, Like, Follow, Newsletter, UserProfile, AuthorRequest, Tag, DailyPostStats
 except ImportError:
-    Category = Post = Comment = Like = Follow = Newsletter = UserProfile = AuthorRequest = Tag = None
+    Category = Post = Comment = Like = Follow = Newsletter = UserProfile = AuthorRequest = Tag = DailyPostStats = None
 
 """Админка для категорий постов"""
 @admin.register(Category)
@@ -42,13 +43,14 @@ class CategoryAdmin(BaseModelAdmin):
     def posts_count_display(self, obj):
         """Отображение количества постов с ссылкой"""
         if obj:
-            count = obj.posts.filter(status='published').count()
+            count = obj.posts_count
             if count > 0:
                 url = reverse('admin:Blog_post_changelist') + f'?category__id__exact={obj.id}'
                 return format_html('<a href="{}">{} постов</a>', url, count)
             return '0 постов'
         return '-'
     posts_count_display.short_description = 'Количество постов'
+    posts_count_display.admin_order_field = 'posts_count'
     
     def color_display(self, obj):
         """Отображение цвета категории"""
@@ -65,7 +67,7 @@ class CategoryAdmin(BaseModelAdmin):
         if obj and obj.image:
             return format_html(
                 '<img src="{}" style="width: 50px; height: 40px; object-fit: cover; border-radius: 4px; border: 1px solid #ddd;" />',
-                obj.image.url
+                derivative_url(obj.image, 320)
             )
         return '—'
     image_thumbnail.short_description = 'Картинка'
@@ -75,7 +77,7 @@ class CategoryAdmin(BaseModelAdmin):
         if obj and obj.image:
             return format_html(
                 '<div style="margin-top: 10px;"><img src="{}" style="max-width: 300px; max-height: 200px; border-radius: 6px; box-shadow: 0 2px 10px rgba(0,0,0,0.15);" /></div>',
-                obj.image.url
+                derivative_url(obj.image, 640)
             )
         return "Изображение не загружено"
     
@@ -123,28 +125,26 @@ class TagAdmin(BaseModelAdmin):
     def posts_count_display(self, obj):
         """Отображение количества постов с ссылкой"""
         if obj:
-            count = obj.posts.filter(status='published').count()
+            count = obj.posts_count
             if count > 0:
                 url = reverse('admin:Blog_post_changelist') + f'?tag_objects__id__exact={obj.id}'
                 return format_html('<a href="{}">{} постов</a>', url, count)
             return '0 постов'
         return '-'
     posts_count_display.short_description = 'Количество постов'
+    posts_count_display.admin_order_field = 'posts_count'
     
     def archive_files_count_display(self, obj):
         """Отображение количества файлов архива с ссылкой"""
         if obj:
-            try:
-                from Archive.models import ArchiveFile
-                count = ArchiveFile.objects.filter(tag_objects=obj, is_public=True).count()
-                if count > 0:
-                    url = reverse('admin:Archive_archivefile_changelist') + f'?tag_objects__id__exact={obj.id}'
-                    return format_html('<a href="{}">{} файлов</a>', url, count)
-                return '0 файлов'
-            except ImportError:
-                return 'Архив недоступен'
+            count = obj.archive_files_count
+            if count > 0:
+                url = reverse('admin:Archive_archivefile_changelist') + f'?tag_objects__id__exact={obj.id}'
+                return format_html('<a href="{}">{} файлов</a>', url, count)
+            return '0 файлов'
         return '-'
     archive_files_count_display.short_description = 'Количество файлов'
+    archive_files_count_display.admin_order_field = 'archive_files_count'
     
     def color_display(self, obj):
         """Отображение цвета тега"""
@@ -214,7 +214,7 @@ class PostAdmin(BaseModelAdmin):
         if obj and obj.featured_image:
             return format_html(
                 '<img src="{}" style="width: 60px; height: 45px; object-fit: cover; border-radius: 4px; border: 1px solid #ddd; box-shadow: 0 1px 3px rgba(0,0,0,0.2);" />',
-                obj.featured_image.url
+                derivative_url(obj.featured_image, 320)
             )
         return format_html('<span style="color: #999; font-size: 12px;">Нет изображения</span>')
     featured_image_thumbnail.short_description = '🖼️ Превью'
@@ -378,6 +378,22 @@ class LikeAdmin(BaseModelAdmin):
     target_object.short_description = 'Объект'
 
 
+@admin.register(DailyPostStats)
+class DailyPostStatsAdmin(admin.ModelAdmin):
+    """Админка для дневной статистики постов (заполняет команда rollup_stats)"""
+    list_display = ('date', 'post', 'views', 'likes')
+    list_filter = ('date',)
+    search_fields = ('post__title',)
+    list_select_related = ('post',)
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Follow)
 class FollowAdmin(BaseModelAdmin):
     """Админка для подписок"""
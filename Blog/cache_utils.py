@@ -3,40 +3,160 @@
 """
 from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
-from django.db.models import Count, Q
+from django.core.paginator import Paginator
+from django.db.models import F
+from django.urls import reverse
 from django.utils import timezone
+from collections import namedtuple
 from datetime import timedelta
-import hashlib
+from types import SimpleNamespace
 
+from Home.cache_utils import StoredFile, bump_generation, get_cache_key, get_generations
 
-def get_cache_key(*args, **kwargs):
-    """Генерирует ключ кэша на основе аргументов"""
-    key_string = '_'.join(str(arg) for arg in args)
-    if kwargs:
-        key_string += '_' + '_'.join(f"{k}={v}" for k, v in sorted(kwargs.items()))
-    return hashlib.md5(key_string.encode()).hexdigest()
 
+class CachedAuthor:
+    """Автор поста в закэшированном списке"""
 
-def cache_posts_list(category_slug=None, tag_slug=None, author_username=None, page=1):
-    """Кэширует список постов с фильтрацией"""
+    def __init__(self, username, first_name='', last_name='', avatar=None):
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.userprofile = SimpleNamespace(avatar=StoredFile(avatar))
+
+    def __str__(self):
+        return self.username
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+
+class CachedCategory:
+    """Категория в закэшированном списке (только поля, которые выводят шаблоны)"""
+
+    def __init__(self, row):
+        self.id = self.pk = row.get('id')
+        self.name = row['name']
+        self.slug = row['slug']
+        self.description = row.get('description', '')
+        self.color = row.get('color')
+        self.icon = row.get('icon', '')
+        self.image = StoredFile(row.get('image'))
+        self.is_active = True
+        self.total_posts = row.get('total_posts', 0)
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse('Blog:category_detail', kwargs={'slug': self.slug})
+
+
+class CachedPost:
+    """
+    Пост в закэшированном списке.
+
+    Строится из строки values(*POST_LIST_FIELDS) и повторяет атрибуты
+    модели Post, которые используют шаблоны списков.
+    """
+
+    def __init__(self, row):
+        self.id = self.pk = row['id']
+        self.title = row['title']
+        self.slug = row['slug']
+        self.excerpt = row['excerpt']
+        self.featured_image = StoredFile(row['featured_image'])
+        self.tags = row['tags']
+        self.reading_time = row['reading_time']
+        self.views_count = row['views_count']
+        self.likes_count = row['likes_count']
+        self.comments_count = row['comments_count']
+        self.created_at = row['created_at']
+        self.published_at = row['published_at']
+        self.author = CachedAuthor(
+            row['author__username'],
+            row['author__first_name'],
+            row['author__last_name'],
+            row['author__userprofile__avatar'],
+        )
+        self.category = None
+        if row['category__slug']:
+            self.category = CachedCategory({
+                'id': row['category_id'],
+                'name': row['category__name'],
+                'slug': row['category__slug'],
+                'color': row['category__color'],
+            })
+
+    def __str__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return reverse('Blog:post_detail', kwargs={'slug': self.slug})
+
+    def get_tags_list(self):
+        """Возвращает список тегов как строки"""
+        return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
+
+
+POST_LIST_FIELDS = (
+    'id', 'title', 'slug', 'excerpt', 'featured_image', 'tags', 'reading_time',
+    'views_count', 'likes_count', 'comments_count', 'created_at', 'published_at',
+    'author__username', 'author__first_name', 'author__last_name',
+    'author__userprofile__avatar',
+    'category_id', 'category__name', 'category__slug', 'category__color',
+)
+
+# Допустимые сортировки списка постов (параметр ?sort= в PostListView)
+POST_ORDERINGS = ('-published_at', 'published_at', '-views_count', '-likes_count', 'title')
+
+
+def _published_posts():
+    from .models import Post
+    return Post.objects.filter(status='published')
+
+
+def _cached_posts(queryset):
+    return [CachedPost(row) for row in queryset.values(*POST_LIST_FIELDS)]
+
+
+def posts_list_namespaces(category_slug=None, tag_slug=None, author_username=None):
+    """Пространства имен, от которых зависит список постов с данными фильтрами"""
+    namespaces = []
+    if category_slug:
+        namespaces.append(f'category:{category_slug}')
+    if tag_slug:
+        namespaces.append(f'tag:{tag_slug}')
+    if author_username:
+        namespaces.append(f'author:{author_username}')
+    return namespaces or ['posts']
+
+
+def cache_posts_list(category_slug=None, tag_slug=None, author_username=None, page=1,
+                     ordering=POST_ORDERINGS[0], per_page=10):
+    """
+    Кэширует страницу списка постов с фильтрацией.
+
+    Возвращает {'posts': [CachedPost], 'count': всего постов, 'number': номер страницы};
+    объект страницы для шаблона собирает Home.cache_utils.make_page.
+    """
+    if ordering not in POST_ORDERINGS:
+        ordering = POST_ORDERINGS[0]
     cache_key = get_cache_key(
         'posts_list',
         category_slug or 'all',
         tag_slug or 'all', 
         author_username or 'all',
-        page
+        page,
+        ordering,
+        per_page,
+        namespaces=posts_list_namespaces(category_slug, tag_slug, author_username)
     )
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
         return cached_data
     
-    from .models import Post, Category, Tag
-    
-    # Базовый запрос
-    posts = Post.objects.filter(status='published').select_related(
-        'author', 'category'
-    ).prefetch_related('tag_objects')
+    posts = _published_posts()
     
     # Применяем фильтры
     if category_slug:
@@ -46,23 +166,14 @@ def cache_posts_list(category_slug=None, tag_slug=None, author_username=None, pa
     if author_username:
         posts = posts.filter(author__username=author_username)
     
-    # Пагинация
-    from django.core.paginator import Paginator
-    paginator = Paginator(posts, 10)
+    # Пагинация: COUNT и одна выборка строк текущей страницы
+    paginator = Paginator(posts.order_by(ordering, '-id').values(*POST_LIST_FIELDS), per_page)
     page_obj = paginator.get_page(page)
     
     result = {
-        'posts': list(page_obj.object_list.values(
-            'id', 'title', 'slug', 'excerpt', 'featured_image',
-            'views_count', 'likes_count', 'comments_count',
-            'created_at', 'published_at',
-            'author__username', 'author__first_name', 'author__last_name',
-            'category__name', 'category__slug', 'category__color'
-        )),
-        'page_obj': page_obj,
-        'has_next': page_obj.has_next(),
-        'has_previous': page_obj.has_previous(),
-        'num_pages': page_obj.paginator.num_pages,
+        'posts': [CachedPost(row) for row in page_obj.object_list],
+        'count': paginator.count,
+        'number': page_obj.number,
     }
     
     # Кэшируем на 10 минут
@@ -72,26 +183,37 @@ def cache_posts_list(category_slug=None, tag_slug=None, author_username=None, pa
 
 def cache_popular_posts(limit=5):
     """Кэширует популярные посты"""
-    cache_key = get_cache_key('popular_posts', limit)
+    cache_key = get_cache_key('popular_posts', limit, namespaces=['posts'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
         return cached_data
     
-    from .models import Post
-    
     # Посты с наибольшим количеством просмотров за последние 30 дней
     thirty_days_ago = timezone.now() - timedelta(days=30)
-    popular_posts = Post.objects.filter(
-        status='published',
+    result = _cached_posts(_published_posts().filter(
         published_at__gte=thirty_days_ago
-    ).select_related('author', 'category').order_by('-views_count')[:limit]
+    ).order_by('-views_count')[:limit])
     
-    result = list(popular_posts.values(
-        'id', 'title', 'slug', 'excerpt', 'featured_image',
-        'views_count', 'likes_count', 'created_at',
-        'author__username', 'category__name', 'category__color'
-    ))
+    # Кэшируем на 1 час
+    cache.set(cache_key, result, 3600)
+    return result
+
+
+def cache_most_viewed_posts(limit=5, exclude_category_slug=None):
+    """Кэширует самые просматриваемые посты (за все время)"""
+    cache_key = get_cache_key(
+        'most_viewed_posts', limit, exclude_category_slug or 'none', namespaces=['posts']
+    )
+    
+    cached_data = cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data
+    
+    posts = _published_posts()
+    if exclude_category_slug:
+        posts = posts.exclude(category__slug=exclude_category_slug)
+    result = _cached_posts(posts.order_by('-views_count')[:limit])
     
     # Кэшируем на 1 час
     cache.set(cache_key, result, 3600)
@@ -100,32 +222,107 @@ def cache_popular_posts(limit=5):
 
 def cache_recent_posts(limit=5):
     """Кэширует последние посты"""
-    cache_key = get_cache_key('recent_posts', limit)
+    cache_key = get_cache_key('recent_posts', limit, namespaces=['posts'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
         return cached_data
     
-    from .models import Post
-    
-    recent_posts = Post.objects.filter(
-        status='published'
-    ).select_related('author', 'category').order_by('-published_at')[:limit]
-    
-    result = list(recent_posts.values(
-        'id', 'title', 'slug', 'excerpt', 'featured_image',
-        'views_count', 'likes_count', 'created_at',
-        'author__username', 'category__name', 'category__color'
-    ))
+    result = _cached_posts(
+        _published_posts().order_by('-published_at', '-created_at')[:limit]
+    )
     
     # Кэшируем на 30 минут
     cache.set(cache_key, result, 1800)
     return result
 
 
+def cache_featured_posts(limit=3):
+    """Кэширует рекомендуемые посты"""
+    cache_key = get_cache_key('featured_posts', limit, namespaces=['posts'])
+    
+    cached_data = cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data
+    
+    result = _cached_posts(
+        _published_posts().filter(is_featured=True).order_by('-published_at')[:limit]
+    )
+    
+    # Кэшируем на 1 час
+    cache.set(cache_key, result, 3600)
+    return result
+
+
+def cache_published_posts_count():
+    """Кэширует общее количество опубликованных постов"""
+    cache_key = get_cache_key('published_posts_count', namespaces=['posts'])
+    
+    cached_data = cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data
+    
+    result = _published_posts().count()
+    
+    # Кэшируем на 1 час
+    cache.set(cache_key, result, 3600)
+    return result
+
+
+PostLink = namedtuple('PostLink', ['id', 'slug', 'title'])
+
+# Последний прочитанный список навигации: (поколение 'posts', данные)
+_navigation_memo = (None, None)
+
+
+def cache_post_navigation():
+    """
+    Кэширует список опубликованных постов в порядке публикации.
+
+    Возвращает {'links': [PostLink], 'positions': {id: индекс}}. Список
+    дополнительно запоминается в памяти процесса до смены поколения 'posts',
+    поэтому на запрос приходится только чтение счетчика поколения.
+    """
+    global _navigation_memo
+    generation = get_generations(['posts'])['posts']
+    memo_generation, navigation = _navigation_memo
+    if memo_generation == generation:
+        return navigation
+    
+    cache_key = get_cache_key('post_navigation', namespaces=['posts'])
+    navigation = cache.get(cache_key)
+    if navigation is None:
+        links = [
+            PostLink(*row) for row in _published_posts().order_by(
+                'published_at', 'id'
+            ).values_list('id', 'slug', 'title')
+        ]
+        navigation = {
+            'links': links,
+            'positions': {link.id: position for position, link in enumerate(links)},
+        }
+        # Кэшируем на сутки (список сбрасывается сменой поколения 'posts')
+        cache.set(cache_key, navigation, 86400)
+    
+    _navigation_memo = (generation, navigation)
+    return navigation
+
+
+def get_post_neighbours(post_id):
+    """Возвращает (предыдущий, следующий) пост в порядке публикации"""
+    navigation = cache_post_navigation()
+    position = navigation['positions'].get(post_id)
+    if position is None:
+        return None, None
+    links = navigation['links']
+    previous_post = links[position - 1] if position > 0 else None
+    next_post = links[position + 1] if position + 1 < len(links) else None
+    return previous_post, next_post
+
+
 def cache_categories_with_counts():
-    """Кэширует категории с количеством постов"""
-    cache_key = get_cache_key('categories_with_counts')
+    """Кэширует активные категории с количеством опубликованных постов"""
+    cache_key = get_cache_key('categories_with_counts', namespaces=['categories'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
@@ -133,15 +330,12 @@ def cache_categories_with_counts():
     
     from .models import Category
     
-    categories = Category.objects.filter(
-        is_active=True
-    ).annotate(
-        posts_count=Count('posts', filter=Q(posts__status='published'))
-    ).order_by('name')
+    # Количество постов хранится в Category.posts_count (см. Blog.counters)
+    categories = Category.objects.filter(is_active=True).order_by('name')
     
-    result = list(categories.values(
-        'id', 'name', 'slug', 'description', 'color', 'icon', 'image', 'posts_count'
-    ))
+    result = [CachedCategory(row) for row in categories.values(
+        'id', 'name', 'slug', 'description', 'color', 'icon', 'image', total_posts=F('posts_count')
+    )]
     
     # Кэшируем на 2 часа
     cache.set(cache_key, result, 7200)
@@ -150,7 +344,7 @@ def cache_categories_with_counts():
 
 def cache_tags_with_counts():
     """Кэширует теги с количеством постов"""
-    cache_key = get_cache_key('tags_with_counts')
+    cache_key = get_cache_key('tags_with_counts', namespaces=['tags'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
@@ -158,14 +352,11 @@ def cache_tags_with_counts():
     
     from .models import Tag
     
-    tags = Tag.objects.filter(
-        is_active=True
-    ).annotate(
-        posts_count=Count('posts', filter=Q(posts__status='published'))
-    ).order_by('name')
+    # Счетчики хранятся в Tag.posts_count и Tag.archive_files_count (см. Blog.counters)
+    tags = Tag.objects.filter(is_active=True).order_by('name')
     
     result = list(tags.values(
-        'id', 'name', 'slug', 'description', 'color', 'icon', 'posts_count'
+        'id', 'name', 'slug', 'description', 'color', 'icon', 'posts_count', 'archive_files_count'
     ))
     
     # Кэшируем на 2 часа
@@ -175,7 +366,7 @@ def cache_tags_with_counts():
 
 def cache_post_detail(post_slug):
     """Кэширует детали поста"""
-    cache_key = get_cache_key('post_detail', post_slug)
+    cache_key = get_cache_key('post_detail', post_slug, namespaces=[f'post:{post_slug}'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
@@ -226,39 +417,31 @@ def cache_post_detail(post_slug):
         return None
 
 
-def invalidate_post_cache(post_slug=None, category_slug=None, tag_slug=None):
-    """Инвалидирует кэш постов при изменении"""
-    # Очищаем кэш списков постов
-    cache.delete_many([
-        get_cache_key('posts_list', 'all', 'all', 'all', 1),
-        get_cache_key('popular_posts', 5),
-        get_cache_key('recent_posts', 5),
-    ])
-    
-    # Очищаем кэш категорий и тегов
-    cache.delete_many([
-        get_cache_key('categories_with_counts'),
-        get_cache_key('tags_with_counts'),
-    ])
-    
-    # Очищаем кэш конкретного поста
+def invalidate_post_cache(post_slug=None, category_slug=None, tag_slug=None,
+                          author_username=None, tag_slugs=(), category_slugs=()):
+    """
+    Инвалидирует кэш постов при изменении.
+
+    Вместо удаления отдельных ключей увеличивает поколения пространств имен:
+    это инвалидирует все страницы пагинации и все варианты фильтров сразу.
+    """
+    namespaces = ['posts', 'categories', 'tags']
     if post_slug:
-        cache.delete(get_cache_key('post_detail', post_slug))
-    
-    # Очищаем кэш по категории
-    if category_slug:
-        for page in range(1, 10):  # Очищаем первые 10 страниц
-            cache.delete(get_cache_key('posts_list', category_slug, 'all', 'all', page))
-    
-    # Очищаем кэш по тегу
-    if tag_slug:
-        for page in range(1, 10):  # Очищаем первые 10 страниц
-            cache.delete(get_cache_key('posts_list', 'all', tag_slug, 'all', page))
+        namespaces.append(f'post:{post_slug}')
+    for slug in (category_slug, *category_slugs):
+        if slug:
+            namespaces.append(f'category:{slug}')
+    if author_username:
+        namespaces.append(f'author:{author_username}')
+    for slug in (tag_slug, *tag_slugs):
+        if slug:
+            namespaces.append(f'tag:{slug}')
+    bump_generation(*namespaces)
 
 
 def cache_user_profile(username):
     """Кэширует профиль пользователя"""
-    cache_key = get_cache_key('user_profile', username)
+    cache_key = get_cache_key('user_profile', username, namespaces=[f'user:{username}'])
     
     cached_data = cache.get(cache_key)
     if cached_data is not None:
@@ -299,4 +482,4 @@ def cache_user_profile(username):
 
 def invalidate_user_cache(username):
     """Инвалидирует кэш пользователя"""
-    cache.delete(get_cache_key('user_profile', username))
+    bump_generation(f'user:{username}')
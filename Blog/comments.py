@@ -0,0 +1,84 @@
+"""
+Загрузка дерева комментариев
+
+Все одобренные комментарии поста (или страницы веток) читаются одним
+запросом и собираются в дерево за O(n): каждому комментарию добавляется
+список children. Шаблон обходит дерево без дополнительных запросов.
+
+Порядок: ветки верхнего уровня - новые сначала, ответы внутри ветки -
+в порядке появления (по материализованному пути Comment.path).
+"""
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+from .models import Comment
+
+
+# Количество веток верхнего уровня на странице комментариев
+THREADS_PER_PAGE = 20
+
+
+def _approved_comments(post_id):
+    return Comment.objects.filter(post_id=post_id, is_approved=True).select_related('author')
+
+
+def build_comment_tree(comments, root_ids=None):
+    """
+    Собирает дерево из комментариев, упорядоченных по пути.
+
+    Корни - комментарии верхнего уровня (или с id из root_ids). Ответы,
+    родитель которых не попал в выборку (например, не одобрен), скрываются.
+    """
+    nodes = {}
+    for comment in comments:
+        comment.children = []
+        nodes[comment.pk] = comment
+
+    roots = []
+    for comment in nodes.values():
+        is_root = comment.parent_id is None if root_ids is None else comment.pk in root_ids
+        if is_root:
+            roots.append(comment)
+        elif comment.parent_id in nodes:
+            nodes[comment.parent_id].children.append(comment)
+    return roots
+
+
+def load_comment_tree(post):
+    """Все одобренные комментарии поста одним запросом; возвращает ветки верхнего уровня"""
+    comments = _approved_comments(post.pk).order_by('path', 'pk')
+    roots = build_comment_tree(comments)
+    roots.reverse()
+    return roots
+
+
+def load_comment_page(post, page=1, per_page=THREADS_PER_PAGE):
+    """
+    Страница веток верхнего уровня с ответами.
+
+    Запросы: COUNT веток, id веток страницы и сами ветки (по префиксам путей).
+    Возвращает объект Page, object_list которого - корни веток с children.
+    """
+    roots = _approved_comments(post.pk).filter(parent__isnull=True).order_by('-created_at', '-pk')
+    page_obj = Paginator(roots.values_list('pk', 'path'), per_page).get_page(page)
+    root_paths = dict(page_obj.object_list)
+
+    if root_paths:
+        prefixes = Q()
+        for path in root_paths.values():
+            prefixes |= Q(path__startswith=path)
+        comments = _approved_comments(post.pk).filter(prefixes).order_by('path', 'pk')
+        threads = {root.pk: root for root in build_comment_tree(comments)}
+        page_obj.object_list = [threads[pk] for pk in root_paths if pk in threads]
+    else:
+        page_obj.object_list = []
+    return page_obj
+
+
+def load_comment_subtree(comment):
+    """Ветка комментария (сам комментарий с children) одним запросом"""
+    comments = _approved_comments(comment.post_id).filter(
+        path__startswith=comment.path
+    ).order_by('path', 'pk')
+    roots = build_comment_tree(comments, root_ids={comment.pk})
+    return roots[0] if roots else None
@@ -0,0 +1,308 @@
+"""
+Атомарные счетчики лайков и подписок, счетчики контента категорий и тегов
+
+Лайк/подписка и изменение денормализованного счетчика выполняются в одной
+транзакции: строка Like/Follow вставляется (или удаляется), а счетчик
+меняется UPDATE с F()-выражением, поэтому параллельные запросы не теряют
+приращений. Счетчик меняется, только если вставка/удаление строки
+действительно произошли. Расхождения, накопленные до этого (или после
+каскадного удаления), исправляет команда reconcile_counters.
+
+Подписка и отписка также обновляют персональную ленту (см. Blog.feed).
+
+Счетчики контента (Category.posts_count, Tag.posts_count,
+Tag.archive_files_count) пересчитываются точно, но только для затронутых
+строк: одним UPDATE с подзапросом COUNT на каждый счетчик. Пересчет
+выполняется при публикации/снятии поста, смене категории и тегов.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from Home.cache_utils import bump_generation
+from . import feed
+
+
+def _change_counter(queryset, field, delta):
+    """Атомарно меняет счетчик; значение не опускается ниже нуля"""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def _toggle(model, lookup, defaults):
+    """
+    Переключает наличие строки model(**lookup).
+
+    Возвращает (создана ли строка, изменилось ли что-нибудь). Должна
+    вызываться внутри transaction.atomic.
+    """
+    deleted, _ = model.objects.filter(**lookup).delete()
+    if deleted:
+        return False, True
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **defaults)
+    except IntegrityError:
+        # Параллельный запрос уже создал строку - состояние не меняем
+        return True, False
+    return True, True
+
+
+def toggle_post_like(user, post):
+    """
+    Ставит или снимает лайк поста.
+
+    Возвращает (поставлен ли лайк, актуальное количество лайков).
+    """
+    from .models import Like, Post
+
+    with transaction.atomic():
+        liked, changed = _toggle(
+            Like,
+            {'user': user, 'content_type': 'post', 'object_id': post.pk},
+            {'post': post}
+        )
+        if changed:
+            _change_counter(Post.objects.filter(pk=post.pk), 'likes_count', 1 if liked else -1)
+        likes_count = Post.objects.filter(pk=post.pk).values_list('likes_count', flat=True).get()
+
+    if changed:
+        bump_generation(f'post:{post.slug}')
+    return liked, likes_count
+
+
+def toggle_user_follow(follower, user):
+    """
+    Подписывает follower на пользователя user или отписывает.
+
+    Возвращает (подписан ли, актуальное количество подписчиков user).
+    """
+    from .models import Follow, UserProfile
+
+    with transaction.atomic():
+        followed, changed = _toggle(
+            Follow,
+            {'follower': follower, 'following_user': user},
+            {'follow_type': 'user'}
+        )
+        if changed:
+            delta = 1 if followed else -1
+            _change_counter(UserProfile.objects.filter(user=user), 'followers_count', delta)
+            _change_counter(UserProfile.objects.filter(user=follower), 'following_count', delta)
+        followers_count = UserProfile.objects.filter(user=user).values_list(
+            'followers_count', flat=True
+        ).first() or 0
+
+    if changed:
+        if followed:
+            feed.add_source(follower, author=user)
+        else:
+            feed.remove_source(follower, author=user)
+        bump_generation(f'user:{user.username}', f'user:{follower.username}')
+    return followed, followers_count
+
+
+def toggle_category_follow(follower, category):
+    """Подписывает follower на категорию или отписывает; возвращает подписан ли"""
+    from .models import Follow, UserProfile
+
+    with transaction.atomic():
+        followed, changed = _toggle(
+            Follow,
+            {'follower': follower, 'following_category': category},
+            {'follow_type': 'category'}
+        )
+        if changed:
+            _change_counter(
+                UserProfile.objects.filter(user=follower), 'following_count', 1 if followed else -1
+            )
+
+    if changed:
+        if followed:
+            feed.add_source(follower, category=category)
+        else:
+            feed.remove_source(follower, category=category)
+        bump_generation(f'user:{follower.username}')
+    return followed
+
+
+def get_user_state(user, post_ids=(), author_ids=(), category_ids=()):
+    """
+    Состояние лайков и подписок пользователя для набора объектов.
+
+    Один запрос (UNION по Like и Follow). Возвращает словарь
+    {'liked_posts': set, 'followed_authors': set, 'followed_categories': set}.
+    """
+    from .models import Follow, Like
+
+    state = {'liked_posts': set(), 'followed_authors': set(), 'followed_categories': set()}
+    if not user.is_authenticated:
+        return state
+
+    parts = []
+    if post_ids:
+        parts.append(
+            Like.objects.filter(user=user, content_type='post', object_id__in=post_ids)
+            .annotate(kind=Value('liked_posts', output_field=CharField()))
+            .values_list('kind', 'object_id')
+        )
+    if author_ids:
+        parts.append(
+            Follow.objects.filter(follower=user, following_user_id__in=author_ids)
+            .annotate(kind=Value('followed_authors', output_field=CharField()))
+            .values_list('kind', 'following_user_id')
+        )
+    if category_ids:
+        parts.append(
+            Follow.objects.filter(follower=user, following_category_id__in=category_ids)
+            .annotate(kind=Value('followed_categories', output_field=CharField()))
+            .values_list('kind', 'following_category_id')
+        )
+    if not parts:
+        return state
+
+    rows = parts[0].order_by().union(*(part.order_by() for part in parts[1:]), all=True)
+    for kind, object_id in rows:
+        state[kind].add(object_id)
+    return state
+
+
+def count_subquery(queryset, group_field, outer_field='pk'):
+    """Подзапрос COUNT(*) строк queryset, связанных с внешней строкой"""
+    counts = (
+        queryset.filter(**{group_field: OuterRef(outer_field)})
+        .order_by()
+        .values(group_field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile_field(queryset, field, actual):
+    """Одним UPDATE исправляет строки, где счетчик расходится с фактом"""
+    return queryset.exclude(**{field: actual}).update(**{field: actual})
+
+
+def reconcile_counters():
+    """
+    Пересчитывает счетчики лайков и подписок по фактическим строкам.
+
+    Возвращает {'<модель>.<поле>': количество исправленных строк}.
+    """
+    from .models import Comment, Follow, Like, Post, UserProfile
+
+    with transaction.atomic():
+        fixed = {
+            'Post.likes_count': reconcile_field(
+                Post.objects.all(), 'likes_count',
+                count_subquery(Like.objects.filter(content_type='post'), 'object_id')
+            ),
+            'Comment.likes_count': reconcile_field(
+                Comment.objects.all(), 'likes_count',
+                count_subquery(Like.objects.filter(content_type='comment'), 'object_id')
+            ),
+            'UserProfile.followers_count': reconcile_field(
+                UserProfile.objects.all(), 'followers_count',
+                count_subquery(Follow.objects.all(), 'following_user', outer_field='user')
+            ),
+            'UserProfile.following_count': reconcile_field(
+                UserProfile.objects.all(), 'following_count',
+                count_subquery(Follow.objects.all(), 'follower', outer_field='user')
+            ),
+        }
+    if any(fixed.values()):
+        bump_generation('posts')
+    return fixed
+
+
+def _archive_file_model():
+    try:
+        from Archive.models import ArchiveFile
+    except ImportError:
+        return None
+    return ArchiveFile
+
+
+def _published_post_links():
+    from .models import Post
+    return Post.tag_objects.through.objects.filter(post__status='published')
+
+
+def _public_file_links():
+    ArchiveFile = _archive_file_model()
+    if ArchiveFile is None:
+        return None
+    return ArchiveFile.tag_objects.through.objects.filter(archivefile__is_public=True)
+
+
+def recount_categories(category_ids=None):
+    """Пересчитывает Category.posts_count (для всех категорий, если ids не заданы)"""
+    from .models import Category, Post
+
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=[pk for pk in category_ids if pk])
+    return reconcile_field(
+        categories, 'posts_count',
+        count_subquery(Post.objects.filter(status='published'), 'category')
+    )
+
+
+def recount_tags(tag_ids=None):
+    """Пересчитывает Tag.posts_count и Tag.archive_files_count"""
+    from .models import Tag
+
+    tags = Tag.objects.all()
+    if tag_ids is not None:
+        tag_ids = list(tag_ids)
+        if not tag_ids:
+            return 0
+        tags = tags.filter(pk__in=tag_ids)
+    fixed = reconcile_field(tags, 'posts_count', count_subquery(_published_post_links(), 'tag'))
+    file_links = _public_file_links()
+    if file_links is not None:
+        fixed += reconcile_field(tags, 'archive_files_count', count_subquery(file_links, 'tag'))
+    return fixed
+
+
+def recount_post_counters(post_ids):
+    """Пересчитывает счетчики категорий и тегов, к которым относятся посты"""
+    from .models import Post
+
+    post_ids = list(post_ids)
+    with transaction.atomic():
+        recount_categories(
+            Post.objects.filter(pk__in=post_ids).values_list('category_id', flat=True).distinct()
+        )
+        recount_tags(
+            Post.tag_objects.through.objects.filter(post_id__in=post_ids)
+            .values_list('tag_id', flat=True).distinct()
+        )
+    bump_generation('categories', 'tags')
+
+
+def post_counters_changed(post, old_status, old_category_id):
+    """
+    Обновляет счетчики контента после сохранения поста.
+
+    Категории пересчитываются при публикации/снятии и смене категории
+    опубликованного поста, теги - при публикации/снятии (изменения набора
+    тегов учитывает Blog.tags.sync_object_tags).
+    """
+    was_published = old_status == 'published'
+    is_published = post.status == 'published'
+    if not (was_published or is_published):
+        return
+
+    publication_changed = was_published != is_published
+    if not (publication_changed or old_category_id != post.category_id):
+        return
+    with transaction.atomic():
+        recount_categories({old_category_id, post.category_id})
+        if publication_changed:
+            recount_tags(post.tag_objects.through.objects.filter(post_id=post.pk).values_list('tag_id', flat=True))
+    # post_save сбросил кэш до пересчета - сбрасываем списки еще раз
+    bump_generation('categories', 'tags')
+
@@ -0,0 +1,178 @@
+"""
+Персональная лента постов (fan-out on write)
+
+При публикации пост сразу раскладывается в ленты всех подписчиков автора
+и категории (таблица Blog_feeditem), поэтому чтение ленты - один запрос
+по индексу (user, -published_at) независимо от количества подписок.
+Лента каждого пользователя ограничена FEED_MAX_ITEMS записями.
+
+Пагинация курсорная: курсор кодирует (published_at, post_id) последней
+показанной записи, следующая страница читается условием "строго раньше".
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+# Максимальное количество записей в ленте одного пользователя
+FEED_MAX_ITEMS = 1000
+
+# Количество записей на странице ленты
+FEED_PAGE_SIZE = 20
+
+# Сколько последних постов добавляется в ленту при новой подписке
+FOLLOW_BACKFILL = 50
+
+BATCH_SIZE = 1000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(published_at, post_id):
+    """Курсор '<микросекунды от эпохи>_<id поста>'"""
+    delta = published_at - _EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+    return f'{microseconds}_{post_id}'
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор; для некорректного значения возвращает None"""
+    try:
+        microseconds, post_id = cursor.split('_', 1)
+        return _EPOCH + timedelta(microseconds=int(microseconds)), int(post_id)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def _follower_ids(post):
+    """id подписчиков автора и категории поста (без самого автора)"""
+    from .models import Follow
+
+    condition = Q(following_user_id=post.author_id)
+    if post.category_id:
+        condition |= Q(following_category_id=post.category_id)
+    return (
+        Follow.objects.filter(condition)
+        .exclude(follower_id=post.author_id)
+        .order_by()
+        .values_list('follower_id', flat=True)
+        .distinct()
+    )
+
+
+def trim_feeds(user_ids, max_items=FEED_MAX_ITEMS):
+    """Удаляет из лент пользователей записи старше max_items последних (один DELETE)"""
+    from .models import FeedItem
+
+    boundary = FeedItem.objects.filter(
+        user_id=OuterRef('user_id')
+    ).order_by('-published_at', '-post_id').values('published_at')[max_items - 1:max_items]
+    FeedItem.objects.filter(user_id__in=user_ids, published_at__lt=Subquery(boundary)).delete()
+
+
+def publish_post(post, batch_size=BATCH_SIZE):
+    """Добавляет опубликованный пост в ленты подписчиков; возвращает их количество"""
+    from .models import FeedItem
+
+    follower_ids = list(_follower_ids(post))
+    for start in range(0, len(follower_ids), batch_size):
+        batch = follower_ids[start:start + batch_size]
+        with transaction.atomic():
+            FeedItem.objects.bulk_create(
+                [FeedItem(user_id=user_id, post_id=post.pk, published_at=post.published_at)
+                 for user_id in batch],
+                ignore_conflicts=True
+            )
+            trim_feeds(batch)
+    return len(follower_ids)
+
+
+def retract_post(post_id):
+    """Убирает пост из всех лент (снят с публикации)"""
+    from .models import FeedItem
+    FeedItem.objects.filter(post_id=post_id).delete()
+
+
+def add_source(follower, author=None, category=None, limit=FOLLOW_BACKFILL):
+    """После подписки добавляет в ленту последние посты автора или категории"""
+    from .models import FeedItem, Post
+
+    posts = Post.objects.filter(status='published').exclude(author=follower)
+    posts = posts.filter(author=author) if author is not None else posts.filter(category=category)
+    recent = posts.order_by('-published_at').values_list('id', 'published_at')[:limit]
+    with transaction.atomic():
+        FeedItem.objects.bulk_create(
+            [FeedItem(user=follower, post_id=post_id, published_at=published_at)
+             for post_id, published_at in recent],
+            ignore_conflicts=True
+        )
+        trim_feeds([follower.pk])
+
+
+def remove_source(follower, author=None, category=None):
+    """
+    После отписки убирает из ленты посты автора или категории.
+
+    Посты, которые остаются в ленте через другую подписку (на их автора
+    или категорию), не удаляются.
+    """
+    from .models import FeedItem, Follow
+
+    items = FeedItem.objects.filter(user=follower)
+    items = items.filter(post__author=author) if author is not None else items.filter(post__category=category)
+    follows = Follow.objects.filter(follower=follower)
+    items.exclude(
+        Q(post__author_id__in=follows.filter(following_user__isnull=False).values('following_user_id'))
+        | Q(post__category_id__in=follows.filter(following_category__isnull=False).values('following_category_id'))
+    ).delete()
+
+
+def get_feed_page(user, cursor=None, per_page=FEED_PAGE_SIZE):
+    """
+    Страница ленты пользователя одним запросом.
+
+    Возвращает (список постов, курсор следующей страницы или None).
+    """
+    from .models import FeedItem
+
+    items = FeedItem.objects.filter(user=user, post__status='published')
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        published_at, post_id = position
+        items = items.filter(
+            Q(published_at__lt=published_at) | Q(published_at=published_at, post_id__lt=post_id)
+        )
+    items = list(
+        items.select_related('post__author__userprofile', 'post__category')
+        .order_by('-published_at', '-post_id')[:per_page + 1]
+    )
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(items[-1].published_at, items[-1].post_id)
+    return [item.post for item in items], next_cursor
+
+
+def rebuild_feed(user, max_items=FEED_MAX_ITEMS):
+    """Пересобирает ленту пользователя по его текущим подпискам; возвращает размер ленты"""
+    from .models import FeedItem, Follow, Post
+
+    follows = Follow.objects.filter(follower=user)
+    author_ids = follows.filter(following_user__isnull=False).values('following_user_id')
+    category_ids = follows.filter(following_category__isnull=False).values('following_category_id')
+    posts = list(
+        Post.objects.filter(status='published')
+        .filter(Q(author_id__in=author_ids) | Q(category_id__in=category_ids))
+        .exclude(author=user)
+        .order_by('-published_at', '-id')
+        .values_list('id', 'published_at')[:max_items]
+    )
+    with transaction.atomic():
+        FeedItem.objects.filter(user=user).delete()
+        FeedItem.objects.bulk_create(
+            [FeedItem(user=user, post_id=post_id, published_at=published_at)
+             for post_id, published_at in posts],
+            batch_size=BATCH_SIZE
+        )
+    return len(posts)
@@ -0,0 +1,41 @@
+"""
+Команда для заполнения персональных лент по текущим подпискам
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from Blog.feed import FEED_MAX_ITEMS, rebuild_feed
+from Blog.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает персональные ленты пользователей по их подпискам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Пересобрать ленту только указанного пользователя (username)',
+        )
+        parser.add_argument(
+            '--max-items',
+            type=int,
+            default=FEED_MAX_ITEMS,
+            help=f'Максимальный размер ленты (по умолчанию {FEED_MAX_ITEMS})',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            pk__in=Follow.objects.values('follower_id')
+        ).order_by('pk')
+        if options['user']:
+            users = User.objects.filter(username=options['user'])
+
+        total = 0
+        for user in users.iterator():
+            size = rebuild_feed(user, max_items=options['max_items'])
+            total += 1
+            self.stdout.write(f'{user.username}: {size} записей')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересобрано лент: {total}')
+        )
@@ -0,0 +1,49 @@
+"""
+Команда для полного пересчета индекса похожих постов
+"""
+from django.core.management.base import BaseCommand
+
+from Blog.related import TOP_N, has_stale_posts, is_available, rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие посты (TF-IDF по тексту и близость по тегам)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-n',
+            type=int,
+            default=TOP_N,
+            help=f'Количество похожих постов для каждого поста (по умолчанию {TOP_N})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной пачке вставки',
+        )
+        parser.add_argument(
+            '--stale-only',
+            action='store_true',
+            help='Пересчитывать, только если посты изменились после прошлого пересчета',
+        )
+
+    def handle(self, *args, **options):
+        if not is_available():
+            self.stdout.write(
+                self.style.ERROR('Для пересчета нужны numpy и scipy: pip install numpy scipy')
+            )
+            return
+
+        if options['stale_only'] and not has_stale_posts():
+            self.stdout.write('Посты не изменились, пересчет не нужен')
+            return
+
+        self.stdout.write('Пересчет похожих постов...')
+        processed = rebuild_related_posts(
+            top_n=options['top_n'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано постов: {processed}')
+        )
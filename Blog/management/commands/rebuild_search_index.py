@@ -0,0 +1,32 @@
+"""
+Команда для перестроения полнотекстового индекса постов
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from Blog.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов (SQLite FTS5)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество постов в одной пачке вставки',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(
+                self.style.WARNING('Полнотекстовый индекс FTS5 доступен только для SQLite')
+            )
+            return
+
+        self.stdout.write('Перестроение поискового индекса...')
+        indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано постов: {indexed}')
+        )
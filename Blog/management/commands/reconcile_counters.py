@@ -0,0 +1,19 @@
+"""
+Команда для сверки денормализованных счетчиков лайков и подписок
+"""
+from django.core.management.base import BaseCommand
+
+from Blog.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики лайков и подписок по фактическим данным'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Сверка счетчиков...')
+        fixed = reconcile_counters()
+        for name, count in fixed.items():
+            self.stdout.write(f'{name}: исправлено {count}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Готово, исправлено строк: {sum(fixed.values())}')
+        )
@@ -0,0 +1,50 @@
+"""
+Создает полнотекстовый индекс постов (SQLite FTS5) и заполняет его
+"""
+from html import unescape
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+FTS_TABLE = 'blog_post_fts'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    Post = apps.get_model('Blog', 'Post')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, tags, body, "
+            "tokenize = 'porter unicode61 remove_diacritics 2'"
+            ")"
+        )
+        rows = [
+            (post.pk, post.title, post.tags or '', ' '.join(unescape(strip_tags(post.content or '')).split()))
+            for post in Post.objects.filter(status='published').only('id', 'title', 'tags', 'content').iterator()
+        ]
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, tags, body) VALUES (%s, %s, %s, %s)",
+            rows
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0007_add_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
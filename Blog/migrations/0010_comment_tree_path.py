@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+PATH_MAX_LENGTH = 255
+
+
+def fill_comment_paths(apps, schema_editor):
+    """Заполняет путь и глубину существующих комментариев (по уровням дерева)"""
+    Comment = apps.get_model('Blog', 'Comment')
+
+    paths = {}
+    level = list(Comment.objects.filter(parent__isnull=True).only('id', 'parent_id', 'path', 'depth'))
+    depth = 0
+    while level:
+        for comment in level:
+            parent_path = paths.get(comment.parent_id, ('', -1))
+            path = parent_path[0] + f'{comment.pk:010d}/'
+            if len(path) > PATH_MAX_LENGTH:
+                path, comment.depth = parent_path[0], parent_path[1]
+            else:
+                comment.depth = depth
+            comment.path = path
+            paths[comment.pk] = (comment.path, comment.depth)
+        Comment.objects.bulk_update(level, ['path', 'depth'], batch_size=500)
+        level = list(
+            Comment.objects.filter(parent_id__in=[comment.pk for comment in level])
+            .only('id', 'parent_id', 'path', 'depth')
+        )
+        depth += 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0009_related_post'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Глубина'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Путь в дереве'),
+        ),
+        migrations.RunPython(fill_comment_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='Blog_commen_post_id_19a02a_idx'),
+        ),
+    ]
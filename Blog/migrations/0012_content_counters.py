@@ -0,0 +1,50 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:43
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, group_field):
+    counts = (
+        queryset.filter(**{group_field: OuterRef('pk')})
+        .order_by().values(group_field).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики постов категорий и тегов"""
+    Category = apps.get_model('Blog', 'Category')
+    Post = apps.get_model('Blog', 'Post')
+    PostTags = Post.tag_objects.through
+    Tag = apps.get_model('Blog', 'Tag')
+
+    Category.objects.update(posts_count=_count(Post.objects.filter(status='published'), 'category'))
+    Tag.objects.update(posts_count=_count(PostTags.objects.filter(post__status='published'), 'tag'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0011_feed_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='archive_files_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество файлов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
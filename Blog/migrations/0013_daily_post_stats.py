@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0012_content_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPostStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('likes', models.PositiveIntegerField(default=0, verbose_name='Лайки')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='Blog.post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Статистика поста за день',
+                'verbose_name_plural': 'Статистика постов по дням',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='Blog_dailyp_date_15272b_idx')],
+                'unique_together': {('post', 'date')},
+            },
+        ),
+    ]
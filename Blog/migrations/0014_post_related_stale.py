@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0013_daily_post_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='related_stale',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Похожие посты устарели'),
+        ),
+    ]
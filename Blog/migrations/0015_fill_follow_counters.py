@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-17 20:05
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, group_field):
+    counts = (
+        queryset.filter(**{group_field: OuterRef('user')})
+        .order_by().values(group_field).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def fill_follow_counters(apps, schema_editor):
+    """Заполняет счетчики подписчиков и подписок профилей по строкам Follow"""
+    Follow = apps.get_model('Blog', 'Follow')
+    UserProfile = apps.get_model('Blog', 'UserProfile')
+
+    UserProfile.objects.update(
+        followers_count=_count(Follow.objects.all(), 'following_user'),
+        following_count=_count(Follow.objects.all(), 'follower'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0014_post_related_stale'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_follow_counters, migrations.RunPython.noop),
+    ]
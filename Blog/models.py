@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils.text import slugify
@@ -16,6 +17,7 @@ class Category(models.Model):
     icon = models.CharField('Иконка', max_length=50, blank=True, help_text='CSS класс Font Awesome')
     image = models.ImageField('Картинка', upload_to='categories/', blank=True, null=True, help_text='Изображение для категории (рекомендуется 400x300px)')
     is_active = models.BooleanField('Активна', default=True)
+    posts_count = models.PositiveIntegerField('Количество постов', default=0, editable=False)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     
     class Meta:
@@ -34,58 +36,10 @@ class Category(models.Model):
     def get_absolute_url(self):
         return reverse('Blog:category_detail', kwargs={'slug': self.slug})
     
-    @property
-    def posts_count(self):
-        return self.posts.filter(status='published').count()
-    
     def create_slug(self, name):
-        """Создает slug с транслитерацией русского текста"""
-        import re
-        import uuid
-        
-        # Расширенный словарь для транслитерации (поддержка заглавных и строчных)
-        translit_dict = {
-            # Строчные буквы
-            'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-            'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-            'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-            'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-            'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-            # Заглавные буквы
-            'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ё': 'YO',
-            'Ж': 'ZH', 'З': 'Z', 'И': 'I', 'Й': 'Y', 'К': 'K', 'Л': 'L', 'М': 'M',
-            'Н': 'N', 'О': 'O', 'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U',
-            'Ф': 'F', 'Х': 'H', 'Ц': 'TS', 'Ч': 'CH', 'Ш': 'SH', 'Щ': 'SCH',
-            'Ъ': '', 'Ы': 'Y', 'Ь': '', 'Э': 'E', 'Ю': 'YU', 'Я': 'YA',
-        }
-        
-        # Транслитерируем каждый символ
-        result = ''
-        for char in name:
-            if char in translit_dict:
-                result += translit_dict[char]
-            else:
-                result += char
-        
-        # Очищаем и форматируем slug
-        slug = result.lower()  # Приводим к нижнему регистру
-        slug = re.sub(r'[^\w\s-]', '', slug)  # Убираем специальные символы
-        slug = re.sub(r'[-\s]+', '-', slug)  # Заменяем пробелы и множественные дефисы на один дефис
-        slug = slug.strip('-')  # Убираем дефисы в начале и конце
-        
-        # Если slug пустой, создаем случайный
-        if not slug:
-            slug = f'category-{uuid.uuid4().hex[:8]}'
-        
-        # Проверяем уникальность
-        from Blog.models import Category
-        counter = 1
-        original_slug = slug
-        while Category.objects.filter(slug=slug).exclude(id=self.id if self.id else None).exists():
-            slug = f'{original_slug}-{counter}'
-            counter += 1
-        
-        return slug
+        """Создает уникальный slug с транслитерацией русского текста"""
+        from Blog.utils import create_unique_slug
+        return create_unique_slug(name, Category, instance=self, fallback_prefix='category')
 
 
 class UserProfile(models.Model):
@@ -122,6 +76,8 @@ class Tag(models.Model):
     color = models.CharField('Цвет', max_length=7, default='#6c757d', help_text='HEX цвет для отображения')
     icon = models.CharField('Иконка', max_length=50, blank=True, help_text='CSS класс Font Awesome')
     is_active = models.BooleanField('Активен', default=True)
+    posts_count = models.PositiveIntegerField('Количество постов', default=0, editable=False)
+    archive_files_count = models.PositiveIntegerField('Количество файлов', default=0, editable=False)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     
     class Meta:
@@ -140,63 +96,15 @@ class Tag(models.Model):
     def get_absolute_url(self):
         return reverse('Blog:tag_detail', kwargs={'slug': self.slug})
     
-    @property
-    def posts_count(self):
-        return self.posts.filter(status='published').count()
-    
-    @property
-    def archive_files_count(self):
-        try:
-            from Archive.models import ArchiveFile
-            return ArchiveFile.objects.filter(tag_objects=self, is_public=True).count()
-        except ImportError:
-            return 0
-    
     @property
     def total_content_count(self):
         """Общее количество контента (посты + файлы)"""
         return self.posts_count + self.archive_files_count
     
     def create_slug(self, name):
-        """Создает slug с транслитерацией русского текста"""
-        import re
-        import uuid
-        
-        # Расширенный словарь для транслитерации
-        translit_dict = {
-            'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-            'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-            'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-            'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-            'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-        }
-        
-        # Транслитерируем
-        result = ''
-        for char in name.lower():
-            if char in translit_dict:
-                result += translit_dict[char]
-            else:
-                result += char
-        
-        # Очищаем и форматируем slug
-        slug = result.lower()
-        slug = re.sub(r'[^\w\s-]', '', slug)
-        slug = re.sub(r'[-\s]+', '-', slug)
-        slug = slug.strip('-')
-        
-        # Если slug пустой, создаем случайный
-        if not slug:
-            slug = f'tag-{uuid.uuid4().hex[:8]}'
-        
-        # Проверяем уникальность
-        counter = 1
-        original_slug = slug
-        while Tag.objects.filter(slug=slug).exclude(id=self.id if self.id else None).exists():
-            slug = f'{original_slug}-{counter}'
-            counter += 1
-        
-        return slug
+        """Создает уникальный slug с транслитерацией русского текста"""
+        from Blog.utils import create_unique_slug
+        return create_unique_slug(name, Tag, instance=self, fallback_prefix='tag')
 
 
 class Post(models.Model):
@@ -226,6 +134,8 @@ class Post(models.Model):
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата обновления', auto_now=True)
     published_at = models.DateTimeField('Дата публикации', null=True, blank=True)
+    # Пост изменился после полного пересчета похожих постов (см. Blog.related)
+    related_stale = models.BooleanField('Похожие посты устарели', default=False, editable=False)
     
     class Meta:
         verbose_name = 'Пост'
@@ -240,6 +150,18 @@ class Post(models.Model):
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженные теги и статус, чтобы не пересчитывать неизмененные данные
+        if 'tags' in field_names:
+            instance._loaded_tags = values[field_names.index('tags')]
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        if 'category_id' in field_names:
+            instance._loaded_category_id = values[field_names.index('category_id')]
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = self.create_slug(self.title)
@@ -251,14 +173,73 @@ class Post(models.Model):
             clean_content = re.sub('<.*?>', '', self.content)
             self.excerpt = clean_content[:300] + '...' if len(clean_content) > 300 else clean_content
         
-        # Синхронизируем теги
+        tags_changed = bool(self.tags) and self.tags != getattr(self, '_loaded_tags', None)
+        status_changed = self.status != getattr(self, '_loaded_status', None)
+        
+        # Синхронизируем теги (только если строка тегов изменилась)
         super().save(*args, **kwargs)
-        if self.tags:
+        if tags_changed:
             self.sync_tags_from_string()
+        
+        # Счетчики постов категорий и тегов
+        from .counters import post_counters_changed
+        post_counters_changed(
+            self, getattr(self, '_loaded_status', None), getattr(self, '_loaded_category_id', None)
+        )
+        self._loaded_category_id = self.category_id
+        
+        # Рассылаем пост в ленты подписчиков (или убираем из них)
+        if status_changed and 'published' in (self.status, getattr(self, '_loaded_status', None)):
+            from . import feed
+            if self.status == 'published':
+                feed.publish_post(self)
+            else:
+                feed.retract_post(self.pk)
+        
+        # Обновляем индекс похожих постов
+        if tags_changed or status_changed:
+            from .related import update_related_posts
+            update_related_posts(self)
+            self._loaded_status = self.status
     
     def get_absolute_url(self):
         return reverse('Blog:post_detail', kwargs={'slug': self.slug})
     
+    @classmethod
+    def bulk_status_changed(cls, pks):
+        """
+        Обновляет после массовой смены статуса (QuerySet.update) то же, что
+        save при смене статуса: счетчики, кэш, поисковый индекс, ленты
+        подписчиков и похожие посты
+        """
+        from Home.cache_utils import bump_generation
+        from . import feed, search
+        from .counters import recount_post_counters
+        from .related import update_related_posts
+        
+        pks = list(pks)
+        # update() не заполняет дату публикации
+        cls.objects.filter(
+            pk__in=pks, status='published', published_at__isnull=True
+        ).update(published_at=timezone.now())
+        recount_post_counters(pks)
+        
+        namespaces = {'posts'}
+        for post in cls.objects.filter(pk__in=pks).select_related('author', 'category'):
+            namespaces.update({f'post:{post.slug}', f'author:{post.author.username}'})
+            if post.category:
+                namespaces.add(f'category:{post.category.slug}')
+            search.index_post(post)
+            if post.status == 'published':
+                feed.publish_post(post)
+            else:
+                feed.retract_post(post.pk)
+            update_related_posts(post)
+        namespaces.update(
+            f'tag:{slug}' for slug in Tag.objects.filter(posts__pk__in=pks).values_list('slug', flat=True).distinct()
+        )
+        bump_generation(*namespaces)
+    
     def get_tags_list(self):
         """Возвращает список тегов как строки"""
         return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
@@ -268,21 +249,13 @@ class Post(models.Model):
         return self.tag_objects.filter(is_active=True)
     
     def sync_tags_from_string(self):
-        """Синхронизирует теги из строки с объектами Tag"""
+        """Синхронизирует теги из строки с объектами Tag (пакетно, см. Blog.tags)"""
         if not self.tags:
             return
         
-        tag_names = self.get_tags_list()
-        tag_objects = []
-        
-        for tag_name in tag_names:
-            tag, created = Tag.objects.get_or_create(
-                name=tag_name.strip(),
-                defaults={'slug': Tag().create_slug(tag_name.strip())}
-            )
-            tag_objects.append(tag)
-        
-        self.tag_objects.set(tag_objects)
+        from .tags import sync_object_tags
+        sync_object_tags(self, self.tags)
+        self._loaded_tags = self.tags
     
     def sync_tags_to_string(self):
         """Синхронизирует объекты тегов в строку"""
@@ -290,51 +263,47 @@ class Post(models.Model):
         self.tags = ', '.join(tag_names)
     
     def create_slug(self, title):
-        """Создает slug с транслитерацией русского текста"""
-        import re
-        import uuid
-        
-        # Словарь для транслитерации
-        translit_dict = {
-            'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-            'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-            'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-            'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-            'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-            'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ё': 'Yo',
-            'Ж': 'Zh', 'З': 'Z', 'И': 'I', 'Й': 'Y', 'К': 'K', 'Л': 'L', 'М': 'M',
-            'Н': 'N', 'О': 'O', 'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U',
-            'Ф': 'F', 'Х': 'H', 'Ц': 'Ts', 'Ч': 'Ch', 'Ш': 'Sh', 'Щ': 'Sch',
-            'Ъ': '', 'Ы': 'Y', 'Ь': '', 'Э': 'E', 'Ю': 'Yu', 'Я': 'Ya'
-        }
-        
-        # Транслитерируем
-        result = ''
-        for char in title:
-            if char in translit_dict:
-                result += translit_dict[char]
-            else:
-                result += char
-        
-        # Приводим к нижнему регистру и очищаем
-        slug = result.lower()
-        slug = re.sub(r'[^\w\s-]', '', slug)
-        slug = re.sub(r'[-\s]+', '-', slug)
-        slug = slug.strip('-')
-        
-        # Если slug пустой, создаем случайный
-        if not slug:
-            slug = f'post-{uuid.uuid4().hex[:8]}'
-        
-        # Проверяем уникальность
-        from Blog.models import Post
-        counter = 1
-        original_slug = slug
-        while Post.objects.filter(slug=slug).exclude(id=self.id if self.id else None).exists():
-            slug = f'{original_slug}-{counter}'
-            counter += 1
-        
-        return slug
+        """Создает уникальный slug с транслитерацией русского текста"""
+        from Blog.utils import create_unique_slug
+        return create_unique_slug(title, Post, instance=self, fallback_prefix='post')
+
+
+class DailyPostStats(models.Model):
+    """Дневная статистика поста (см. Home.rollups)"""
+    date = models.DateField('Дата')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='daily_stats', verbose_name='Пост')
+    views = models.PositiveIntegerField('Просмотры', default=0)
+    likes = models.PositiveIntegerField('Лайки', default=0)
+    
+    class Meta:
+        verbose_name = 'Статистика поста за день'
+        verbose_name_plural = 'Статистика постов по дням'
+        unique_together = [['post', 'date']]
+        indexes = [models.Index(fields=['date'])]
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f'{self.post_id} за {self.date}'
+
+
+class RelatedPost(models.Model):
+    """Предрассчитанные похожие посты (индекс строится в Blog.related)"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_links', verbose_name='Пост')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+', verbose_name='Похожий пост')
+    score = models.FloatField('Сходство', default=0)
+    rank = models.PositiveSmallIntegerField('Позиция', default=0)
+    
+    class Meta:
+        verbose_name = 'Похожий пост'
+        verbose_name_plural = 'Похожие посты'
+        ordering = ['post', 'rank']
+        unique_together = [['post', 'related']]
+        indexes = [
+            models.Index(fields=['post', 'rank']),
+        ]
+    
+    def __str__(self):
+        return f'{self.post} → {self.related}'
 
 
 class Comment(models.Model):
@@ -345,6 +314,9 @@ class Comment(models.Model):
     content = models.TextField('Содержание')
     likes_count = models.PositiveIntegerField('Количество лайков', default=0)
     is_approved = models.BooleanField('Одобрен', default=True)
+    # Материализованный путь: id предков и самого комментария ('0000000012/0000000034/')
+    path = models.CharField('Путь в дереве', max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField('Глубина', default=0, editable=False)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата обновления', auto_now=True)
     
@@ -355,11 +327,47 @@ class Comment(models.Model):
         indexes = [
             models.Index(fields=['post', 'is_approved']),
             models.Index(fields=['author', 'created_at']),
+            models.Index(fields=['post', 'path']),
         ]
     
     def __str__(self):
         return f'Комментарий от {self.author.username} к "{self.post.title}"'
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.update_tree_path()
+    
+    def build_tree_path(self):
+        """Возвращает (путь, глубина) по родителю"""
+        step = f'{self.pk:010d}/'
+        if not self.parent_id:
+            return step, 0
+        parent_path, parent_depth = Comment.objects.filter(
+            pk=self.parent_id
+        ).values_list('path', 'depth').get()
+        path = parent_path + step
+        if len(path) > self._meta.get_field('path').max_length:
+            # Слишком глубокая ветка: комментарий остается на уровне родителя
+            return parent_path, parent_depth
+        return path, parent_depth + 1
+    
+    def update_tree_path(self):
+        """Сохраняет путь в дереве; при смене родителя переносит и всю ветку"""
+        path, depth = self.build_tree_path()
+        if path == self.path and depth == self.depth:
+            return
+        old_path, old_depth = self.path, self.depth
+        Comment.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        # Ветка переносится, только если у комментария был собственный шаг пути
+        if old_path.endswith(f'{self.pk:010d}/') and old_path != path:
+            Comment.objects.filter(
+                post_id=self.post_id, path__startswith=old_path
+            ).exclude(pk=self.pk).update(
+                path=Concat(models.Value(path), Substr('path', len(old_path) + 1)),
+                depth=models.F('depth') + (depth - old_depth)
+            )
+        self.path, self.depth = path, depth
+    
     def get_replies(self):
         return self.replies.filter(is_approved=True).order_by('created_at')
 
@@ -424,6 +432,24 @@ class Follow(models.Model):
             return f'{self.follower.username} подписан на категорию {self.following_category.name}'
 
 
+class FeedItem(models.Model):
+    """Запись персональной ленты: пост от автора или из категории, на которые подписан пользователь"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_items', verbose_name='Читатель')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+', verbose_name='Пост')
+    published_at = models.DateTimeField('Дата публикации')
+    
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        unique_together = [['user', 'post']]
+        indexes = [
+            models.Index(fields=['user', '-published_at', '-post']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.username}: {self.post}'
+
+
 
 
 
@@ -0,0 +1,278 @@
+"""
+Индекс похожих постов
+
+Для каждого опубликованного поста в таблице Blog_relatedpost хранится
+top-N соседей, поэтому детальная страница получает похожие посты одним
+запросом по индексу (post, rank).
+
+Полный пересчет (команда rebuild_related_posts) строит TF-IDF по тексту
+поста (заголовок, теги, очищенный от HTML контент) и косинусную близость
+по тегам на разреженных матрицах NumPy/SciPy. При сохранении поста
+оценки других постов не меняются: оценку по одним тегам нельзя сравнивать
+с комбинированной. Пост только помечается (Post.related_stale) для
+следующего пересчета; новому посту до него подбираются соседи по тегам.
+"""
+import math
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .search import CYRILLIC_RE, WORD_RE, html_to_text, stem_russian
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+
+# Количество соседей, которое хранится для каждого поста
+TOP_N = 6
+
+# Вклад текстовой и теговой близости в итоговую оценку
+TEXT_WEIGHT = 0.7
+TAG_WEIGHT = 0.3
+
+# Соседи с меньшей оценкой не сохраняются
+MIN_SCORE = 0.01
+
+# Заголовок повторяется, чтобы его слова весили больше слов из текста
+TITLE_BOOST = 3
+
+# Слова, встречающиеся более чем в такой доле постов, не учитываются
+MAX_DOCUMENT_RATIO = 0.5
+MIN_POSTS_FOR_DF_CUTOFF = 20
+
+# Количество строк матрицы близости, которое обрабатывается за раз
+CHUNK_SIZE = 256
+
+MIN_TOKEN_LENGTH = 3
+
+
+def is_available():
+    """Проверяет, что для полного пересчета установлены NumPy и SciPy"""
+    return np is not None and sparse is not None
+
+
+def tokenize(text):
+    """Разбивает текст на слова; русские слова приводятся к основе"""
+    tokens = []
+    for word in WORD_RE.findall(text.lower()):
+        if len(word) < MIN_TOKEN_LENGTH or word.isdigit():
+            continue
+        tokens.append(stem_russian(word) if CYRILLIC_RE.search(word) else word)
+    return tokens
+
+
+def _document_tokens(post):
+    text = ' '.join([post.title] * TITLE_BOOST + [post.tags or '', html_to_text(post.content)])
+    return tokenize(text)
+
+
+def _l2_normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return (sparse.diags(1.0 / norms) @ matrix).tocsr()
+
+
+def _tfidf_matrix(token_lists):
+    """Матрица TF-IDF (посты x слова) с нормированными строками"""
+    vocabulary = {}
+    rows, cols, values = [], [], []
+    for row, tokens in enumerate(token_lists):
+        for token, count in Counter(tokens).items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(token, len(vocabulary)))
+            values.append(count)
+
+    shape = (len(token_lists), max(len(vocabulary), 1))
+    matrix = sparse.csr_matrix(
+        (np.asarray(values, dtype=np.float32), (rows, cols)), shape=shape
+    )
+    total = shape[0]
+    document_frequency = np.bincount(matrix.indices, minlength=shape[1])
+    idf = np.log((1 + total) / (1 + document_frequency)) + 1
+    if total >= MIN_POSTS_FOR_DF_CUTOFF:
+        idf[document_frequency > MAX_DOCUMENT_RATIO * total] = 0
+
+    # Сублинейный tf: 10 повторов слова не в 10 раз важнее одного
+    matrix.data = np.log1p(matrix.data)
+    return _l2_normalize(matrix @ sparse.diags(idf.astype(np.float32)))
+
+
+def _tag_matrix(post_ids):
+    """Бинарная матрица (посты x теги) с нормированными строками"""
+    from .models import Post
+
+    positions = {post_id: row for row, post_id in enumerate(post_ids)}
+    links = Post.tag_objects.through.objects.filter(
+        post_id__in=positions
+    ).values_list('post_id', 'tag_id')
+
+    columns = {}
+    rows, cols = [], []
+    for post_id, tag_id in links.iterator():
+        rows.append(positions[post_id])
+        cols.append(columns.setdefault(tag_id, len(columns)))
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(post_ids), max(len(columns), 1))
+    )
+    return _l2_normalize(matrix)
+
+
+def _top_neighbours(text_matrix, tag_matrix, top_n):
+    """
+    Для каждой строки возвращает [(позиция соседа, оценка), ...].
+
+    Матрица близости считается блоками по CHUNK_SIZE строк, поэтому
+    в памяти никогда нет полной матрицы N x N.
+    """
+    total = text_matrix.shape[0]
+    k = min(top_n, total - 1)
+    if k <= 0:
+        return
+    text_t = text_matrix.T.tocsr()
+    tag_t = tag_matrix.T.tocsr()
+
+    for start in range(0, total, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, total)
+        scores = (
+            TEXT_WEIGHT * (text_matrix[start:stop] @ text_t).toarray()
+            + TAG_WEIGHT * (tag_matrix[start:stop] @ tag_t).toarray()
+        )
+        # Пост не может быть похож сам на себя
+        scores[np.arange(stop - start), np.arange(start, stop)] = 0
+
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+        for offset in range(stop - start):
+            yield start + offset, [
+                (int(column), float(score))
+                for column, score in zip(candidates[offset], candidate_scores[offset])
+                if score >= MIN_SCORE
+            ]
+
+
+def rebuild_related_posts(top_n=TOP_N, batch_size=1000):
+    """
+    Полностью пересчитывает индекс похожих постов.
+
+    Возвращает количество обработанных постов.
+    """
+    from .models import Post, RelatedPost
+
+    if not is_available():
+        raise RuntimeError('Для пересчета похожих постов нужны numpy и scipy')
+
+    # Флаг снимается только с постов, помеченных до чтения текста: посты,
+    # измененные во время пересчета, остаются помеченными
+    stale_ids = list(Post.objects.filter(related_stale=True).values_list('pk', flat=True))
+    posts = list(
+        Post.objects.filter(status='published').only('id', 'title', 'tags', 'content').order_by('id')
+    )
+    post_ids = [post.id for post in posts]
+    text_matrix = _tfidf_matrix([_document_tokens(post) for post in posts])
+    tag_matrix = _tag_matrix(post_ids)
+
+    links = [
+        RelatedPost(post_id=post_ids[row], related_id=post_ids[column], score=score, rank=rank)
+        for row, neighbours in _top_neighbours(text_matrix, tag_matrix, top_n)
+        for rank, (column, score) in enumerate(neighbours)
+    ]
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(links, batch_size=batch_size)
+        Post.objects.filter(pk__in=stale_ids).update(related_stale=False)
+    return len(posts)
+
+
+def has_stale_posts():
+    """Есть ли посты, измененные после последнего полного пересчета"""
+    from .models import Post
+    return Post.objects.filter(related_stale=True).exists()
+
+
+def _tag_scores(post_id, top_n):
+    """Косинусная близость по тегам: {id поста: оценка} для top_n лучших"""
+    from .models import Post
+
+    through = Post.tag_objects.through
+    tag_ids = list(through.objects.filter(post_id=post_id).values_list('tag_id', flat=True))
+    if not tag_ids:
+        return {}
+
+    shared = dict(
+        through.objects.filter(tag_id__in=tag_ids, post__status='published')
+        .exclude(post_id=post_id)
+        .values('post_id')
+        .annotate(shared=Count('tag_id'))
+        .order_by('-shared')
+        .values_list('post_id', 'shared')[:top_n * 5]
+    )
+    if not shared:
+        return {}
+    totals = dict(
+        through.objects.filter(post_id__in=shared)
+        .values('post_id')
+        .annotate(total=Count('tag_id'))
+        .order_by()
+        .values_list('post_id', 'total')
+    )
+    scores = {
+        other_id: TAG_WEIGHT * count / math.sqrt(len(tag_ids) * totals[other_id])
+        for other_id, count in shared.items()
+    }
+    best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_n]
+    return {other_id: score for other_id, score in best if score >= MIN_SCORE}
+
+
+def remove_post(post_id):
+    """Удаляет пост из индекса (как источник и как соседа); возвращает число удаленных связей"""
+    from .models import RelatedPost
+    deleted, _ = RelatedPost.objects.filter(Q(post_id=post_id) | Q(related_id=post_id)).delete()
+    return deleted
+
+
+def update_related_posts(post, top_n=TOP_N):
+    """
+    Обновляет индекс после сохранения поста до следующего полного пересчета.
+
+    Снятый с публикации пост удаляется из индекса. Сохраненные оценки не
+    меняются - они в шкале полного пересчета (текст и теги), а здесь
+    доступна только близость по тегам. Посту без своих соседей (новому или
+    снова опубликованному) подбираются соседи по тегам, в списки других
+    постов он попадет при полном пересчете.
+    """
+    from .models import Post, RelatedPost
+
+    if post.status != 'published':
+        # Черновики в индекс не входят - пересчет нужен, только если пост в нем был
+        if remove_post(post.pk):
+            Post.objects.filter(pk=post.pk).update(related_stale=True)
+        return
+    Post.objects.filter(pk=post.pk).update(related_stale=True)
+    if RelatedPost.objects.filter(post_id=post.pk).exists():
+        return
+
+    RelatedPost.objects.bulk_create([
+        RelatedPost(post_id=post.pk, related_id=other_id, score=score, rank=rank)
+        for rank, (other_id, score) in enumerate(_tag_scores(post.pk, top_n).items())
+    ], ignore_conflicts=True)
+
+
+def get_related_posts(post, limit=4):
+    """Похожие опубликованные посты из индекса (один запрос)"""
+    from .models import RelatedPost
+
+    links = RelatedPost.objects.filter(
+        post=post, related__status='published'
+    ).select_related('related').order_by('rank')[:limit]
+    return [link.related for link in links]
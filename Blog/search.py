@@ -0,0 +1,179 @@
+"""
+Полнотекстовый поиск по постам на SQLite FTS5
+
+Индекс хранится в виртуальной таблице blog_post_fts (rowid = id поста)
+и синхронизируется с Blog.Post через сигналы post_save/post_delete.
+В индекс попадает очищенный от HTML текст, поэтому поиск не сканирует
+колонку content и не находит совпадений в разметке CKEditor.
+
+Токенизатор unicode61 приводит к нижнему регистру кириллицу и латиницу
+и убирает диакритику (ё -> е), porter стеммит английские слова.
+Для русских слов запрос отсекает типичные окончания и ищет по префиксу.
+"""
+import re
+from html import unescape
+
+from django.db import DatabaseError, connection
+from django.utils.html import strip_tags
+
+
+FTS_TABLE = 'blog_post_fts'
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, tags, body, "
+    "tokenize = 'porter unicode61 remove_diacritics 2'"
+    ")"
+)
+DROP_TABLE_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+INSERT_SQL = f"INSERT INTO {FTS_TABLE} (rowid, title, tags, body) VALUES (%s, %s, %s, %s)"
+
+# Веса колонок для bm25: совпадение в заголовке важнее, чем в тексте
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Максимальное количество результатов поиска
+MAX_RESULTS = 500
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+CYRILLIC_RE = re.compile(r'[а-яё]', re.IGNORECASE)
+
+# Русские окончания, отсортированные по убыванию длины
+RUSSIAN_ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'его', 'ого', 'ему', 'ому', 'ыми', 'ими', 'ией',
+    'иях', 'ях', 'ах', 'ия', 'ие', 'ий', 'ой', 'ей', 'ый', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ом', 'ем', 'ам', 'ям', 'ов', 'ев', 'ью', 'ться',
+    'ать', 'ять', 'ить', 'еть', 'ешь', 'ет', 'ют', 'ут', 'ит', 'ат', 'ят',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+
+MIN_STEM_LENGTH = 3
+
+# Таблица индекса создается миграцией; после первой успешной проверки
+# повторно sqlite_master не опрашиваем
+_table_ready = False
+
+
+def html_to_text(html):
+    """Убирает HTML-разметку и сущности, схлопывает пробелы"""
+    if not html:
+        return ''
+    text = unescape(strip_tags(html))
+    return ' '.join(text.split())
+
+
+def stem_russian(word):
+    """Отсекает типичное русское окончание, оставляя основу для поиска по префиксу"""
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def build_match_query(search_query):
+    """
+    Преобразует пользовательский запрос в выражение MATCH для FTS5.
+
+    Каждое слово экранируется кавычками (операторы FTS5 из запроса
+    не интерпретируются), русские слова ищутся по основе с префиксом.
+    Все слова должны присутствовать в документе (неявный AND).
+    """
+    terms = []
+    for word in WORD_RE.findall(search_query.lower()):
+        if CYRILLIC_RE.search(word):
+            terms.append(f'"{stem_russian(word)}"*')
+        else:
+            terms.append(f'"{word}"')
+    return ' '.join(terms)
+
+
+def is_available():
+    """Проверяет, что БД - SQLite и таблица индекса создана"""
+    global _table_ready
+    if connection.vendor != 'sqlite':
+        return False
+    if _table_ready:
+        return True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [FTS_TABLE]
+            )
+            _table_ready = cursor.fetchone() is not None
+    except DatabaseError:
+        return False
+    return _table_ready
+
+
+def _document(post):
+    return [post.pk, post.title, post.tags or '', html_to_text(post.content)]
+
+
+def index_post(post):
+    """Добавляет или обновляет пост в индексе (только опубликованные)"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+        if post.status == 'published':
+            cursor.execute(INSERT_SQL, _document(post))
+
+
+def remove_post(post_id):
+    """Удаляет пост из индекса"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+
+def search_post_ids(search_query, limit=MAX_RESULTS):
+    """
+    Возвращает id постов, упорядоченные по релевантности (bm25).
+
+    Возвращает None, если полнотекстовый индекс недоступен,
+    чтобы вызывающий код мог использовать обычный поиск.
+    """
+    if not is_available():
+        return None
+    match_query = build_match_query(search_query)
+    if not match_query:
+        return []
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+            [match_query, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild_index(batch_size=500):
+    """Полностью перестраивает индекс по опубликованным постам"""
+    global _table_ready
+    from .models import Post
+
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+        posts = Post.objects.filter(status='published').only(
+            'id', 'title', 'tags', 'content', 'status'
+        ).iterator(chunk_size=batch_size)
+
+        batch = []
+        indexed = 0
+        for post in posts:
+            batch.append(_document(post))
+            if len(batch) >= batch_size:
+                cursor.executemany(INSERT_SQL, batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(INSERT_SQL, batch)
+            indexed += len(batch)
+
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    _table_ready = True
+    return indexed
@@ -1,35 +1,62 @@
 """
-Сигналы для автоматической инвалидации кэша
+Сигналы для автоматической инвалидации кэша, обновления поискового индекса
+и счетчиков контента, настройки соединений SQLite
 """
-from django.db.models.signals import post_save, post_delete
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import Post, Category, Tag, UserProfile
+from .models import Post, Category, Comment, Tag, UserProfile
+from Home.cache_utils import bump_generation
 from .cache_utils import invalidate_post_cache, invalidate_user_cache
+from . import counters, search
+from .tag_feed import SQLITE_LOWER_FUNCTION, unicode_lower
 
 
 @receiver(post_save, sender=Post)
 def invalidate_post_cache_on_save(sender, instance, **kwargs):
-    """Инвалидирует кэш при сохранении поста"""
+    """Инвалидирует кэш при сохранении поста (и прежней категории, если пост перенесен)"""
+    # post_save отправляется до того, как Post.save запомнит новую категорию
+    old_category_id = getattr(instance, '_loaded_category_id', None)
+    old_category_slugs = []
+    if old_category_id and old_category_id != instance.category_id:
+        old_category_slugs = Category.objects.filter(pk=old_category_id).values_list('slug', flat=True)
     invalidate_post_cache(
         post_slug=instance.slug,
-        category_slug=instance.category.slug if instance.category else None
+        category_slug=instance.category.slug if instance.category else None,
+        author_username=instance.author.username,
+        tag_slugs=instance.tag_objects.values_list('slug', flat=True),
+        category_slugs=old_category_slugs,
     )
-    
-    # Инвалидируем кэш тегов
-    for tag in instance.tag_objects.all():
-        invalidate_post_cache(tag_slug=tag.slug)
 
 
 @receiver(post_delete, sender=Post)
 def invalidate_post_cache_on_delete(sender, instance, **kwargs):
     """Инвалидирует кэш при удалении поста"""
     invalidate_post_cache(
-        category_slug=instance.category.slug if instance.category else None
+        post_slug=instance.slug,
+        category_slug=instance.category.slug if instance.category else None,
+        author_username=instance.author.username,
+        tag_slugs=instance.tag_objects.values_list('slug', flat=True)
     )
-    
-    # Инвалидируем кэш тегов
-    for tag in instance.tag_objects.all():
-        invalidate_post_cache(tag_slug=tag.slug)
+
+
+# Поля поста, из которых строится документ индекса (и его наличие в индексе)
+SEARCH_INDEX_FIELDS = {'title', 'content', 'tags', 'status'}
+
+
+@receiver(post_save, sender=Post)
+def update_search_index_on_save(sender, instance, update_fields=None, **kwargs):
+    """Обновляет полнотекстовый индекс (неопубликованные посты удаляются из него)"""
+    # Сохранение счетчиков (update_fields=['comments_count'] и т.п.) индекс не меняет
+    if update_fields is not None and not SEARCH_INDEX_FIELDS & set(update_fields):
+        return
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def update_search_index_on_delete(sender, instance, **kwargs):
+    """Удаляет пост из полнотекстового индекса"""
+    search.remove_post(instance.pk)
 
 
 @receiver(post_save, sender=Category)
@@ -48,3 +75,36 @@ def invalidate_tag_cache_on_save(sender, instance, **kwargs):
 def invalidate_user_cache_on_save(sender, instance, **kwargs):
     """Инвалидирует кэш при изменении профиля пользователя"""
     invalidate_user_cache(instance.user.username)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_post_tags_on_delete(sender, instance, **kwargs):
+    """Запоминает теги удаляемого поста: после удаления связи M2M уже не прочитать"""
+    instance._counter_tag_ids = list(
+        instance.tag_objects.through.objects.filter(post_id=instance.pk).values_list('tag_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def update_counters_on_delete(sender, instance, **kwargs):
+    """Пересчитывает счетчики категории и тегов удаленного опубликованного поста"""
+    if instance.status != 'published':
+        return
+    counters.recount_categories([instance.category_id])
+    counters.recount_tags(getattr(instance, '_counter_tag_ids', []))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_page_on_comment_change(sender, instance, **kwargs):
+    """Сбрасывает кэш страницы поста при добавлении, модерации или удалении комментария"""
+    slug = Post.objects.filter(pk=instance.post_id).values_list('slug', flat=True).first()
+    if slug:
+        bump_generation(f'post:{slug}')
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    """Регистрирует в SQLite функцию UnicodeLower (поиск в ленте тега, см. Blog.tag_feed)"""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(SQLITE_LOWER_FUNCTION, 1, unicode_lower, deterministic=True)
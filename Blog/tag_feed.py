@@ -0,0 +1,149 @@
+"""
+Объединенная лента контента тега: посты блога и файлы архива
+
+Посты и файлы объединяются в базе данных через UNION узких проекций
+(тип, id, дата), сортировка, поиск и LIMIT/OFFSET выполняются в SQL.
+Полные объекты загружаются только для элементов текущей страницы.
+"""
+from django.db.models import CharField, DateTimeField, F, Func, Q, Value
+from django.db.models.functions import Coalesce
+
+from .models import Post
+
+try:
+    from Archive.models import ArchiveFile
+except ImportError:
+    ArchiveFile = None
+
+
+def tag_posts_queryset(tag):
+    return Post.objects.filter(tag_objects=tag, status='published')
+
+
+def tag_files_queryset(tag):
+    if not ArchiveFile:
+        return None
+    return ArchiveFile.objects.filter(tag_objects=tag, is_public=True)
+
+
+# Имя функции SQLite, которую регистрирует Blog.signals.register_sqlite_functions
+SQLITE_LOWER_FUNCTION = 'UNICODE_LOWER'
+
+
+def unicode_lower(value):
+    return None if value is None else str(value).lower()
+
+
+class UnicodeLower(Func):
+    """
+    LOWER с учетом Unicode.
+
+    Встроенные LOWER и LIKE в SQLite меняют регистр только латиницы,
+    поэтому в SQLite используется отдельная функция на Python; встроенная
+    LOWER остальных запросов не меняется. В PostgreSQL LOWER учитывает Unicode.
+    """
+    function = 'LOWER'
+    output_field = CharField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function=SQLITE_LOWER_FUNCTION, **extra_context)
+
+
+def _search_filter(queryset, search_query, fields):
+    """Поиск подстроки без учета регистра (в том числе кириллицы) в любом из полей"""
+    annotations = {f'{field}_lower': UnicodeLower(field) for field in fields}
+    condition = Q()
+    for name in annotations:
+        condition |= Q(**{f'{name}__contains': search_query.lower()})
+    return queryset.annotate(**annotations).filter(condition)
+
+
+def build_tag_feed(tag, search_query=None):
+    """
+    Возвращает queryset строк {'kind', 'item_id', 'item_date'},
+    отсортированных по дате (новые сначала).
+    """
+    posts = tag_posts_queryset(tag)
+    if search_query:
+        posts = _search_filter(posts, search_query, ['title', 'excerpt'])
+    feed = posts.annotate(
+        kind=Value('post', output_field=CharField()),
+        item_id=F('id'),
+        item_date=Coalesce('published_at', 'created_at', output_field=DateTimeField()),
+    ).values('kind', 'item_id', 'item_date').order_by()
+
+    files = tag_files_queryset(tag)
+    if files is not None:
+        if search_query:
+            files = _search_filter(files, search_query, ['title', 'description'])
+        feed = feed.union(
+            files.annotate(
+                kind=Value('file', output_field=CharField()),
+                item_id=F('id'),
+                item_date=F('uploaded_at'),
+            ).values('kind', 'item_id', 'item_date').order_by(),
+            all=True
+        )
+
+    return feed.order_by('-item_date', 'kind', '-item_id')
+
+
+def _post_item(post):
+    return {
+        'type': 'post',
+        'object': post,
+        'title': post.title,
+        'date': post.published_at or post.created_at,
+        'author': post.author,
+        'category': post.category,
+        'views': post.views_count,
+        'likes': post.likes_count,
+        'comments': post.comments_count,
+        'url': post.get_absolute_url(),
+        'excerpt': post.excerpt,
+        'image': post.featured_image
+    }
+
+
+def _file_item(file):
+    return {
+        'type': 'file',
+        'object': file,
+        'title': file.title,
+        'date': file.uploaded_at,
+        'author': file.uploaded_by,
+        'category': file.category,
+        'views': file.views_count,
+        'likes': file.likes_count,
+        'downloads': file.downloads_count,
+        'url': file.get_absolute_url(),
+        'excerpt': file.description,
+        'file_type': file.file_type,
+        'file_size': file.file_size
+    }
+
+
+def hydrate_feed_rows(rows):
+    """
+    Превращает строки страницы в словари для шаблона tag_detail.html.
+
+    Выполняет не более двух запросов (посты и файлы) и сохраняет порядок строк.
+    """
+    rows = list(rows)
+    post_ids = [row['item_id'] for row in rows if row['kind'] == 'post']
+    file_ids = [row['item_id'] for row in rows if row['kind'] == 'file']
+
+    posts = {}
+    if post_ids:
+        posts = Post.objects.select_related('author', 'category').in_bulk(post_ids)
+    files = {}
+    if file_ids and ArchiveFile:
+        files = ArchiveFile.objects.select_related('uploaded_by', 'category').in_bulk(file_ids)
+
+    items = []
+    for row in rows:
+        if row['kind'] == 'post' and row['item_id'] in posts:
+            items.append(_post_item(posts[row['item_id']]))
+        elif row['kind'] == 'file' and row['item_id'] in files:
+            items.append(_file_item(files[row['item_id']]))
+    return items
@@ -0,0 +1,104 @@
+"""
+Пакетная синхронизация тегов из строки с объектами Tag
+
+Используется Post.save и ArchiveFile.save: вместо get_or_create на каждый
+тег выполняется один SELECT существующих тегов, один bulk_create для новых
+и разностное обновление связей M2M (вставка/удаление только изменившихся).
+Счетчики контента затронутых тегов пересчитываются в той же транзакции.
+"""
+from django.db import IntegrityError, transaction
+
+from Home.cache_utils import bump_generation
+from .counters import recount_tags
+from .utils import allocate_unique_slugs
+
+
+def parse_tag_names(tags_string):
+    """Разбирает строку тегов: убирает пробелы, пустые значения и повторы"""
+    names = []
+    for name in (tags_string or '').split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def allocate_tag_slugs(names):
+    """Подбирает уникальные slug для новых тегов одним запросом к БД"""
+    from .models import Tag
+    return allocate_unique_slugs({name: name for name in names}, Tag, fallback_prefix='tag')
+
+
+def resolve_tags(names):
+    """
+    Возвращает {имя: id тега}, создавая недостающие теги пакетом.
+
+    Параллельно созданные теги (конфликт по name/slug) не приводят к ошибке:
+    bulk_create их пропускает, а id дочитываются повторным запросом.
+    """
+    from .models import Tag
+
+    if not names:
+        return {}
+    resolved = dict(Tag.objects.filter(name__in=names).order_by().values_list('name', 'id'))
+    missing = [name for name in names if name not in resolved]
+    if missing:
+        slugs = allocate_tag_slugs(missing)
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=slugs[name]) for name in missing],
+            ignore_conflicts=True
+        )
+        resolved.update(Tag.objects.filter(name__in=missing).order_by().values_list('name', 'id'))
+        # Тег не создан из-за гонки за slug - создаем его по одному
+        for name in missing:
+            if name not in resolved:
+                try:
+                    with transaction.atomic():
+                        tag, _ = Tag.objects.get_or_create(
+                            name=name, defaults={'slug': allocate_tag_slugs([name])[name]}
+                        )
+                except IntegrityError:
+                    tag = Tag.objects.get(name=name)
+                resolved[name] = tag.id
+    return resolved
+
+
+def sync_object_tags(instance, tags_string):
+    """
+    Приводит M2M instance.tag_objects к списку тегов из строки.
+
+    Возвращает slug тегов, связь с которыми была добавлена или удалена;
+    их списки в кэше инвалидируются.
+    """
+    from .models import Tag
+
+    manager = instance.tag_objects
+    through = manager.through
+    source = f'{manager.source_field_name}_id'
+    target = f'{manager.target_field_name}_id'
+
+    with transaction.atomic():
+        wanted = set(resolve_tags(parse_tag_names(tags_string)).values())
+        current = set(
+            through.objects.filter(**{source: instance.pk}).values_list(target, flat=True)
+        )
+        added = wanted - current
+        removed = current - wanted
+
+        if added:
+            through.objects.bulk_create(
+                [through(**{source: instance.pk, target: tag_id}) for tag_id in added],
+                ignore_conflicts=True
+            )
+        if removed:
+            through.objects.filter(**{source: instance.pk, f'{target}__in': removed}).delete()
+        if added or removed:
+            recount_tags(added | removed)
+
+    changed_slugs = []
+    if added or removed:
+        changed_slugs = list(
+            Tag.objects.filter(id__in=added | removed).order_by().values_list('slug', flat=True)
+        )
+        bump_generation('tags', *(f'tag:{slug}' for slug in changed_slugs))
+    return changed_slugs
@@ -18,6 +18,9 @@ urlpatterns = [
     path('post/<slug:slug>/edit/', views.PostUpdateView.as_view(), name='post_edit'),
     path('post/<slug:slug>/delete/', views.PostDeleteView.as_view(), name='post_delete'),
     
+    # Персональная лента
+    path('feed/', views.FeedView.as_view(), name='feed'),
+    
     # Категории
     path('categories/', views.CategoryListView.as_view(), name='category_list'),
     path('category/<slug:slug>/', views.CategoryDetailView.as_view(), name='category_detail'),
@@ -34,6 +37,7 @@ urlpatterns = [
     # AJAX действия
     path('ajax/like/', views.toggle_like, name='toggle_like'),
     path('ajax/follow/', views.toggle_follow, name='toggle_follow'),
+    path('ajax/state/', views.user_state, name='user_state'),
     path('ajax/comment/', views.add_comment, name='add_comment'),
     
     # Подписка на рассылку
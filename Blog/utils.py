@@ -4,40 +4,91 @@
 
 import re
 import uuid
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
 from django.utils.text import slugify
 
 
+# Таблица транслитерации (строчные и заглавные буквы), компилируется один раз
+TRANSLIT_TABLE = str.maketrans({
+    # Строчные буквы
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    # Заглавные буквы
+    'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ё': 'YO',
+    'Ж': 'ZH', 'З': 'Z', 'И': 'I', 'Й': 'Y', 'К': 'K', 'Л': 'L', 'М': 'M',
+    'Н': 'N', 'О': 'O', 'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U',
+    'Ф': 'F', 'Х': 'H', 'Ц': 'TS', 'Ч': 'CH', 'Ш': 'SH', 'Щ': 'SCH',
+    'Ъ': '', 'Ы': 'Y', 'Ь': '', 'Э': 'E', 'Ю': 'YU', 'Я': 'YA',
+})
+
+# При большем количестве базовых slug дешевле прочитать все slug таблицы,
+# чем строить запрос из сотен условий LIKE
+PREFIX_QUERY_LIMIT = 200
+
+
 def transliterate_russian(text):
     """
     Транслитерирует русский текст в латиницу
     Поддерживает все русские буквы в верхнем и нижнем регистре
     """
+    return text.translate(TRANSLIT_TABLE)
+
+
+def make_base_slug(text, fallback_prefix='item', max_length=None):
+    """
+    Создает базовый slug (без проверки уникальности)
     
-    # Расширенный словарь для транслитерации
-    translit_dict = {
-        # Строчные буквы
-        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-        'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-        'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-        'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-        'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-        # Заглавные буквы
-        'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ё': 'YO',
-        'Ж': 'ZH', 'З': 'Z', 'И': 'I', 'Й': 'Y', 'К': 'K', 'Л': 'L', 'М': 'M',
-        'Н': 'N', 'О': 'O', 'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U',
-        'Ф': 'F', 'Х': 'H', 'Ц': 'TS', 'Ч': 'CH', 'Ш': 'SH', 'Щ': 'SCH',
-        'Ъ': '', 'Ы': 'Y', 'Ь': '', 'Э': 'E', 'Ю': 'YU', 'Я': 'YA',
-    }
-    
-    # Транслитерируем каждый символ
-    result = ''
-    for char in text:
-        if char in translit_dict:
-            result += translit_dict[char]
-        else:
-            result += char
-    
-    return result
+    Если после транслитерации и очистки slug пустой, создается случайный
+    slug вида '<fallback_prefix>-<8 hex>'.
+    """
+    slug = slugify(transliterate_russian(text or ''))
+    if max_length:
+        slug = slug[:max_length].rstrip('-')
+    return slug or f'{fallback_prefix}-{uuid.uuid4().hex[:8]}'
+
+
+def _slug_max_length(model_class, slug_field):
+    return model_class._meta.get_field(slug_field).max_length
+
+
+def _with_suffix(base, counter, max_length):
+    suffix = f'-{counter}'
+    if max_length and len(base) + len(suffix) > max_length:
+        base = base[:max_length - len(suffix)].rstrip('-')
+    return f'{base}{suffix}'
+
+
+def _taken_slugs(model_class, bases, slug_field='slug'):
+    """
+    Загружает {slug: pk} для slug, которые могут конфликтовать с базовыми.
+
+    Один запрос: base или base-* для каждого базового slug (или все slug
+    таблицы, если базовых slug много).
+    """
+    queryset = model_class.objects.order_by()
+    bases = set(bases)
+    if len(bases) <= PREFIX_QUERY_LIMIT:
+        queryset = queryset.filter(reduce(or_, (
+            Q(**{slug_field: base}) | Q(**{f'{slug_field}__startswith': f'{base}-'})
+            for base in bases
+        )))
+    return {slug: pk for pk, slug in queryset.values_list('pk', slug_field)}
+
+
+def _first_free(base, taken, max_length):
+    slug = base
+    counter = 1
+    while slug in taken:
+        slug = _with_suffix(base, counter, max_length)
+        counter += 1
+    return slug
 
 
 def create_unique_slug(text, model_class, instance=None, slug_field='slug', fallback_prefix='item'):
@@ -54,34 +105,93 @@ def create_unique_slug(text, model_class, instance=None, slug_field='slug', fall
     Returns:
         str: Уникальный slug
     """
+    max_length = _slug_max_length(model_class, slug_field)
+    base = make_base_slug(text, fallback_prefix, max_length)
     
-    # Транслитерируем текст
-    transliterated = transliterate_russian(text)
+    # Свободный суффикс подбирается в памяти по одной выборке занятых slug
+    taken = _taken_slugs(model_class, [base], slug_field)
+    if instance is not None and instance.pk:
+        taken = {slug for slug, pk in taken.items() if pk != instance.pk}
+    return _first_free(base, taken, max_length)
+
+
+def _keeps_current_slug(current, base, text, fallback_prefix):
+    """Текущий slug уже получен из этого текста (base или base-N)"""
+    if not current:
+        return False
+    if current == base or re.fullmatch(rf'{re.escape(base)}-\d+', current):
+        return True
+    # Для текста без латиницы/кириллицы slug случайный - новый не генерируем
+    return not slugify(transliterate_russian(text or '')) and current.startswith(f'{fallback_prefix}-')
+
+
+def allocate_unique_slugs(texts, model_class, slug_field='slug', fallback_prefix='item', current_slugs=None):
+    """
+    Пакетно подбирает уникальные slug
     
-    # Создаем базовый slug
-    base_slug = slugify(transliterated)
+    Args:
+        texts (dict): {ключ: исходный текст}; ключи обрабатываются по порядку
+        model_class: Класс модели Django
+        slug_field (str): Название поля slug в модели
+        fallback_prefix (str): Префикс для случайного slug если текст пустой
+        current_slugs (dict): {pk: текущий slug} для переименования существующих
+            объектов (ключи texts - pk). Корректные текущие slug сохраняются,
+            остальные считаются свободными.
     
-    # Если slug пустой, создаем случайный
-    if not base_slug:
-        base_slug = f'{fallback_prefix}-{uuid.uuid4().hex[:8]}'
+    Returns:
+        dict: {ключ: уникальный slug}
+    """
+    if not texts:
+        return {}
+    current_slugs = current_slugs or {}
+    max_length = _slug_max_length(model_class, slug_field)
+    bases = {key: make_base_slug(text, fallback_prefix, max_length) for key, text in texts.items()}
+    taken = {
+        slug for slug, pk in _taken_slugs(model_class, bases.values(), slug_field).items()
+        if pk not in current_slugs
+    }
     
-    # Проверяем уникальность
-    slug = base_slug
-    counter = 1
+    slugs = {}
+    for key, base in bases.items():
+        current = current_slugs.get(key)
+        if current not in taken and _keeps_current_slug(current, base, texts[key], fallback_prefix):
+            slugs[key] = current
+            taken.add(current)
+    for key, base in bases.items():
+        if key not in slugs:
+            slugs[key] = _first_free(base, taken, max_length)
+            taken.add(slugs[key])
+    return {key: slugs[key] for key in bases}
+
+
+def bulk_update_slugs(objects, new_slugs, slug_field='slug', batch_size=500):
+    """
+    Сохраняет новые slug объектов через bulk_update
     
-    # Создаем queryset для проверки уникальности
-    queryset = model_class.objects.all()
-    if instance and instance.pk:
-        queryset = queryset.exclude(pk=instance.pk)
+    Если новый slug объекта сейчас занят другим объектом пакета,
+    тот сначала получает временный slug, чтобы не нарушить уникальность.
+    Сигналы post_save при этом не отправляются.
     
-    # Ищем уникальный slug
-    filter_kwargs = {slug_field: slug}
-    while queryset.filter(**filter_kwargs).exists():
-        slug = f'{base_slug}-{counter}'
-        filter_kwargs[slug_field] = slug
-        counter += 1
+    Returns:
+        list: объекты, slug которых изменился
+    """
+    changed = [obj for obj in objects if getattr(obj, slug_field) != new_slugs[obj.pk]]
+    if not changed:
+        return []
+    model_class = type(changed[0])
     
-    return slug
+    incoming = {new_slugs[obj.pk] for obj in changed}
+    vacating = [obj for obj in changed if getattr(obj, slug_field) in incoming]
+    
+    with transaction.atomic():
+        if vacating:
+            for obj in vacating:
+                setattr(obj, slug_field, f'tmp-{obj.pk}-{uuid.uuid4().hex[:8]}')
+            model_class.objects.bulk_update(vacating, [slug_field], batch_size=batch_size)
+        for obj in changed:
+            setattr(obj, slug_field, new_slugs[obj.pk])
+        model_class.objects.bulk_update(changed, [slug_field], batch_size=batch_size)
+    return changed
 
 
 def validate_slug(slug):
@@ -8,10 +8,21 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.contrib import messages
 from django.http import JsonResponse
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db.models import Q, Case, When, IntegerField
 from django.urls import reverse_lazy, reverse
 import json
 
+from Home.cache_utils import make_page
+from Home.page_cache import SurrogateKeysMixin, add_surrogate_keys, count_view_on_hit
+from Home.rollups import user_activity
+from Home.view_counters import record_view
+from . import comments, counters, feed, related, search, tag_feed
+from .cache_utils import (
+    POST_ORDERINGS, cache_categories_with_counts, cache_featured_posts,
+    cache_most_viewed_posts, cache_posts_list, cache_published_posts_count,
+    cache_recent_posts, get_post_neighbours,
+)
+
 try:
     from .models import Post, Category, Comment, Like, Follow, Newsletter, UserProfile, AuthorRequest, Tag
     from .forms import PostForm, CommentForm, UserProfileForm, NewsletterForm, UserRegistrationForm, AuthorRequestForm
@@ -21,24 +32,51 @@ except:
     PostForm = CommentForm = UserProfileForm = NewsletterForm = UserRegistrationForm = AuthorRequestForm = None
 
 
-class BlogHomeView(ListView):
+class CachedPaginationMixin:
+    """
+    Пагинация ListView по страницам из кэша (Blog.cache_utils).
+
+    Наследник реализует get_cached_page(page, per_page), возвращающий
+    {'posts': [...], 'count': ..., 'number': ...}, либо None, если
+    страницу нужно строить обычным запросом к get_queryset().
+    """
+
+    def get_cached_page(self, page, per_page):
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        result = self.get_cached_page(page_number, page_size)
+        if result is None:
+            return super().paginate_queryset(queryset, page_size)
+        page = make_page(result['posts'], result['count'], result['number'], page_size)
+        return page.paginator, page, page.object_list, page.has_other_pages()
+
+
+class BlogHomeView(SurrogateKeysMixin, CachedPaginationMixin, ListView):
     """Главная страница блога"""
     template_name = 'blog/index.html'
     context_object_name = 'posts'
     paginate_by = 6
+    surrogate_keys = ('posts', 'categories')
     
     def get_queryset(self):
         if Post:
             return Post.objects.filter(status='published').select_related('author', 'category').order_by('-published_at')
         return []
     
+    def get_cached_page(self, page, per_page):
+        if not Post:
+            return None
+        return cache_posts_list(page=page, per_page=per_page)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
         if Post and Category:
-            context['featured_posts'] = Post.objects.filter(status='published', is_featured=True)[:3]
-            context['categories'] = Category.objects.filter(is_active=True).annotate(total_posts=Count('posts'))
-            context['latest_posts'] = Post.objects.filter(status='published')[:5]
+            context['featured_posts'] = cache_featured_posts(3)
+            context['categories'] = cache_categories_with_counts()
+            context['latest_posts'] = cache_recent_posts(5)
         else:
             # Заглушки для случая, когда модели не работают
             context['featured_posts'] = []
@@ -48,7 +86,7 @@ class BlogHomeView(ListView):
         return context
 
 
-class PostListView(ListView):
+class PostListView(CachedPaginationMixin, ListView):
     """Список всех постов"""
     template_name = 'blog/post_list.html'
     context_object_name = 'posts'
@@ -60,37 +98,62 @@ class PostListView(ListView):
             
         queryset = Post.objects.filter(status='published').select_related('author', 'category')
         
-        # Поиск
+        # Поиск (полнотекстовый индекс FTS5, если он доступен)
         search_query = self.request.GET.get('search')
+        ranked_ids = None
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) | 
-                Q(content__icontains=search_query) |
-                Q(tags__icontains=search_query)
-            )
+            ranked_ids = search.search_post_ids(search_query)
+            if ranked_ids is None:
+                queryset = queryset.filter(
+                    Q(title__icontains=search_query) | 
+                    Q(content__icontains=search_query) |
+                    Q(tags__icontains=search_query)
+                )
+            else:
+                queryset = queryset.filter(id__in=ranked_ids)
         
         # Фильтр по категории
         category_slug = self.request.GET.get('category')
         if category_slug:
             queryset = queryset.filter(category__slug=category_slug)
         
-        # Сортировка
-        sort_by = self.request.GET.get('sort', '-published_at')
+        # Сортировка (результаты поиска по умолчанию упорядочены по релевантности)
+        sort_by = self.request.GET.get('sort')
+        if ranked_ids and not sort_by:
+            relevance = Case(
+                *[When(id=post_id, then=position) for position, post_id in enumerate(ranked_ids)],
+                output_field=IntegerField()
+            )
+            return queryset.order_by(relevance)
+        if sort_by not in POST_ORDERINGS:
+            sort_by = POST_ORDERINGS[0]
         queryset = queryset.order_by(sort_by)
         
         return queryset
     
+    def get_cached_page(self, page, per_page):
+        # Результаты поиска не кэшируем: запросы слишком разнообразны
+        if not Post or self.request.GET.get('search'):
+            return None
+        return cache_posts_list(
+            category_slug=self.request.GET.get('category'),
+            page=page,
+            ordering=self.request.GET.get('sort'),
+            per_page=per_page
+        )
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if Category:
-            context['categories'] = Category.objects.filter(is_active=True).annotate(total_posts=Count('posts'))
+            context['categories'] = cache_categories_with_counts()
         else:
             context['categories'] = []
         return context
 
 
-class PostDetailView(DetailView):
+class PostDetailView(SurrogateKeysMixin, DetailView):
     """Детальная страница поста"""
+    surrogate_keys = ('posts', 'post:{slug}')
     template_name = 'blog/post_detail.html'
     context_object_name = 'post'
     
@@ -105,9 +168,10 @@ class PostDetailView(DetailView):
             raise Http404("Post model not available")
             
         post = super().get_object()
-        # Увеличиваем счетчик просмотров
-        post.views_count += 1
-        post.save(update_fields=['views_count'])
+        # Учитываем просмотр в буфере счетчиков (без записи в БД)
+        post.views_count += record_view(post)
+        count_view_on_hit(self.request, post)
+        add_surrogate_keys(self.request, f'user:{post.author.username}')
         return post
     
     def get_context_data(self, **kwargs):
@@ -120,45 +184,35 @@ class PostDetailView(DetailView):
         
         # Комментарии
         if Comment:
-            context['comments'] = post.comments.filter(is_approved=True, parent=None).select_related('author')
+            # Дерево комментариев страницы загружается без N+1 (см. Blog.comments)
+            comments_page = comments.load_comment_page(post, self.request.GET.get('comments_page') or 1)
+            context['comments_page'] = comments_page
+            context['comments'] = comments_page.object_list
         else:
             context['comments'] = []
         
         # Теги
         context['tags'] = post.get_tags_list() if hasattr(post, 'get_tags_list') else []
         
-        # Похожие посты
-        if post.category:
+        # Похожие посты (предрассчитанный индекс, см. Blog.related)
+        context['related_posts'] = related.get_related_posts(post, limit=4)
+        if not context['related_posts'] and post.category:
+            # Индекс для поста еще не построен - показываем посты той же категории
             context['related_posts'] = Post.objects.filter(
                 category=post.category, 
                 status='published'
             ).exclude(id=post.id)[:4]
         
-        # Навигация между постами
-        context['previous_post'] = Post.objects.filter(
-            status='published',
-            published_at__lt=post.published_at
-        ).first()
-        
-        context['next_post'] = Post.objects.filter(
-            status='published', 
-            published_at__gt=post.published_at
-        ).last()
-        
-        if self.request.user.is_authenticated and Like:
-            # Проверяем, лайкнул ли пользователь пост
-            context['user_liked'] = Like.objects.filter(
-                user=self.request.user,
-                content_type='post',
-                object_id=post.id
-            ).exists()
-            
-            # Проверяем, подписан ли на автора
-            if Follow:
-                context['user_following_author'] = Follow.objects.filter(
-                    follower=self.request.user,
-                    following_user=post.author
-                ).exists()
+        # Навигация между постами (по закэшированному порядку публикации)
+        context['previous_post'], context['next_post'] = get_post_neighbours(post.id)
+        
+        if self.request.user.is_authenticated and Like and Follow:
+            # Лайк поста и подписка на автора - одним запросом
+            state = counters.get_user_state(
+                self.request.user, post_ids=[post.id], author_ids=[post.author_id]
+            )
+            context['user_liked'] = post.id in state['liked_posts']
+            context['user_following_author'] = post.author_id in state['followed_authors']
         
         return context
 
@@ -209,6 +263,22 @@ class PostDeleteView(LoginRequiredMixin, DeleteView):
         return []
 
 
+class FeedView(LoginRequiredMixin, ListView):
+    """Персональная лента: посты авторов и категорий, на которые подписан пользователь"""
+    template_name = 'blog/feed.html'
+    context_object_name = 'posts'
+    
+    def get_queryset(self):
+        posts, self.next_cursor = feed.get_feed_page(self.request.user, self.request.GET.get('cursor'))
+        return posts
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        context['is_first_page'] = not self.request.GET.get('cursor')
+        return context
+
+
 class CategoryListView(ListView):
     """Список всех категорий"""
     template_name = 'blog/category_list.html'
@@ -216,9 +286,7 @@ class CategoryListView(ListView):
     
     def get_queryset(self):
         if Category:
-            return Category.objects.filter(is_active=True).annotate(
-                total_posts=Count('posts', filter=Q(posts__status='published'))
-            ).order_by('name')
+            return cache_categories_with_counts()
         return []
     
     def get_context_data(self, **kwargs):
@@ -226,8 +294,8 @@ class CategoryListView(ListView):
         
         if Post:
             # Получаем общую статистику
-            context['total_posts'] = Post.objects.filter(status='published').count()
-            context['total_categories'] = Category.objects.filter(is_active=True).count()
+            context['total_posts'] = cache_published_posts_count()
+            context['total_categories'] = len(self.object_list)
             
             # Поиск категорий
             search_query = self.request.GET.get('search')
@@ -240,10 +308,12 @@ class CategoryListView(ListView):
         return context
 
 
-class CategoryDetailView(DetailView):
+class CategoryDetailView(SurrogateKeysMixin, DetailView):
     """Посты в категории"""
     template_name = 'blog/category_detail.html'
     context_object_name = 'category'
+    paginate_by = 10
+    surrogate_keys = ('posts', 'categories', 'category:{slug}')
     
     def get_queryset(self):
         return Category.objects.all() if Category else []
@@ -258,21 +328,20 @@ class CategoryDetailView(DetailView):
             return context
             
         category = self.object
-        posts = Post.objects.filter(category=category, status='published').order_by('-published_at')
-        
-        paginator = Paginator(posts, 10)
-        page = self.request.GET.get('page')
-        context['posts'] = paginator.get_page(page)
+        result = cache_posts_list(
+            category_slug=category.slug,
+            page=self.request.GET.get('page') or 1,
+            per_page=self.paginate_by
+        )
+        page_obj = make_page(result['posts'], result['count'], result['number'], self.paginate_by)
+        context['posts'] = context['page_obj'] = page_obj
+        context['is_paginated'] = page_obj.has_other_pages()
         
         # Другие категории с количеством постов
-        context['other_categories'] = Category.objects.filter(is_active=True).annotate(
-            total_posts=Count('posts', filter=Q(posts__status='published'))
-        ).order_by('name')
+        context['other_categories'] = cache_categories_with_counts()
         
         # Последние популярные посты из других категорий
-        context['recent_posts'] = Post.objects.filter(
-            status='published'
-        ).exclude(category=category).order_by('-views_count')[:5]
+        context['recent_posts'] = cache_most_viewed_posts(5, exclude_category_slug=category.slug)
         
         # Проверяем подписку на категорию для авторизованного пользователя
         if self.request.user.is_authenticated and Follow:
@@ -307,13 +376,10 @@ class UserProfileView(DetailView):
             context['posts'] = []
             context['posts_count'] = 0
         
-        # Статистика
-        if Follow:
-            context['followers_count'] = Follow.objects.filter(following_user=user).count()
-            context['following_count'] = Follow.objects.filter(follower=user).count()
-        else:
-            context['followers_count'] = 0
-            context['following_count'] = 0
+        # Статистика (денормализованные счетчики, см. Blog.counters)
+        profile = getattr(user, 'userprofile', None)
+        context['followers_count'] = profile.followers_count if profile else 0
+        context['following_count'] = profile.following_count if profile else 0
         
         if self.request.user.is_authenticated and self.request.user != user and Follow:
             context['is_following'] = Follow.objects.filter(
@@ -331,9 +397,8 @@ class TagListView(ListView):
     
     def get_queryset(self):
         if Tag:
-            return Tag.objects.filter(is_active=True).annotate(
-                total_posts=Count('posts', filter=Q(posts__status='published'))
-            ).order_by('name')
+            # Счетчики постов и файлов хранятся в самих тегах
+            return Tag.objects.filter(is_active=True).order_by('name')
         return []
     
     def get_context_data(self, **kwargs):
@@ -369,85 +434,22 @@ class TagDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         
         if self.object:
-            # Получаем посты с этим тегом
-            posts = []
-            total_posts = 0
-            if Post:
-                posts = Post.objects.filter(
-                    tag_objects=self.object,
-                    status='published'
-                ).select_related('author', 'category').order_by('-published_at')
-                total_posts = posts.count()
-            
-            # Получаем файлы с этим тегом
-            archive_files = []
-            total_files = 0
-            try:
-                from Archive.models import ArchiveFile
-                archive_files = ArchiveFile.objects.filter(
-                    tag_objects=self.object,
-                    is_public=True
-                ).select_related('uploaded_by', 'category').order_by('-uploaded_at')
-                total_files = archive_files.count()
-            except ImportError:
-                pass
-            
-            # Объединяем контент
-            all_content = []
-            
-            # Добавляем посты
-            for post in posts:
-                all_content.append({
-                    'type': 'post',
-                    'object': post,
-                    'title': post.title,
-                    'date': post.published_at or post.created_at,
-                    'author': post.author,
-                    'category': post.category,
-                    'views': post.views_count,
-                    'likes': post.likes_count,
-                    'comments': post.comments_count,
-                    'url': post.get_absolute_url(),
-                    'excerpt': post.excerpt,
-                    'image': post.featured_image
-                })
-            
-            # Добавляем файлы
-            for file in archive_files:
-                all_content.append({
-                    'type': 'file',
-                    'object': file,
-                    'title': file.title,
-                    'date': file.uploaded_at,
-                    'author': file.uploaded_by,
-                    'category': file.category,
-                    'views': file.views_count,
-                    'likes': file.likes_count,
-                    'downloads': file.downloads_count,
-                    'url': file.get_absolute_url(),
-                    'excerpt': file.description,
-                    'file_type': file.file_type,
-                    'file_size': file.file_size
-                })
-            
-            # Сортируем по дате
-            all_content.sort(key=lambda x: x['date'], reverse=True)
+            # Количество постов и файлов с этим тегом
+            total_posts = tag_feed.tag_posts_queryset(self.object).count()
+            files = tag_feed.tag_files_queryset(self.object)
+            total_files = files.count() if files is not None else 0
             
             # Поиск
             search_query = self.request.GET.get('search')
             if search_query:
-                filtered_content = []
-                for item in all_content:
-                    if (search_query.lower() in item['title'].lower() or 
-                        (item['excerpt'] and search_query.lower() in item['excerpt'].lower())):
-                        filtered_content.append(item)
-                all_content = filtered_content
                 context['search_query'] = search_query
             
-            # Пагинация
-            paginator = Paginator(all_content, 12)
+            # Объединенная лента: сортировка, поиск и пагинация выполняются в БД,
+            # объекты загружаются только для текущей страницы
+            paginator = Paginator(tag_feed.build_tag_feed(self.object, search_query), 12)
             page_number = self.request.GET.get('page')
             page_obj = paginator.get_page(page_number)
+            page_obj.object_list = tag_feed.hydrate_feed_rows(page_obj.object_list)
             
             context['content'] = page_obj
             context['total_posts'] = total_posts
@@ -518,27 +520,12 @@ def toggle_like(request):
         
         if content_type == 'post':
             try:
-                post = Post.objects.get(id=object_id)
-                like, created = Like.objects.get_or_create(
-                    user=request.user,
-                    content_type='post',
-                    object_id=object_id,
-                    defaults={'post': post}
-                )
-                
-                if not created:
-                    like.delete()
-                    liked = False
-                    post.likes_count = max(0, post.likes_count - 1)
-                else:
-                    liked = True
-                    post.likes_count += 1
-                
-                post.save(update_fields=['likes_count'])
+                post = Post.objects.only('id', 'slug').get(id=object_id)
+                liked, likes_count = counters.toggle_post_like(request.user, post)
                 
                 return JsonResponse({
                     'liked': liked,
-                    'likes_count': post.likes_count
+                    'likes_count': likes_count
                 })
             except Post.DoesNotExist:
                 return JsonResponse({'error': 'Post not found'}, status=404)
@@ -560,19 +547,9 @@ def toggle_follow(request):
         if follow_type == 'user':
             try:
                 user_to_follow = User.objects.get(id=object_id)
-                follow, created = Follow.objects.get_or_create(
-                    follower=request.user,
-                    following_user=user_to_follow,
-                    defaults={'follow_type': 'user'}
-                )
-                
-                if not created:
-                    follow.delete()
-                    followed = False
-                else:
-                    followed = True
+                followed, followers_count = counters.toggle_user_follow(request.user, user_to_follow)
                 
-                return JsonResponse({'followed': followed})
+                return JsonResponse({'followed': followed, 'followers_count': followers_count})
             except User.DoesNotExist:
                 return JsonResponse({'error': 'User not found'}, status=404)
                 
@@ -581,17 +558,7 @@ def toggle_follow(request):
                 return JsonResponse({'error': 'Category not available'}, status=400)
             try:
                 category_to_follow = Category.objects.get(id=object_id)
-                follow, created = Follow.objects.get_or_create(
-                    follower=request.user,
-                    following_category=category_to_follow,
-                    defaults={'follow_type': 'category'}
-                )
-                
-                if not created:
-                    follow.delete()
-                    followed = False
-                else:
-                    followed = True
+                followed = counters.toggle_category_follow(request.user, category_to_follow)
                 
                 return JsonResponse({'followed': followed})
             except Category.DoesNotExist:
@@ -600,6 +567,35 @@ def toggle_follow(request):
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
 
+def _parse_ids(value, limit=100):
+    """Разбирает список id из строки '1,2,3'; некорректные значения пропускаются"""
+    ids = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if item.isdigit():
+            ids.append(int(item))
+    return ids[:limit]
+
+
+def user_state(request):
+    """
+    AJAX состояние лайков и подписок текущего пользователя.
+
+    GET ?post_ids=1,2&author_ids=3&category_ids=4 - один запрос к БД
+    для всех объектов страницы списка.
+    """
+    if not Like or not Follow:
+        return JsonResponse({'error': 'State not available'}, status=400)
+    
+    state = counters.get_user_state(
+        request.user,
+        post_ids=_parse_ids(request.GET.get('post_ids')),
+        author_ids=_parse_ids(request.GET.get('author_ids')),
+        category_ids=_parse_ids(request.GET.get('category_ids'))
+    )
+    return JsonResponse({key: sorted(ids) for key, ids in state.items()})
+
+
 @login_required
 def add_comment(request):
     """AJAX добавление комментария"""
@@ -750,6 +746,8 @@ def user_dashboard(request):
         'files_count': len(user_files),
         'author_request': author_request,
         'is_author': is_author,
+        # Активность за 30 дней из дневной статистики (Home.rollups)
+        'activity': user_activity(request.user),
     }
     
     return render(request, 'auth/dashboard.html', context)
@@ -0,0 +1,137 @@
+"""
+Общие утилиты кэширования: ключи с поколениями (generation namespaces)
+
+Каждое пространство имен ('posts', 'category:<slug>', 'tag:<slug>' ...)
+имеет счетчик поколения в кэше. Номера поколений встраиваются в ключ,
+поэтому инвалидация всех связанных записей - один INCR счетчика,
+а устаревшие записи просто перестают читаться и истекают по таймауту.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+
+
+GENERATION_KEY_PREFIX = 'gen'
+
+
+def _generation_key(namespace):
+    return f'{GENERATION_KEY_PREFIX}:{namespace}'
+
+
+def _initial_generation():
+    # Начальное значение - текущее время в миллисекундах: если счетчик был
+    # вытеснен из кэша, новое поколение не совпадет ни с одним прежним
+    return int(time.time() * 1000)
+
+
+def get_generations(namespaces):
+    """Возвращает {namespace: поколение} за один запрос к кэшу"""
+    namespaces = list(namespaces)
+    if not namespaces:
+        return {}
+    keys = {namespace: _generation_key(namespace) for namespace in namespaces}
+    found = cache.get_many(keys.values())
+
+    generations = {}
+    for namespace, key in keys.items():
+        generation = found.get(key)
+        if generation is None:
+            cache.add(key, _initial_generation(), timeout=None)
+            generation = cache.get(key)
+        generations[namespace] = generation
+    return generations
+
+
+def bump_generation(*namespaces):
+    """Инвалидирует все записи пространств имен (один INCR на пространство)"""
+    for namespace in namespaces:
+        if not namespace:
+            continue
+        key = _generation_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Счетчика нет в кэше - записи без него и так не будут прочитаны
+            cache.add(key, _initial_generation(), timeout=None)
+
+
+def get_cache_key(*args, namespaces=None, **kwargs):
+    """
+    Генерирует ключ кэша на основе аргументов.
+
+    Если переданы namespaces, в ключ встраиваются их текущие поколения.
+    """
+    key_string = '_'.join(str(arg) for arg in args)
+    if kwargs:
+        key_string += '_' + '_'.join(f"{k}={v}" for k, v in sorted(kwargs.items()))
+    if namespaces:
+        generations = get_generations(namespaces)
+        key_string += '|' + ','.join(f'{ns}={generations[ns]}' for ns in sorted(generations))
+    return hashlib.md5(key_string.encode()).hexdigest()
+
+
+class StoredFile:
+    """
+    Легковесная замена FieldFile для закэшированных объектов.
+
+    Хранит только имя файла в хранилище; в шаблонах работает как поле модели:
+    {% if post.featured_image %}{{ post.featured_image.url }}{% endif %}
+    """
+
+    def __init__(self, name):
+        self.name = name or ''
+
+    def __bool__(self):
+        return bool(self.name)
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def url(self):
+        return default_storage.url(self.name) if self.name else ''
+
+
+def make_page(items, count, number, per_page):
+    """
+    Создает страницу пагинации для закэшированного среза списка.
+
+    Пагинатор строится по range(count), поэтому не выполняет запросов,
+    а object_list страницы подменяется готовыми объектами из кэша.
+    """
+    paginator = Paginator(range(count), per_page)
+    page = paginator.get_page(number)
+    page.object_list = items
+    return page
+
+
+# Настройки сайта в памяти процесса: (поколение 'site_settings', объект)
+_site_settings_memo = (None, None)
+
+
+def get_site_settings():
+    """
+    Возвращает SiteSettings из памяти процесса.
+
+    Актуальность проверяется по поколению 'site_settings' в общем кэше
+    (одно чтение кэша); БД читается только после изменения настроек.
+    """
+    global _site_settings_memo
+    from .models import SiteSettings
+
+    generation = get_generations(['site_settings'])['site_settings']
+    memo_generation, site_settings = _site_settings_memo
+    if site_settings is None or memo_generation != generation:
+        site_settings = SiteSettings.get_settings()
+        _site_settings_memo = (generation, site_settings)
+    return site_settings
+
+
+def invalidate_site_settings():
+    """Сбрасывает настройки сайта во всех процессах"""
+    global _site_settings_memo
+    _site_settings_memo = (None, None)
+    bump_generation('site_settings')
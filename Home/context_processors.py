@@ -3,7 +3,15 @@ Context processors для приложения Home
 Обеспечивают доступ к настройкам сайта на всех страницах
 """
 
-from .models import SiteSettings
+from django.utils.functional import SimpleLazyObject
+
+from . import page_cache
+from .cache_utils import get_site_settings
+
+
+def _get_settings(request):
+    # Настройки уже загружены SiteSettingsMiddleware или берутся из памяти процесса
+    return getattr(request, 'site_settings', None) or get_site_settings()
 
 """
 Context processor для настроек сайта
@@ -11,7 +19,7 @@ Context processor для настроек сайта
 """
 def site_settings(request):
     try:
-        settings = SiteSettings.get_settings()
+        settings = _get_settings(request)
         return {
             'site_settings': settings,
             'site_name': settings.site_name,
@@ -30,11 +38,21 @@ Context processor для проверки режима обслуживания
 """
 def maintenance_check(request):
     try:
-        settings = SiteSettings.get_settings()
+        settings = _get_settings(request)
         return {
             'maintenance_mode': settings.maintenance_mode if settings else False,
         }
     except Exception:
         return {
             'maintenance_mode': False,
-        }
\ No newline at end of file
+        }
+
+"""
+Context processor для CSRF-токена на кэшируемых страницах
+"""
+def page_cache_csrf(request):
+    # Для анонимной страницы в шаблон попадает заглушка: настоящий токен
+    # подставляется в ответ для каждого запроса (см. Home.page_cache)
+    if not getattr(request, '_page_cache_candidate', False):
+        return {}
+    return {'csrf_token': SimpleLazyObject(lambda: page_cache.csrf_placeholder(request))}
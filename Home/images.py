@@ -0,0 +1,340 @@
+"""
+Уменьшенные копии загруженных изображений (responsive images)
+
+Для каждого изображения создается фиксированный набор ширин (WIDTHS)
+в WebP и JPEG. Копии шире оригинала не создаются, а самая большая копия
+имеет ширину оригинала (но не больше WIDTHS[-1]). Размеры копий хранятся
+в Home.ImageDerivative, список копий изображения кэшируется, поэтому шаблон
+получает srcset, width и height без чтения файлов.
+
+Запрос страницы никогда не кодирует изображения сам: если копий нет,
+шаблон показывает оригинал, а изображение ставится в очередь фонового
+потока процесса (derivative_queue). В очередь попадают изображения
+моделей из IMAGE_FIELDS после сохранения (см. Home.signals) и остальные
+изображения (например, оригиналы файлов архива) при первом показе.
+Команда generate_image_derivatives создает копии синхронно. При замене
+изображения копии старого файла удаляются.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # pragma: no cover - Pillow нужен для ImageField
+    Image = None
+
+logger = logging.getLogger('nlpers')
+
+
+# Ширины копий (px)
+WIDTHS = (320, 640, 960, 1280, 1920)
+
+# Форматы копий и параметры сохранения Pillow
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+# Ширина копии для атрибута src (браузеры без поддержки srcset)
+FALLBACK_WIDTH = 960
+
+# Каталог копий в хранилище
+DERIVATIVES_DIR = 'derivatives'
+
+# Поля моделей, для которых копии создаются сразу после загрузки
+IMAGE_FIELDS = {
+    'Blog.Post': ('featured_image',),
+    'Blog.Category': ('image',),
+    'Blog.UserProfile': ('avatar',),
+    'Archive.ArchiveFile': ('thumbnail',),
+    'Archive.FileCategory': ('image',),
+}
+
+# Ставить в очередь недостающие копии при первом обращении из шаблона
+LAZY_GENERATION = getattr(settings, 'IMAGE_DERIVATIVES_LAZY', True)
+
+# Максимум изображений в очереди процесса
+QUEUE_CAPACITY = getattr(settings, 'IMAGE_DERIVATIVES_QUEUE_CAPACITY', 1000)
+
+CACHE_TIMEOUT = 24 * 3600
+# Изображения, которые не удалось обработать, повторно пробуем не раньше чем через час
+FAILED_CACHE_TIMEOUT = 3600
+LOCK_TIMEOUT = 120
+
+
+def is_available():
+    return Image is not None
+
+
+def _cache_key(source):
+    return f'img:{hashlib.md5(source.encode()).hexdigest()}'
+
+
+def _supported_formats():
+    return [fmt for fmt in FORMATS if fmt != 'webp' or features.check('webp')]
+
+
+def derivative_name(source, width, fmt):
+    """Имя файла копии: derivatives/<путь без расширения>_<ширина>w.<формат>"""
+    root = posixpath.splitext(source)[0]
+    return f'{DERIVATIVES_DIR}/{root}_{width}w.{"jpg" if fmt == "jpeg" else fmt}'
+
+
+def target_widths(original_width):
+    """Ширины копий для оригинала заданной ширины"""
+    largest = min(original_width, WIDTHS[-1])
+    return [width for width in WIDTHS if width < largest] + [largest]
+
+
+def _render(image, width, fmt):
+    """Уменьшает изображение до ширины width; возвращает (байты, высота)"""
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+    if fmt == 'jpeg' and resized.mode != 'RGB':
+        if 'A' in resized.getbands() or resized.mode == 'P':
+            rgba = resized.convert('RGBA')
+            resized = Image.new('RGB', rgba.size, (255, 255, 255))
+            resized.paste(rgba, mask=rgba.getchannel('A'))
+        else:
+            resized = resized.convert('RGB')
+    elif fmt == 'webp' and resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGBA' if 'A' in resized.getbands() or resized.mode == 'P' else 'RGB')
+
+    buffer = io.BytesIO()
+    resized.save(buffer, **FORMATS[fmt])
+    return buffer.getvalue(), height
+
+
+def _open(source, storage):
+    with storage.open(source, 'rb') as fh:
+        image = Image.open(fh)
+        image.load()
+    return ImageOps.exif_transpose(image)
+
+
+def _serialize(derivatives, storage=default_storage):
+    return [
+        {
+            'format': item.format,
+            'width': item.width,
+            'height': item.height,
+            'url': storage.url(item.name),
+        }
+        for item in derivatives
+    ]
+
+
+def generate_derivatives(source, storage=default_storage):
+    """
+    Создает (заново) копии изображения source - имени файла в хранилище.
+
+    Возвращает список копий [{'format', 'width', 'height', 'url'}] или
+    пустой список, если файл не удалось открыть как изображение.
+    """
+    from .models import ImageDerivative
+
+    if not is_available():
+        return []
+    try:
+        image = _open(source, storage)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning('Не удалось создать копии изображения %s: %s', source, e)
+        cache.set(_cache_key(source), [], FAILED_CACHE_TIMEOUT)
+        return []
+
+    derivatives = []
+    for fmt in _supported_formats():
+        for width in target_widths(image.width):
+            data, height = _render(image, width, fmt)
+            name = derivative_name(source, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(data))
+            derivatives.append(ImageDerivative(
+                source=source, format=fmt, width=width, height=height, name=name
+            ))
+
+    with transaction.atomic():
+        stale = ImageDerivative.objects.filter(source=source).exclude(
+            name__in=[item.name for item in derivatives]
+        )
+        for name in stale.values_list('name', flat=True):
+            storage.delete(name)
+        ImageDerivative.objects.filter(source=source).delete()
+        ImageDerivative.objects.bulk_create(derivatives)
+
+    result = _serialize(derivatives, storage)
+    cache.set(_cache_key(source), result, CACHE_TIMEOUT)
+    return result
+
+
+def _stored_derivatives(source):
+    """Копии из кэша или БД; None, если их еще нет"""
+    from .models import ImageDerivative
+
+    key = _cache_key(source)
+    result = cache.get(key)
+    if result is not None:
+        return result
+    derivatives = list(ImageDerivative.objects.filter(source=source).order_by('format', 'width'))
+    if not derivatives:
+        return None
+    result = _serialize(derivatives)
+    cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def ensure_derivatives(source):
+    """
+    Создает копии изображения, если их еще нет (синхронно).
+
+    Пока копии создает другой процесс, возвращает пустой список.
+    """
+    if not source:
+        return []
+    result = _stored_derivatives(source)
+    if result is not None:
+        return result
+
+    lock_key = f'{_cache_key(source)}:lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        return []
+    try:
+        return generate_derivatives(source)
+    finally:
+        cache.delete(lock_key)
+
+
+def get_derivatives(source, generate=LAZY_GENERATION):
+    """
+    Список копий изображения (из кэша, затем из БД).
+
+    Не создает копии в текущем потоке: если их нет и generate=True,
+    изображение ставится в очередь, а вызывающий получает пустой список
+    (и показывает оригинал).
+    """
+    if not source:
+        return []
+    result = _stored_derivatives(source)
+    if result is not None:
+        return result
+    if generate and is_available():
+        derivative_queue.add(source)
+    return []
+
+
+class DerivativeQueue:
+    """Очередь создания копий, которую обрабатывает фоновый поток процесса"""
+
+    def __init__(self, capacity=QUEUE_CAPACITY):
+        self.capacity = capacity
+        self._pending = deque()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._queued)
+
+    def add(self, source):
+        """Ставит изображение в очередь; False - уже в очереди или очередь заполнена"""
+        with self._lock:
+            if source in self._queued or len(self._queued) >= self.capacity:
+                return False
+            self._queued.add(source)
+            self._pending.append(source)
+            self._ensure_thread()
+        self._wakeup.set()
+        return True
+
+    def _ensure_thread(self):
+        """Запускает фоновый поток (в т.ч. заново после fork)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name='image-derivatives', daemon=True
+            )
+            self._thread.start()
+
+    def _next(self):
+        with self._lock:
+            return self._pending.popleft() if self._pending else None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while (source := self._next()) is not None:
+                # У потока свое соединение с БД (как в Archive.download_log)
+                close_old_connections()
+                try:
+                    ensure_derivatives(source)
+                except Exception:
+                    logger.exception('Ошибка создания копий изображения %s', source)
+                finally:
+                    with self._lock:
+                        self._queued.discard(source)
+                    close_old_connections()
+
+
+derivative_queue = DerivativeQueue()
+
+
+def delete_derivatives(source, storage=default_storage):
+    """Удаляет копии изображения (файлы и записи)"""
+    from .models import ImageDerivative
+
+    derivatives = ImageDerivative.objects.filter(source=source)
+    for name in derivatives.values_list('name', flat=True):
+        storage.delete(name)
+    deleted, _ = derivatives.delete()
+    cache.delete(_cache_key(source))
+    return deleted
+
+
+def by_format(derivatives, fmt):
+    return [item for item in derivatives if item['format'] == fmt]
+
+
+def pick(derivatives, width, fmt='jpeg'):
+    """Самая узкая копия не уже width (или самая широкая из имеющихся)"""
+    candidates = by_format(derivatives, fmt)
+    if not candidates:
+        return None
+    for item in candidates:
+        if item['width'] >= width:
+            return item
+    return candidates[-1]
+
+
+def derivative_url(image, width, generate=False):
+    """URL копии изображения (FieldFile) шириной не меньше width или оригинала"""
+    if not image:
+        return ''
+    item = pick(get_derivatives(image.name, generate=generate), width)
+    return item['url'] if item else image.url
+
+
+def image_names(instance):
+    """Имена файлов полей изображений экземпляра (IMAGE_FIELDS): {поле: имя}"""
+    return {
+        field_name: getattr(getattr(instance, field_name, None), 'name', None) or ''
+        for field_name in IMAGE_FIELDS.get(instance._meta.label, ())
+    }
+
+
+def queue_instance_derivatives(instance):
+    """Ставит в очередь создание недостающих копий полей изображений экземпляра"""
+    for name in image_names(instance).values():
+        if name:
+            get_derivatives(name, generate=True)
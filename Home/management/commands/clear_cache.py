@@ -5,6 +5,8 @@ from django.core.management.base import BaseCommand
 from django.core.cache import cache
 from django.conf import settings
 
+from Home.cache_utils import bump_generation
+
 
 class Command(BaseCommand):
     help = 'Очищает весь кэш приложения'
@@ -41,29 +43,18 @@ class Command(BaseCommand):
                     self.style.ERROR('Текущий бэкенд кэша не поддерживает удаление по паттерну')
                 )
         else:
-            # Очищаем основные ключи кэша
-            cache_keys_to_clear = [
-                'posts_list_*',
-                'popular_posts_*',
-                'recent_posts_*',
-                'categories_with_counts',
-                'tags_with_counts',
-                'files_list_*',
-                'featured_files_*',
-                'recent_files_*',
-                'popular_files_*',
+            # Инвалидируем основные пространства имен кэша (по одному INCR поколения)
+            namespaces = [
+                'posts',
+                'categories',
+                'tags',
+                'files',
                 'file_categories',
-                'file_statistics',
             ]
-            
-            cleared_count = 0
-            for key_pattern in cache_keys_to_clear:
-                if hasattr(cache, 'delete_pattern'):
-                    cache.delete_pattern(key_pattern)
-                    cleared_count += 1
+            bump_generation(*namespaces)
             
             self.stdout.write(
-                self.style.SUCCESS(f'Очищено {cleared_count} паттернов кэша')
+                self.style.SUCCESS(f'Инвалидировано {len(namespaces)} пространств имен кэша')
             )
         
         # Показываем информацию о кэше
@@ -0,0 +1,16 @@
+"""
+Команда для сброса буферизованных счетчиков просмотров в базу данных
+"""
+from django.core.management.base import BaseCommand
+
+from Home.view_counters import view_counter
+
+
+class Command(BaseCommand):
+    help = 'Сбрасывает накопленные в кэше счетчики просмотров в базу данных'
+
+    def handle(self, *args, **options):
+        updated = view_counter.flush()
+        self.stdout.write(
+            self.style.SUCCESS(f'Обновлено записей: {updated}')
+        )
@@ -0,0 +1,76 @@
+"""
+Команда для создания уменьшенных копий загруженных изображений
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Создает копии изображений (WebP и JPEG фиксированных ширин) для srcset'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии, даже если они уже есть',
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Удалить копии изображений, которые больше нигде не используются',
+        )
+
+    def _sources(self):
+        from Home.images import IMAGE_FIELDS
+
+        sources = set()
+        for label, fields in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field_name in fields:
+                sources.update(
+                    model.objects.exclude(**{field_name: ''})
+                    .exclude(**{f'{field_name}__isnull': True})
+                    .values_list(field_name, flat=True)
+                )
+        return sources
+
+    def _archive_images(self):
+        # Оригиналы изображений архива показываются в карточках файлов
+        try:
+            ArchiveFile = apps.get_model('Archive', 'ArchiveFile')
+        except LookupError:
+            return set()
+        return set(ArchiveFile.objects.filter(file_type='image').values_list('file', flat=True))
+
+    def handle(self, *args, **options):
+        from Home.images import delete_derivatives, ensure_derivatives, generate_derivatives, is_available
+        from Home.models import ImageDerivative
+
+        if not is_available():
+            self.stdout.write(self.style.ERROR('Для создания копий нужен Pillow: pip install Pillow'))
+            return
+
+        sources = self._sources() | self._archive_images()
+        existing = set(ImageDerivative.objects.values_list('source', flat=True).distinct())
+
+        self.stdout.write(f'Изображений: {len(sources)}')
+        created = failed = 0
+        for source in sorted(sources):
+            if source in existing and not options['force']:
+                continue
+            result = generate_derivatives(source) if options['force'] else ensure_derivatives(source)
+            if result:
+                created += 1
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'Пропущено: {source}'))
+
+        if options['prune']:
+            stale = existing - sources
+            for source in stale:
+                delete_derivatives(source)
+            self.stdout.write(f'Удалены копии {len(stale)} неиспользуемых изображений')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: обработано {created}, пропущено {failed}'
+        ))
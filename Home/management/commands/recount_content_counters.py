@@ -0,0 +1,36 @@
+"""
+Команда для пересчета хранимых счетчиков контента категорий и тегов
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов и файлов категорий, тегов и категорий архива'
+
+    def handle(self, *args, **options):
+        from Blog.counters import recount_categories, recount_tags
+        from Home.cache_utils import bump_generation
+
+        try:
+            from Archive.counters import recount_file_categories
+        except ImportError:
+            recount_file_categories = None
+
+        self.stdout.write('Пересчет счетчиков контента...')
+        with transaction.atomic():
+            fixed = {
+                'Category': recount_categories(),
+                'Tag': recount_tags(),
+            }
+            if recount_file_categories is not None:
+                fixed['FileCategory'] = recount_file_categories()
+
+        # Пересчет выполняется UPDATE без сигналов - сбрасываем кэш списков вручную
+        bump_generation('categories', 'tags', 'file_categories')
+
+        for name, count in fixed.items():
+            self.stdout.write(f'{name}: исправлено {count}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Готово, исправлено строк: {sum(fixed.values())}')
+        )
@@ -0,0 +1,19 @@
+"""
+Команда свертки событий в дневную статистику (запускать по расписанию)
+"""
+from django.core.management.base import BaseCommand
+
+from Home.rollups import rollup
+from Home.view_counters import view_counter
+
+
+class Command(BaseCommand):
+    help = 'Сворачивает просмотры, скачивания и лайки в дневную статистику файлов, категорий и постов'
+
+    def handle(self, *args, **options):
+        # Сначала сбрасываем накопленные в Redis просмотры, чтобы они попали в свертку
+        view_counter.flush()
+        stats = rollup()
+        for label, count in stats.items():
+            self.stdout.write(f'{label}: обновлено строк {count}')
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -1,5 +1,4 @@
 from django.core.management.base import BaseCommand
-from django.db import transaction
 
 
 class Command(BaseCommand):
@@ -26,11 +25,17 @@ class Command(BaseCommand):
             action='store_true',
             help='Показать что будет изменено без фактического обновления',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Размер пакета для bulk_update (по умолчанию 500)',
+        )
 
     def handle(self, *args, **options):
         try:
             from Blog.models import Category, Post
-            from Blog.utils import create_unique_slug
+            from Home.cache_utils import bump_generation
         except ImportError:
             self.stdout.write(self.style.ERROR('❌ Модели блога не найдены'))
             return
@@ -51,86 +56,20 @@ class Command(BaseCommand):
         # Обновляем категории
         if not posts_only:
             self.stdout.write(self.style.SUCCESS('\n📁 Обновление категорий...'))
-            
-            categories = Category.objects.all()
-            for category in categories:
-                old_slug = category.slug
-                
-                # Создаем новый slug
-                new_slug = create_unique_slug(
-                    category.name, 
-                    Category, 
-                    instance=category,
-                    fallback_prefix='category'
-                )
-                
-                # Проверяем нужно ли обновлять
-                needs_update = force or not old_slug or old_slug != new_slug or not self.is_latin_slug(old_slug)
-                
-                if needs_update:
-                    if dry_run:
-                        self.stdout.write(
-                            f'  📝 {category.name}: "{old_slug}" → "{new_slug}"'
-                        )
-                    else:
-                        try:
-                            with transaction.atomic():
-                                category.slug = new_slug
-                                category.save(update_fields=['slug'])
-                                self.stdout.write(
-                                    self.style.SUCCESS(f'  ✅ {category.name}: "{old_slug}" → "{new_slug}"')
-                                )
-                                updated_categories += 1
-                        except Exception as e:
-                            self.stdout.write(
-                                self.style.ERROR(f'  ❌ Ошибка при обновлении {category.name}: {e}')
-                            )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(f'  ⏭️ {category.name}: slug уже корректный')
-                    )
+            updated_categories = self.update_model_slugs(
+                Category, 'name', 'category', force, dry_run, options['batch_size']
+            )
 
         # Обновляем посты
         if not categories_only:
             self.stdout.write(self.style.SUCCESS('\n📝 Обновление постов...'))
-            
-            posts = Post.objects.all()
-            for post in posts:
-                old_slug = post.slug
-                
-                # Создаем новый slug
-                new_slug = create_unique_slug(
-                    post.title, 
-                    Post, 
-                    instance=post,
-                    fallback_prefix='post'
-                )
-                
-                # Проверяем нужно ли обновлять
-                needs_update = force or not old_slug or old_slug != new_slug or not self.is_latin_slug(old_slug)
-                
-                if needs_update:
-                    if dry_run:
-                        self.stdout.write(
-                            f'  📝 {post.title}: "{old_slug}" → "{new_slug}"'
-                        )
-                    else:
-                        try:
-                            with transaction.atomic():
-                                post.slug = new_slug
-                                post.save(update_fields=['slug'])
-                                self.stdout.write(
-                                    self.style.SUCCESS(f'  ✅ {post.title}: "{old_slug}" → "{new_slug}"')
-                                )
-                                updated_posts += 1
-                        except Exception as e:
-                            self.stdout.write(
-                                self.style.ERROR(f'  ❌ Ошибка при обновлении {post.title}: {e}')
-                            )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(f'  ⏭️ {post.title}: slug уже корректный')
-                    )
+            updated_posts = self.update_model_slugs(
+                Post, 'title', 'post', force, dry_run, options['batch_size']
+            )
+
+        # bulk_update не отправляет post_save - сбрасываем кэш списков вручную
+        if not dry_run and (updated_categories or updated_posts):
+            bump_generation('posts', 'categories', 'tags')
 
         # Итоги
         self.stdout.write(self.style.SUCCESS('\n🎉 Обновление завершено!'))
@@ -150,6 +89,46 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('   • SEO-дружественные URL'))
         self.stdout.write(self.style.SUCCESS('   • Читаемые адреса на латинице'))
 
+    def update_model_slugs(self, model_class, text_field, fallback_prefix, force, dry_run, batch_size):
+        """
+        Пересчитывает slug всех объектов модели пакетно.
+
+        Без --force корректные текущие slug сохраняются, с --force
+        все slug назначаются заново. Возвращает количество обновленных объектов.
+        """
+        from Blog.utils import allocate_unique_slugs, bulk_update_slugs
+
+        objects = list(model_class.objects.only('pk', 'slug', text_field).order_by('pk'))
+        old_slugs = {obj.pk: obj.slug for obj in objects}
+        keep_slugs = {} if force else {
+            pk: slug for pk, slug in old_slugs.items() if self.is_latin_slug(slug)
+        }
+        new_slugs = allocate_unique_slugs(
+            {obj.pk: getattr(obj, text_field) for obj in objects},
+            model_class,
+            fallback_prefix=fallback_prefix,
+            current_slugs={pk: keep_slugs.get(pk) for pk in old_slugs}
+        )
+
+        for obj in objects:
+            text = getattr(obj, text_field)
+            old_slug, new_slug = old_slugs[obj.pk], new_slugs[obj.pk]
+            if old_slug == new_slug:
+                self.stdout.write(self.style.WARNING(f'  ⏭️ {text}: slug уже корректный'))
+            elif dry_run:
+                self.stdout.write(f'  📝 {text}: "{old_slug}" → "{new_slug}"')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'  ✅ {text}: "{old_slug}" → "{new_slug}"'))
+
+        if dry_run:
+            return 0
+        try:
+            changed = bulk_update_slugs(objects, new_slugs, batch_size=batch_size)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'  ❌ Ошибка при обновлении slug: {e}'))
+            return 0
+        return len(changed)
+
     def is_latin_slug(self, slug):
         """Проверяет содержит ли slug только латинские символы"""
         import re
@@ -0,0 +1,96 @@
+"""
+Middleware приложения Home
+"""
+import logging
+
+from django.db import DatabaseError
+from django.template.loader import render_to_string
+from django.http import HttpResponse
+
+from . import page_cache
+from .cache_utils import get_site_settings
+
+
+logger = logging.getLogger('nlpers')
+
+
+def _request_site_settings(request):
+    """Настройки сайта для запроса; None, если БД недоступна"""
+    if not hasattr(request, 'site_settings'):
+        try:
+            request.site_settings = get_site_settings()
+        except DatabaseError:
+            logger.exception('Не удалось загрузить настройки сайта')
+            request.site_settings = None
+    return request.site_settings
+
+
+class SiteSettingsMiddleware:
+    """
+    Кладет настройки сайта в request.site_settings.
+
+    Настройки берутся из памяти процесса (см. get_site_settings), поэтому
+    context processors и другие middleware не обращаются к БД.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _request_site_settings(request)
+        return self.get_response(request)
+
+
+class MaintenanceModeMiddleware:
+    """
+    Режим обслуживания: отвечает 503 до вызова представления.
+
+    Сотрудники (is_staff) продолжают работать с сайтом, админка и вход
+    остаются доступны. Должен стоять после AuthenticationMiddleware;
+    пользователь загружается из сессии только при включенном режиме.
+    """
+    EXEMPT_PREFIXES = ('/admin/', '/blog/login/', '/static/', '/media/')
+    RETRY_AFTER = 600
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        site_settings = _request_site_settings(request)
+        if (
+            site_settings is not None
+            and site_settings.maintenance_mode
+            and not request.path.startswith(self.EXEMPT_PREFIXES)
+            and not request.user.is_staff
+        ):
+            content = render_to_string('home/maintenance.html', {'site_name': site_settings.site_name})
+            response = HttpResponse(content, status=503)
+            response['Retry-After'] = str(self.RETRY_AFTER)
+            return response
+        return self.get_response(request)
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Полностраничный кэш для анонимных посетителей (см. Home.page_cache).
+
+    Должен стоять последним: ответ из кэша проходит через остальные
+    middleware, в том числе через CsrfViewMiddleware, который выставляет
+    cookie для подставленного CSRF-токена.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not page_cache.is_cache_candidate(request):
+            return self.get_response(request)
+
+        request._page_cache_candidate = True
+        response = page_cache.get_cached_response(request)
+        if response is not None:
+            response['X-Page-Cache'] = 'HIT'
+            return response
+
+        response = self.get_response(request)
+        return page_cache.store_response(request, response)
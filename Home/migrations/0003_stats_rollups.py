@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Home', '0002_image_derivative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=100, verbose_name='Модель')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID объекта')),
+                ('field', models.CharField(max_length=50, verbose_name='Поле')),
+                ('amount', models.IntegerField(verbose_name='Приращение')),
+                ('date', models.DateField(verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'Приращение счетчика',
+                'verbose_name_plural': 'Приращения счетчиков',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Источник')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Последний ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Позиция свертки статистики',
+                'verbose_name_plural': 'Позиции свертки статистики',
+            },
+        ),
+    ]
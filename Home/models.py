@@ -120,3 +120,57 @@ class SiteSettings(models.Model):
             }
         )
         return settings
+
+
+"""Уменьшенная копия загруженного изображения (см. Home.images)"""
+class ImageDerivative(models.Model):
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+
+    source = models.CharField('Исходное изображение', max_length=255, db_index=True)
+    format = models.CharField('Формат', max_length=4, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    name = models.CharField('Файл', max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Копия изображения'
+        verbose_name_plural = 'Копии изображений'
+        unique_together = ['source', 'format', 'width']
+        ordering = ['source', 'format', 'width']
+
+    def __str__(self):
+        return f'{self.source} ({self.format}, {self.width}px)'
+
+
+class CounterDelta(models.Model):
+    """Приращение буферизованного счетчика, еще не свернутое в дневную статистику (см. Home.rollups)"""
+    label = models.CharField('Модель', max_length=100)
+    object_id = models.PositiveBigIntegerField('ID объекта')
+    field = models.CharField('Поле', max_length=50)
+    amount = models.IntegerField('Приращение')
+    date = models.DateField('Дата')
+
+    class Meta:
+        verbose_name = 'Приращение счетчика'
+        verbose_name_plural = 'Приращения счетчиков'
+
+    def __str__(self):
+        return f'{self.label}:{self.object_id}:{self.field} +{self.amount} ({self.date})'
+
+
+class RollupCursor(models.Model):
+    """Последняя свернутая строка источника дневной статистики (см. Home.rollups)"""
+    name = models.CharField('Источник', max_length=50, primary_key=True)
+    position = models.BigIntegerField('Последний ID', default=0)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Позиция свертки статистики'
+        verbose_name_plural = 'Позиции свертки статистики'
+
+    def __str__(self):
+        return f'{self.name}: {self.position}'
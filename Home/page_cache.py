@@ -0,0 +1,163 @@
+"""
+Полностраничный кэш для анонимных посетителей с суррогатными ключами
+
+Представление помечает ответ суррогатными ключами - пространствами имен
+поколений из Home.cache_utils ('posts', 'post:<slug>', 'category:<slug>',
+'site_settings' ...). Вместе с HTML сохраняются поколения этих ключей на
+момент, когда представление их задало; при чтении они сравниваются
+с текущими одним get_many.
+Существующие сигналы инвалидации увеличивают поколения, поэтому после
+изменения устаревают ровно те страницы, которые показывали объект.
+
+Кэшируются только GET-запросы без cookie сессии и сообщений и только
+страницы, для которых представление задало суррогатные ключи. CSRF-токен
+в закэшированной странице заменяется заглушкой и подставляется заново
+для каждого запроса.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+
+from .cache_utils import get_generations
+
+
+# Время жизни страницы в кэше (секунды): устаревание определяют поколения,
+# таймаут лишь ограничивает объем кэша
+PAGE_CACHE_SECONDS = getattr(settings, 'PAGE_CACHE_SECONDS', 3600)
+
+PAGE_CACHE_KEY_PREFIX = 'page'
+
+# Ключи, которыми помечается каждая закэшированная страница (базовый шаблон)
+DEFAULT_SURROGATE_KEYS = ('site_settings',)
+
+CSRF_PLACEHOLDER = 'page-cache-csrf-token-placeholder'
+
+# Заголовки, которые не сохраняются вместе со страницей
+SKIP_HEADERS = {'set-cookie', 'vary', 'content-length'}
+
+
+def is_cache_candidate(request):
+    """Запрос может быть обслужен из кэша: анонимный GET без сессии и сообщений"""
+    return (
+        request.method == 'GET'
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and getattr(settings, 'MESSAGE_COOKIE_NAME', 'messages') not in request.COOKIES
+    )
+
+
+def add_surrogate_keys(request, *namespaces):
+    """
+    Помечает ответ на запрос суррогатными ключами (разрешает кэширование страницы).
+
+    Поколения запоминаются в момент вызова, поэтому вызывать нужно до чтения
+    данных: изменение во время рендеринга сделает страницу устаревшей сразу.
+    """
+    if not getattr(request, '_page_cache_candidate', False):
+        return
+    keys = getattr(request, '_surrogate_keys', None)
+    if keys is None:
+        keys = request._surrogate_keys = {}
+        namespaces = DEFAULT_SURROGATE_KEYS + namespaces
+    new = [namespace for namespace in namespaces if namespace and namespace not in keys]
+    keys.update(get_generations(new))
+
+
+def count_view_on_hit(request, instance, field='views_count'):
+    """Просмотр объекта учитывается и тогда, когда страница отдана из кэша"""
+    if getattr(request, '_page_cache_candidate', False):
+        request._page_cache_view = (instance._meta.label, instance.pk, field)
+
+
+def csrf_placeholder(request):
+    """Значение csrf_token для шаблона кэшируемой страницы"""
+    request._page_cache_csrf = True
+    return CSRF_PLACEHOLDER
+
+
+def page_cache_key(request):
+    path = request.build_absolute_uri()
+    return f'{PAGE_CACHE_KEY_PREFIX}:{hashlib.md5(path.encode()).hexdigest()}'
+
+
+def _with_csrf_token(request, content):
+    return content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+
+
+def get_cached_response(request):
+    """Возвращает HttpResponse из кэша или None, если страницы нет или она устарела"""
+    from django.http import HttpResponse
+
+    entry = cache.get(page_cache_key(request))
+    if entry is None:
+        return None
+    if get_generations(entry['keys']) != entry['keys']:
+        return None
+
+    content = entry['content']
+    if entry['csrf']:
+        content = _with_csrf_token(request, content)
+    response = HttpResponse(content, status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+
+    if entry['view']:
+        from .view_counters import view_counter
+        label, pk, field = entry['view']
+        view_counter.incr(label, pk, field)
+    return response
+
+
+def store_response(request, response):
+    """
+    Сохраняет ответ в кэш, если он одинаков для всех анонимных посетителей.
+
+    Всегда подставляет в ответ настоящий CSRF-токен вместо заглушки.
+    """
+    uses_csrf = getattr(request, '_page_cache_csrf', False)
+    keys = getattr(request, '_surrogate_keys', None)
+    session = getattr(request, 'session', None)
+    cacheable = (
+        keys
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not (session is not None and session.modified)
+        and 'private' not in response.get('Cache-Control', '')
+        and 'no-store' not in response.get('Cache-Control', '')
+    )
+
+    if cacheable:
+        cache.set(page_cache_key(request), {
+            'content': response.content,
+            'status': response.status_code,
+            'headers': [
+                (header, value) for header, value in response.items()
+                if header.lower() not in SKIP_HEADERS
+            ],
+            'keys': keys,
+            'csrf': uses_csrf,
+            'view': getattr(request, '_page_cache_view', None),
+        }, PAGE_CACHE_SECONDS)
+
+    if uses_csrf and not response.streaming:
+        response.content = _with_csrf_token(request, response.content)
+    return response
+
+
+class SurrogateKeysMixin:
+    """
+    Разрешает кэширование страницы представления для анонимных посетителей.
+
+    surrogate_keys - шаблоны пространств имен, подставляются kwargs URL:
+    surrogate_keys = ('posts', 'post:{slug}')
+    """
+    surrogate_keys = ()
+
+    def get_surrogate_keys(self):
+        return [key.format(**self.kwargs) for key in self.surrogate_keys]
+
+    def get(self, request, *args, **kwargs):
+        add_surrogate_keys(request, *self.get_surrogate_keys())
+        return super().get(request, *args, **kwargs)
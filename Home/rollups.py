@@ -0,0 +1,203 @@
+"""
+Дневная статистика просмотров, скачиваний и лайков (свертка событий)
+
+Страницы статистики читают только небольшие дневные таблицы:
+Archive.DailyFileStats, Archive.DailyFileCategoryStats и Blog.DailyPostStats.
+Их инкрементально пополняет rollup() (команда rollup_stats) из источников:
+
+- CounterDelta - приращения буферизованных счетчиков просмотров
+  (Home.view_counters); свернутые строки удаляются;
+- Archive.Download, Archive.FileLike и Blog.Like - строки событий;
+  позиция последней свернутой строки хранится в RollupCursor, поэтому
+  каждый запуск читает только новые строки.
+
+Строки событий моложе ROLLUP_LAG не сворачиваются: транзакция, получившая
+меньший ID, могла еще не зафиксироваться, и курсор перескочил бы ее строку.
+Статистика категории пересчитывается из статистики ее файлов за
+затронутые дни (по текущей категории файла).
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache_utils import bump_generation
+from .models import CounterDelta, RollupCursor
+
+
+# Задержка свертки строк событий (см. описание модуля)
+ROLLUP_LAG = timedelta(minutes=5)
+
+# Дневные таблицы: модель статистики -> (модель объекта, поле внешнего ключа)
+TARGETS = {
+    'Archive.DailyFileStats': ('Archive.ArchiveFile', 'file'),
+    'Blog.DailyPostStats': ('Blog.Post', 'post'),
+}
+
+# Буферизованные счетчики: (модель, поле счетчика) -> (дневная таблица, метрика)
+COUNTERS = {
+    ('Archive.ArchiveFile', 'views_count'): ('Archive.DailyFileStats', 'views'),
+    ('Blog.Post', 'views_count'): ('Blog.DailyPostStats', 'views'),
+}
+
+# Строки событий: курсор -> (модель, поле времени, поле объекта, фильтр, дневная таблица, метрика)
+EVENT_SOURCES = {
+    'downloads': ('Archive.Download', 'downloaded_at', 'file_id', {}, 'Archive.DailyFileStats', 'downloads'),
+    'file_likes': ('Archive.FileLike', 'created_at', 'file_id', {}, 'Archive.DailyFileStats', 'likes'),
+    'post_likes': (
+        'Blog.Like', 'created_at', 'post_id', {'content_type': 'post', 'post__isnull': False},
+        'Blog.DailyPostStats', 'likes',
+    ),
+}
+
+DELETE_BATCH_SIZE = 1000
+
+
+def _fold_counter_deltas(increments):
+    """Сворачивает CounterDelta; возвращает ID прочитанных строк"""
+    rows = list(CounterDelta.objects.values_list('pk', 'label', 'object_id', 'field', 'date', 'amount'))
+    for _, label, object_id, field, date, amount in rows:
+        target = COUNTERS.get((label, field))
+        if target is not None and amount > 0:
+            increments[target[0]][(object_id, date)][target[1]] += amount
+    return [row[0] for row in rows]
+
+
+def _fold_events(name, increments, now):
+    """Сворачивает новые строки источника событий; возвращает новую позицию курсора"""
+    label, time_field, object_field, filters, target, metric = EVENT_SOURCES[name]
+    model = apps.get_model(label)
+    cursor, _ = RollupCursor.objects.select_for_update().get_or_create(name=name)
+
+    upper = model.objects.filter(
+        pk__gt=cursor.position, **{f'{time_field}__lt': now - ROLLUP_LAG}
+    ).aggregate(upper=Max('pk'))['upper']
+    if upper is None:
+        return cursor, cursor.position
+
+    counts = model.objects.filter(
+        pk__gt=cursor.position, pk__lte=upper, **filters
+    ).values(object_field, day=TruncDate(time_field)).annotate(count=Count('pk')).order_by()
+    for row in counts:
+        increments[target][(row[object_field], row['day'])][metric] += row['count']
+    return cursor, upper
+
+
+def _apply(target_label, increments):
+    """Прибавляет приращения к строкам дневной таблицы; возвращает затронутые (объект, день)"""
+    model = apps.get_model(target_label)
+    parent_label, fk = TARGETS[target_label]
+    fk_id = f'{fk}_id'
+
+    # Объект мог быть удален после события
+    existing = set(apps.get_model(parent_label).objects.filter(
+        pk__in={object_id for object_id, _ in increments}
+    ).values_list('pk', flat=True))
+    increments = {key: value for key, value in increments.items() if key[0] in existing}
+    if not increments:
+        return set()
+
+    rows = {
+        (getattr(row, fk_id), row.date): row
+        for row in model.objects.filter(
+            **{f'{fk_id}__in': {object_id for object_id, _ in increments}},
+            date__in={date for _, date in increments},
+        )
+    }
+    metrics = set()
+    created = []
+    for (object_id, date), values in increments.items():
+        row = rows.get((object_id, date))
+        if row is None:
+            row = model(date=date, **{fk_id: object_id})
+            created.append(row)
+        for metric, amount in values.items():
+            setattr(row, metric, getattr(row, metric) + amount)
+            metrics.add(metric)
+
+    updated = [row for key, row in rows.items() if key in increments]
+    if updated:
+        model.objects.bulk_update(updated, sorted(metrics), batch_size=500)
+    model.objects.bulk_create(created, batch_size=500)
+    return set(increments)
+
+
+def _rebuild_category_stats(dates):
+    """Пересчитывает статистику категорий файлов за указанные дни"""
+    DailyFileStats = apps.get_model('Archive.DailyFileStats')
+    DailyFileCategoryStats = apps.get_model('Archive.DailyFileCategoryStats')
+
+    DailyFileCategoryStats.objects.filter(date__in=dates).delete()
+    totals = DailyFileStats.objects.filter(
+        date__in=dates, file__category__isnull=False
+    ).values('date', 'file__category').annotate(
+        total_views=Sum('views'), total_downloads=Sum('downloads'), total_likes=Sum('likes')
+    ).order_by()
+    DailyFileCategoryStats.objects.bulk_create([
+        DailyFileCategoryStats(
+            date=row['date'], category_id=row['file__category'],
+            views=row['total_views'], downloads=row['total_downloads'], likes=row['total_likes'],
+        )
+        for row in totals
+    ], batch_size=500)
+
+
+def rollup(now=None):
+    """
+    Сворачивает новые события в дневную статистику.
+
+    Выполняется в одной транзакции: курсоры, удаление CounterDelta и строки
+    статистики фиксируются вместе, поэтому прерванный запуск ничего не
+    учитывает дважды. Возвращает {дневная таблица: число затронутых строк}.
+    """
+    now = now or timezone.now()
+    increments = defaultdict(lambda: defaultdict(Counter))
+
+    with transaction.atomic():
+        cursors = [_fold_events(name, increments, now) for name in EVENT_SOURCES]
+        folded_deltas = _fold_counter_deltas(increments)
+
+        stats = {}
+        file_dates = set()
+        for target_label in TARGETS:
+            touched = _apply(target_label, increments.get(target_label, {}))
+            stats[target_label] = len(touched)
+            if target_label == 'Archive.DailyFileStats':
+                file_dates = {date for _, date in touched}
+        if file_dates:
+            _rebuild_category_stats(file_dates)
+
+        for start in range(0, len(folded_deltas), DELETE_BATCH_SIZE):
+            CounterDelta.objects.filter(pk__in=folded_deltas[start:start + DELETE_BATCH_SIZE]).delete()
+        for cursor, position in cursors:
+            if position != cursor.position:
+                cursor.position = position
+                cursor.save(update_fields=['position', 'updated_at'])
+
+    if any(stats.values()):
+        # Страницы со статистикой (Archive.cache_utils.cache_file_statistics)
+        bump_generation('stats')
+    return stats
+
+
+def user_activity(user, days=30):
+    """Просмотры, скачивания и лайки постов и файлов пользователя за последние дни"""
+    since = timezone.localdate() - timedelta(days=days)
+    posts = apps.get_model('Blog.DailyPostStats').objects.filter(
+        post__author=user, date__gt=since
+    ).aggregate(views=Sum('views'), likes=Sum('likes'))
+    files = apps.get_model('Archive.DailyFileStats').objects.filter(
+        file__uploaded_by=user, date__gt=since
+    ).aggregate(views=Sum('views'), downloads=Sum('downloads'), likes=Sum('likes'))
+    return {
+        'days': days,
+        'post_views': posts['views'] or 0,
+        'post_likes': posts['likes'] or 0,
+        'file_views': files['views'] or 0,
+        'file_downloads': files['downloads'] or 0,
+        'file_likes': files['likes'] or 0,
+    }
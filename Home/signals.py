@@ -0,0 +1,66 @@
+"""
+Сигналы для инвалидации закэшированных настроек сайта
+и создания уменьшенных копий загруженных изображений
+"""
+from functools import partial
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache_utils import invalidate_site_settings
+from .images import IMAGE_FIELDS, delete_derivatives, image_names, queue_instance_derivatives
+from .models import SiteSettings
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def invalidate_site_settings_on_change(sender, instance, **kwargs):
+    """Сбрасывает настройки сайта в памяти всех процессов"""
+    invalidate_site_settings()
+
+
+def remember_replaced_images(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Запоминает изображения, которые заменяет сохранение (их копии станут не нужны)"""
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    names = image_names(instance)
+    if update_fields is not None:
+        # Сохранение счетчиков и т.п. изображения не меняет
+        names = {field_name: name for field_name, name in names.items() if field_name in update_fields}
+        if not names:
+            return
+    old = sender._default_manager.filter(pk=instance.pk).values(*names).first() or {}
+    instance._replaced_images = [
+        old[field_name] for field_name, name in names.items()
+        if old.get(field_name) and old[field_name] != name
+    ]
+
+
+def _update_image_derivatives(instance, replaced):
+    for name in replaced:
+        delete_derivatives(name)
+    queue_instance_derivatives(instance)
+
+
+def create_image_derivatives(sender, instance, raw=False, **kwargs):
+    """После фиксации транзакции удаляет копии замененных изображений и ставит в очередь новые"""
+    if raw:
+        return
+    replaced = getattr(instance, '_replaced_images', [])
+    instance._replaced_images = []
+    transaction.on_commit(partial(_update_image_derivatives, instance, replaced))
+
+
+for label in IMAGE_FIELDS:
+    pre_save.connect(
+        remember_replaced_images,
+        sender=apps.get_model(label),
+        dispatch_uid=f'replaced_images_{label}',
+    )
+    post_save.connect(
+        create_image_derivatives,
+        sender=apps.get_model(label),
+        dispatch_uid=f'image_derivatives_{label}',
+    )
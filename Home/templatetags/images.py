@@ -0,0 +1,61 @@
+"""
+Теги шаблонов для адаптивных изображений
+
+{% load images %}
+{% responsive_image post.featured_image sizes="(max-width: 768px) 100vw, 33vw" alt=post.title class="img-fluid" %}
+"""
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from Home.images import FALLBACK_WIDTH, by_format, derivative_url, get_derivatives, pick
+
+register = template.Library()
+
+
+def _srcset(items):
+    return ', '.join(f'{item["url"]} {item["width"]}w' for item in items)
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', alt='', eager=False, **attrs):
+    """
+    <picture> с копиями изображения в WebP и JPEG.
+
+    Выводит srcset, sizes, width и height (пропорции оригинала), чтобы
+    браузер выбрал подходящую копию и не сдвигал верстку при загрузке.
+    Дополнительные именованные аргументы (class, style ...) добавляются
+    к <img>. Если копий нет, выводится <img> с оригиналом.
+    """
+    if not image:
+        return ''
+    derivatives = get_derivatives(image.name)
+    extra = format_html_join('', ' {}="{}"', (
+        (name, value) for name, value in attrs.items() if value not in (None, '')
+    ))
+    loading = 'eager' if eager else 'lazy'
+
+    jpeg = by_format(derivatives, 'jpeg')
+    if not jpeg:
+        return format_html(
+            '<img src="{}" alt="{}" loading="{}" decoding="async"{}>',
+            image.url, alt, loading, extra
+        )
+
+    largest = jpeg[-1]
+    webp = by_format(derivatives, 'webp')
+    source = format_html(
+        '<source type="image/webp" srcset="{}" sizes="{}">', _srcset(webp), sizes
+    ) if webp else ''
+    # display: contents - <picture> не участвует в верстке, стили <img> работают как раньше
+    return format_html(
+        '<picture style="display: contents;">{}<img src="{}" srcset="{}" sizes="{}" '
+        'width="{}" height="{}" alt="{}" loading="{}" decoding="async"{}></picture>',
+        source, pick(jpeg, FALLBACK_WIDTH)['url'], _srcset(jpeg), sizes,
+        largest['width'], largest['height'], alt, loading, extra
+    )
+
+
+@register.simple_tag
+def image_url(image, width):
+    """URL копии изображения шириной не меньше width (для фона, превью и т.п.)"""
+    return derivative_url(image, width, generate=True)
@@ -1,3 +1,101 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .cache_utils import bump_generation
+from .middleware import AnonymousPageCacheMiddleware
+from .page_cache import CSRF_PLACEHOLDER, add_surrogate_keys, count_view_on_hit, csrf_placeholder
+from .view_counters import view_counter
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'page-cache-tests'},
+})
+class AnonymousPageCacheMiddlewareTests(SimpleTestCase):
+    """Кэш страниц для анонимных посетителей (Home.page_cache, Home.middleware)"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.factory = RequestFactory()
+        self.rendered = 0
+        self.post = mock.Mock(pk=7, _meta=mock.Mock(label='Blog.Post'))
+        self.middleware = AnonymousPageCacheMiddleware(self.view)
+        # Просмотры из кэша не должны попасть в буфер счетчиков процесса
+        patcher = mock.patch.object(view_counter, 'incr')
+        self.incr = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def view(self, request):
+        """Страница поста: суррогатные ключи, учет просмотра и форма с CSRF-токеном"""
+        self.rendered += 1
+        add_surrogate_keys(request, 'posts', 'post:hello')
+        count_view_on_hit(request, self.post)
+        return HttpResponse(f'<form><input name="csrfmiddlewaretoken" value="{csrf_placeholder(request)}"></form>')
+
+    def get(self, **cookies):
+        request = self.factory.get('/blog/post/hello/')
+        request.COOKIES.update(cookies)
+        return self.middleware(request)
+
+    def is_hit(self, response):
+        return response.get('X-Page-Cache') == 'HIT'
+
+    def test_second_request_is_served_from_cache(self):
+        self.assertFalse(self.is_hit(self.get()))
+        self.assertTrue(self.is_hit(self.get()))
+        self.assertEqual(self.rendered, 1)
+
+    def test_skips_requests_with_session_cookie(self):
+        self.get()
+        response = self.get(**{settings.SESSION_COOKIE_NAME: 'abc'})
+        self.assertFalse(self.is_hit(response))
+        self.assertEqual(self.rendered, 2)
+
+    def test_skips_requests_with_messages_cookie(self):
+        self.get()
+        response = self.get(**{getattr(settings, 'MESSAGE_COOKIE_NAME', 'messages'): 'abc'})
+        self.assertFalse(self.is_hit(response))
+        self.assertEqual(self.rendered, 2)
+
+    def test_does_not_cache_other_methods(self):
+        self.middleware(self.factory.post('/blog/post/hello/'))
+        self.assertFalse(self.is_hit(self.get()))
+        self.assertEqual(self.rendered, 2)
+
+    def test_does_not_cache_pages_without_surrogate_keys(self):
+        middleware = AnonymousPageCacheMiddleware(lambda request: HttpResponse('dashboard'))
+        middleware(self.factory.get('/dashboard/'))
+        self.assertFalse(self.is_hit(middleware(self.factory.get('/dashboard/'))))
+
+    def test_csrf_token_is_replaced_per_request(self):
+        first = self.get().content.decode()
+        second_response = self.get()
+        second = second_response.content.decode()
+
+        self.assertTrue(self.is_hit(second_response))
+        self.assertNotIn(CSRF_PLACEHOLDER, first)
+        self.assertNotIn(CSRF_PLACEHOLDER, second)
+        # Каждый запрос получает свой маскированный токен
+        self.assertNotEqual(first, second)
+
+    def test_purged_when_post_generation_bumped(self):
+        self.get()
+        bump_generation('post:other')
+        self.assertTrue(self.is_hit(self.get()))
+
+        bump_generation('post:hello')
+        self.assertFalse(self.is_hit(self.get()))
+        self.assertEqual(self.rendered, 2)
+        self.assertTrue(self.is_hit(self.get()))
+
+    def test_view_is_counted_on_hit(self):
+        # Промах учитывает само представление (record_view), попадание - кэш
+        self.get()
+        self.incr.assert_not_called()
+        self.get()
+        self.get()
+        self.assertEqual(self.incr.call_count, 2)
+        self.incr.assert_called_with('Blog.Post', 7, 'views_count')
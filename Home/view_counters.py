@@ -0,0 +1,183 @@
+"""
+Буферизованные счетчики просмотров (write-behind)
+
+Просмотр страницы не пишет в базу данных: приращения копятся в Redis
+(HINCRBY в одном хэше) или, если Redis не используется, в буфере процесса.
+Периодически накопленные значения сбрасываются в БД пакетными UPDATE
+с F()-выражениями - один запрос на группу объектов с одинаковым приращением.
+В той же транзакции приращения сохраняются в CounterDelta, откуда их
+сворачивает в дневную статистику команда rollup_stats (Home.rollups).
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+try:
+    from django_redis import get_redis_connection
+except ImportError:
+    get_redis_connection = None
+
+
+logger = logging.getLogger('nlpers')
+
+# Интервал автоматического сброса буфера в БД (секунды)
+FLUSH_INTERVAL = getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 60)
+
+
+def _make_field_key(model, pk, field):
+    """Ключ счетчика: '<app_label.Model>:<pk>:<field>'"""
+    label = model if isinstance(model, str) else model._meta.label
+    return f'{label}:{pk}:{field}'
+
+
+def _parse_field_key(key):
+    label, pk, field = key.rsplit(':', 2)
+    return label, int(pk), field
+
+
+def _uses_redis():
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return get_redis_connection is not None and backend.startswith('django_redis')
+
+
+class ViewCounterBuffer:
+    """Буфер приращений счетчиков с пакетным сбросом в БД"""
+
+    def __init__(self):
+        self._local = defaultdict(int)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @property
+    def redis_key(self):
+        return cache.make_key('view_counters')
+
+    def incr(self, model, pk, field='views_count', amount=1):
+        """
+        Регистрирует приращение счетчика.
+
+        Возвращает количество еще не сброшенных в БД приращений для объекта,
+        чтобы страница могла показать актуальное значение без записи.
+        """
+        key = _make_field_key(model, pk, field)
+        if _uses_redis():
+            pending = get_redis_connection('default').hincrby(self.redis_key, key, amount)
+        else:
+            with self._lock:
+                self._local[key] += amount
+                pending = self._local[key]
+
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+        return int(pending)
+
+    def pending(self, model, pk, field='views_count'):
+        """Возвращает количество несброшенных приращений"""
+        key = _make_field_key(model, pk, field)
+        if _uses_redis():
+            value = get_redis_connection('default').hget(self.redis_key, key)
+            return int(value or 0)
+        with self._lock:
+            return self._local.get(key, 0)
+
+    def _take_redis(self):
+        """Атомарно забирает накопленный хэш из Redis"""
+        connection = get_redis_connection('default')
+        processing_key = f'{self.redis_key}:flushing:{time.time_ns()}'
+        try:
+            connection.rename(self.redis_key, processing_key)
+        except Exception:
+            # Хэша нет - сбрасывать нечего
+            return {}
+        raw = connection.hgetall(processing_key)
+        connection.delete(processing_key)
+        return {k.decode() if isinstance(k, bytes) else k: int(v) for k, v in raw.items()}
+
+    def _take_local(self):
+        with self._lock:
+            taken, self._local = self._local, defaultdict(int)
+        return dict(taken)
+
+    def _restore(self, deltas):
+        """Возвращает приращения в буфер, если запись в БД не удалась"""
+        for key, amount in deltas.items():
+            if _uses_redis():
+                get_redis_connection('default').hincrby(self.redis_key, key, amount)
+            else:
+                with self._lock:
+                    self._local[key] += amount
+
+    def flush(self):
+        """
+        Сбрасывает накопленные приращения в БД.
+
+        Объекты группируются по (модель, поле, приращение), поэтому на каждую
+        группу выполняется один UPDATE ... SET field = field + N WHERE id IN (...).
+        Возвращает количество обновленных строк.
+        """
+        if not self._flush_lock.acquire(blocking=False):
+            # Сброс уже выполняется в другом потоке
+            return 0
+        try:
+            self._last_flush = time.monotonic()
+            deltas = self._take_redis() if _uses_redis() else self._take_local()
+            if not deltas:
+                return 0
+
+            from .models import CounterDelta
+
+            groups = defaultdict(list)
+            staged = []
+            today = timezone.localdate()
+            for key, amount in deltas.items():
+                if amount:
+                    label, pk, field = _parse_field_key(key)
+                    groups[(label, field, amount)].append(pk)
+                    staged.append(CounterDelta(
+                        label=label, object_id=pk, field=field, amount=amount, date=today
+                    ))
+
+            updated = 0
+            try:
+                with transaction.atomic():
+                    for (label, field, amount), pks in groups.items():
+                        model = apps.get_model(label)
+                        updated += model.objects.filter(pk__in=pks).update(
+                            **{field: F(field) + amount}
+                        )
+                    # Приращения для дневной статистики (Home.rollups)
+                    CounterDelta.objects.bulk_create(staged, batch_size=500)
+            except Exception:
+                logger.exception('Не удалось сбросить счетчики просмотров в БД')
+                self._restore(deltas)
+                return 0
+            return updated
+        finally:
+            self._flush_lock.release()
+
+
+view_counter = ViewCounterBuffer()
+
+
+def record_view(instance, field='views_count'):
+    """
+    Учитывает просмотр объекта без записи в БД.
+
+    Возвращает число несброшенных просмотров, которое можно прибавить
+    к значению из БД для отображения.
+    """
+    return view_counter.incr(type(instance), instance.pk, field)
+
+
+# Сбрасываем локальный буфер при остановке процесса
+atexit.register(view_counter.flush)
@@ -1,23 +1,22 @@
 from django.shortcuts import render
 from django.views.generic import *
 from .models import *
-from Blog.models import Category, Post
-from Archive.models import ArchiveFile
+from Blog.cache_utils import cache_categories_with_counts, cache_recent_posts
+from Archive.cache_utils import cache_recent_files
+from .page_cache import add_surrogate_keys
 
 def home(request):
+    # Страница кэшируется для анонимных посетителей до изменения постов, категорий или файлов
+    add_surrogate_keys(request, 'posts', 'categories', 'files')
+    
     # Получаем все категории для отображения на главной странице
-    categories = Category.objects.filter(is_active=True).order_by('name')
+    categories = cache_categories_with_counts()
     
     # Получаем последние опубликованные статьи (максимум 8 для отображения в карусели)
-    latest_posts = Post.objects.filter(
-        status='published'
-    ).select_related('author', 'category').prefetch_related('author__userprofile').order_by('-published_at', '-created_at')[:8]
+    latest_posts = cache_recent_posts(8)
     
     # Получаем последние файлы изображений (максимум 4 для отображения в секции sell-nfts-area)
-    latest_images = ArchiveFile.objects.filter(
-        file_type='image',
-        is_public=True
-    ).select_related('uploaded_by', 'category').prefetch_related('uploaded_by__userprofile').order_by('-uploaded_at')[:4]
+    latest_images = cache_recent_files(4, file_type='image')
     
     context = {
         'categories': categories,
@@ -9,6 +9,8 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+from Home.images import derivative_url
+
 # Настройки заголовков и названий админ-панели
 admin.site.site_header = "NLPers.ru - Панель администрирования"
 admin.site.site_title = "NLPers.ru Admin"
@@ -96,16 +98,33 @@ admin.site.register(Group, CustomGroupAdmin)
 
 
 # Функция для добавления кастомных действий
+def _bulk_status_changed(queryset, pks):
+    """
+    Вызывает хук модели после массовой смены статуса.
+
+    QuerySet.update не вызывает save(), поэтому модель со счетчиками
+    (например, Post) может определить classmethod bulk_status_changed(pks).
+    """
+    hook = getattr(queryset.model, 'bulk_status_changed', None)
+    if hook is not None:
+        hook(pks)
+
+
 def make_published(modeladmin, request, queryset):
     """Массовое действие - опубликовать"""
-    updated = queryset.update(status='published')
+    # Хук получает только записи, статус которых действительно изменился
+    pks = list(queryset.exclude(status='published').values_list('pk', flat=True))
+    updated = queryset.model._default_manager.filter(pk__in=pks).update(status='published')
+    _bulk_status_changed(queryset, pks)
     modeladmin.message_user(request, f'{updated} записей было опубликовано.')
 make_published.short_description = "Опубликовать выбранные записи"
 
 
 def make_draft(modeladmin, request, queryset):
     """Массовое действие - перевести в черновики"""
-    updated = queryset.update(status='draft')
+    pks = list(queryset.exclude(status='draft').values_list('pk', flat=True))
+    updated = queryset.model._default_manager.filter(pk__in=pks).update(status='draft')
+    _bulk_status_changed(queryset, pks)
     modeladmin.message_user(request, f'{updated} записей переведено в черновики.')
 make_draft.short_description = "Перевести в черновики"
 
@@ -134,7 +153,7 @@ class ImagePreviewMixin:
         if field:
             return format_html(
                 '<img src="{}" style="max-width: {}px; max-height: {}px; border: 1px solid #ddd; border-radius: 4px;" />',
-                field.url, width, height
+                derivative_url(field, width * 2), width, height
             )
         return "Нет изображения"
 
@@ -42,14 +42,15 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.cache.UpdateCacheMiddleware',  # Кэширование
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware',  # Кэширование
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Home.middleware.SiteSettingsMiddleware',  # Настройки сайта из памяти процесса
+    'Home.middleware.MaintenanceModeMiddleware',  # Режим обслуживания (503)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'silk.middleware.SilkyMiddleware',  # Мониторинг производительности
+    'Home.middleware.AnonymousPageCacheMiddleware',  # Кэш страниц для анонимных посетителей (последним)
 ]
 
 ROOT_URLCONF = 'NLPers.urls'
@@ -67,6 +68,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'Home.context_processors.site_settings',
                 'Home.context_processors.maintenance_check',
+                'Home.context_processors.page_cache_csrf',
             ],
         },
     },
@@ -137,6 +139,17 @@ MEDIA_DOCUMENTS = os.path.join(MEDIA_ROOT, 'documents')
 MEDIA_VIDEOS = os.path.join(MEDIA_ROOT, 'videos')
 MEDIA_AUDIO = os.path.join(MEDIA_ROOT, 'audio')
 
+# Отдача файлов архива фронтенд-сервером (см. Archive.downloads):
+# None - Django, 'x-accel-redirect' - nginx, 'x-sendfile' - Apache mod_xsendfile
+ARCHIVE_DOWNLOAD_OFFLOAD = None
+ARCHIVE_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Дедупликация файлов архива: блобы по SHA-256 в media/archive/blobs/ (см. Archive.storage)
+ARCHIVE_DEDUP_STORAGE = True
+
+# Файлы незавершенных загрузок частями (см. Archive.uploads); на том же диске, что и MEDIA_ROOT
+ARCHIVE_UPLOAD_TEMP_DIR = BASE_DIR / 'tmp' / 'uploads'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Настройки для django-ckeditor-5
@@ -359,10 +372,18 @@ else:
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'sessions'
 
-# Настройки кэширования страниц
-CACHE_MIDDLEWARE_ALIAS = 'default'
-CACHE_MIDDLEWARE_SECONDS = 300  # 5 минут
-CACHE_MIDDLEWARE_KEY_PREFIX = 'nlpers_pages'
+# Кэш страниц для анонимных посетителей (Home.page_cache): страницы
+# инвалидируются по суррогатным ключам, таймаут лишь ограничивает объем кэша
+PAGE_CACHE_SECONDS = 3600  # 1 час
+
+# Буферизованные счетчики просмотров (Home.view_counters):
+# как часто накопленные просмотры сбрасываются в БД, секунды
+VIEW_COUNTER_FLUSH_INTERVAL = 60
+
+# Буфер скачиваний файлов архива (Archive.download_log): запись в БД
+# пачкой при накоплении ARCHIVE_DOWNLOAD_FLUSH_SIZE событий или раз в интервал, секунды
+ARCHIVE_DOWNLOAD_FLUSH_SIZE = 100
+ARCHIVE_DOWNLOAD_FLUSH_INTERVAL = 30
 
 # Настройки django-cachalot (автоматическое кэширование ORM)
 CACHALOT_ENABLED = True
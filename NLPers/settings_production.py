@@ -61,6 +61,10 @@ STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 # Медиа файлы
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Файлы архива отдает фронтенд-сервер, если он настроен:
+# ARCHIVE_DOWNLOAD_OFFLOAD=x-sendfile (Apache mod_xsendfile) или x-accel-redirect (nginx)
+ARCHIVE_DOWNLOAD_OFFLOAD = os.environ.get('ARCHIVE_DOWNLOAD_OFFLOAD') or None
+
 # Безопасность
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -153,7 +157,7 @@ MIDDLEWARE = [mw for mw in MIDDLEWARE if mw not in [
 # Настройки кэширования для продакшена
 CACHALOT_ENABLED = True
 CACHALOT_TIMEOUT = 600  # 10 минут
-CACHE_MIDDLEWARE_SECONDS = 600  # 10 минут
+PAGE_CACHE_SECONDS = 6 * 3600  # 6 часов
 
 # Настройки для мониторинга (Sentry)
 # import sentry_sdk